@@ -1,25 +1,75 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from app.config import get_settings
 from app.models.chat import ChatRequest, ChatResponse
-from app.services.chat_service import ChatService
+from app.services.chat_service import get_chat_service
+from app.services.admission_service import AdmissionRejected
+from app.services.warmup_service import warmup_state
+from app.utils.cancellation import CancelToken, RequestCancelled
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-# Initialize chat service
-chat_service = ChatService()
+DISCONNECT_POLL_INTERVAL = 0.1
+
+async def _run_cancellable(request: Request, cancel_token: CancelToken, func, *args, **kwargs):
+    """
+    Run func(..., cancel_token=cancel_token) in the threadpool while
+    watching for a client disconnect or the deadline; either one cancels
+    the token, which aborts whatever LLM or database call func is blocked on.
+    """
+    work = asyncio.ensure_future(run_in_threadpool(func, *args, cancel_token=cancel_token, **kwargs))
+    while not work.done():
+        await asyncio.wait({work}, timeout=DISCONNECT_POLL_INTERVAL)
+        if work.done():
+            break
+        if await request.is_disconnected():
+            reason = "client disconnected"
+        elif cancel_token.remaining() == 0:
+            reason = "deadline exceeded"
+        else:
+            continue
+        # Abort callbacks block (psycopg2's conn.cancel opens a connection),
+        # so fire them from a worker thread rather than the event loop
+        await run_in_threadpool(cancel_token.cancel, reason)
+        break
+    return await work
 
 @router.post("/", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(chat_request: ChatRequest, request: Request):
     """
     Send a message to the chatbot
     """
+    cancel_token = CancelToken(settings.CHAT_REQUEST_TIMEOUT)
     try:
         # Process message (no history - keep it simple)
-        result = chat_service.process_message(user_message=request.message)
+        # Blocking LLM/DB work runs off the event loop so probes stay instant
+        chat_service = get_chat_service()
+        result = await _run_cancellable(
+            request, cancel_token,
+            chat_service.process_planned if chat_request.plan else chat_service.process_message,
+            user_message=chat_request.message,
+            priority=chat_request.priority,
+            include_summary=chat_request.include_summary,
+            approximate=chat_request.approximate,
+            exact_in_background=chat_request.exact_in_background
+        )
+
+        if not result.get("error"):
+            warmup_state.record_first_answer()
 
         return ChatResponse(**result)
         
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except RequestCancelled as e:
+        if cancel_token.reason == "client disconnected":
+            # Nobody is listening; 499 only shows up in logs and metrics
+            raise HTTPException(status_code=499, detail=str(e))
+        raise HTTPException(status_code=504, detail=f"Request cancelled: {e}")
     except Exception as e:
         logger.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -30,7 +80,7 @@ async def get_schema():
     Get database schema information
     """
     try:
-        schema = chat_service.db_service.get_schema()
+        schema = await run_in_threadpool(get_chat_service().db_service.get_schema)
         return {"schema": schema}
     except Exception as e:
         logger.error(f"Schema error: {e}")
@@ -0,0 +1,20 @@
+from fastapi import HTTPException, Request
+from app.config import get_settings
+from app.database.tenants import UnknownTenant, current_tenant, resolve_tenant
+
+settings = get_settings()
+
+async def bind_tenant(request: Request) -> str:
+    """
+    Resolve the request's tenant from its API key or tenant header and make
+    it current for the rest of the request (including threadpool work)
+    """
+    try:
+        tenant_id = resolve_tenant(
+            request.headers.get(settings.TENANT_HEADER),
+            request.headers.get(settings.API_KEY_HEADER)
+        )
+    except UnknownTenant as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    current_tenant.set(tenant_id)
+    return tenant_id
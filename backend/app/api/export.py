@@ -0,0 +1,132 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.config import get_settings
+from app.database.tenants import current_tenant
+from app.models.export import ExportRequest, ExportJob
+from app.services.admission_service import AdmissionRejected
+from app.services.export_service import get_export_service
+from app.utils.security import sign_token, verify_token
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+router = APIRouter(prefix="/exports", tags=["exports"])
+# Downloads are plain browser links, so the tenant travels in a signed token instead of headers
+download_router = APIRouter(prefix="/exports", tags=["exports"])
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet"
+}
+READ_CHUNK_BYTES = 256 * 1024
+
+def _to_model(job: dict, request: Request) -> ExportJob:
+    download_url = None
+    if job["status"] == "done":
+        token = sign_token(
+            {"job_id": job["job_id"], "tenant_id": job["tenant_id"]}, settings.EXPORT_DOWNLOAD_URL_TTL
+        )
+        download_url = request.url_for("download_export", job_id=job["job_id"]).include_query_params(token=token)
+        download_url = str(download_url)
+    return ExportJob(
+        **{key: value for key, value in job.items() if key in ExportJob.model_fields},
+        download_url=download_url
+    )
+
+@router.post("/", response_model=ExportJob, status_code=202)
+async def create_export(export_request: ExportRequest, request: Request):
+    """
+    Start a background export of an answer's query (by result handle) to CSV or Parquet
+    """
+    try:
+        job = await run_in_threadpool(
+            get_export_service().create_job, export_request.result_id, export_request.format
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        logger.error(f"Export error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    return _to_model(job, request)
+
+@router.get("/{job_id}", response_model=ExportJob)
+async def get_export(job_id: str, request: Request):
+    """
+    Get export job status and progress
+    """
+    job = await run_in_threadpool(get_export_service().get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return _to_model(job, request)
+
+def _iter_file(path: str, start: int, length: int):
+    """File slice in chunks; a sync generator, so StreamingResponse reads it in the threadpool"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(READ_CHUNK_BYTES, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+@download_router.get("/{job_id}/download", name="download_export")
+async def download_export(job_id: str, request: Request, token: str = Query(..., description="Signed download token")):
+    """
+    Download a finished export (supports single-range Range requests)
+    """
+    claims = verify_token(token)
+    if claims is None or claims.get("job_id") != job_id:
+        raise HTTPException(status_code=403, detail="Invalid or expired download link")
+    current_tenant.set(claims["tenant_id"])
+    service = get_export_service()
+    job = await run_in_threadpool(service.get_job, job_id)
+    if job is None or job["status"] != "done":
+        raise HTTPException(status_code=404, detail="Export not available")
+
+    path = service.file_path(job)
+    try:
+        size = await run_in_threadpool(os.path.getsize, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Export not available")
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="export_{job_id}.{job["format"]}"'
+    }
+
+    start, end = 0, size - 1
+    status_code = 200
+    range_header = request.headers.get("range")
+    if range_header:
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+        if not match or match.groups() == ("", ""):
+            raise HTTPException(status_code=416, detail="Invalid range",
+                                headers={"Content-Range": f"bytes */{size}"})
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(last))
+        if start >= size or start > end:
+            raise HTTPException(status_code=416, detail="Range not satisfiable",
+                                headers={"Content-Range": f"bytes */{size}"})
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    length = end - start + 1 if size else 0
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(
+        _iter_file(path, start, length),
+        status_code=status_code,
+        media_type=MEDIA_TYPES[job["format"]],
+        headers=headers
+    )
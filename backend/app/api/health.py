@@ -1,21 +1,64 @@
 from fastapi import APIRouter
-from app.database.connection import execute_query
+from fastapi.responses import JSONResponse
+from app.services.health_service import get_health_prober
+from app.services.warmup_service import warmup_state
+from app.utils.metrics import metrics
 
 router = APIRouter(tags=["health"])
 
 @router.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    try:
-        # Test database connection
-        execute_query("SELECT 1")
+    """Health check endpoint (answered from background probe state)"""
+    prober = get_health_prober()
+    if prober is None:
         return {
-            "status": "healthy",
-            "database": "connected"
+            "status": "unhealthy",
+            "database": "unknown",
+            "error": "Health prober not started"
         }
-    except Exception as e:
+
+    database = prober.state["database"]
+    if database["ok"]:
         return {
-            "status": "unhealthy",
-            "database": "disconnected",
-            "error": str(e)
-        }
\ No newline at end of file
+            "status": "healthy",
+            "database": "connected",
+            "checks": prober.state
+        }
+    return {
+        "status": "unhealthy",
+        "database": "disconnected",
+        "error": database.get("error"),
+        "checks": prober.state
+    }
+
+@router.get("/health/live")
+async def liveness_check():
+    """Liveness endpoint: the event loop is responsive"""
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def readiness_check():
+    """Readiness endpoint: warmup finished and the latest DB probe succeeded"""
+    prober = get_health_prober()
+    reasons = []
+    if not warmup_state.ready:
+        reasons.append("warmup_failed" if warmup_state.errors else "warming_up")
+    if prober is None or prober.is_stale():
+        reasons.append("health_state_stale")
+    elif not prober.state["database"]["ok"]:
+        reasons.append("database_unavailable")
+
+    return JSONResponse(
+        status_code=503 if reasons else 200,
+        content={
+            "status": "not_ready" if reasons else "ready",
+            "reasons": reasons,
+            "warmup": warmup_state.to_dict(),
+            "health": prober.state if prober else None
+        }
+    )
+
+@router.get("/metrics")
+async def get_metrics():
+    """In-process metrics for this worker"""
+    return metrics.snapshot()
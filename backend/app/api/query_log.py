@@ -0,0 +1,45 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from app.services.chat_service import get_chat_service
+from app.services.db_service import DatabaseService
+from app.services.query_log import get_query_log
+from typing import Literal
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/query-log", tags=["query-log"])
+
+@router.get("/top")
+async def top_fingerprints(
+    limit: int = Query(20, ge=1, le=500, description="Number of statement shapes"),
+    order_by: Literal["total_ms", "mean_ms", "calls", "max_ms"] = Query("total_ms", description="Ranking")
+):
+    """
+    Statements run for chat users, grouped by fingerprint and ranked by time
+    """
+    query_log = get_query_log()
+    try:
+        await run_in_threadpool(query_log.flush)
+        return {"fingerprints": await run_in_threadpool(query_log.top_fingerprints, limit, order_by)}
+    except Exception as e:
+        logger.error(f"Query log error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _advise(limit: int) -> list:
+    chat_service = get_chat_service()
+    if not chat_service.schema:
+        chat_service.initialize()
+    query_log = get_query_log()
+    query_log.flush()
+    return query_log.advise_indexes(chat_service.schema, DatabaseService.get_indexes(), limit)
+
+@router.get("/index-advice")
+async def index_advice(limit: int = Query(10, ge=1, le=100, description="Maximum suggestions")):
+    """
+    Index suggestions from the filter and join columns of slow statements
+    """
+    try:
+        return {"suggestions": await run_in_threadpool(_advise, limit)}
+    except Exception as e:
+        logger.error(f"Index advisor error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from app.models.result import ResultPage
+from app.services.admission_service import AdmissionRejected
+from app.services.result_store import get_result_store
+from app.utils.cancellation import RequestCancelled
+import binascii
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/results", tags=["results"])
+
+@router.get("/{result_id}", response_model=ResultPage)
+async def get_result_page(
+    result_id: str,
+    cursor: str = Query(None, description="Opaque cursor from the previous page"),
+    limit: int = Query(100, ge=1, description="Rows per page")
+):
+    """
+    Page through a stored query result without re-running the LLM
+    """
+    try:
+        page = await run_in_threadpool(get_result_store().get_page, result_id, cursor, limit)
+    except (ValueError, binascii.Error, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except RequestCancelled as e:
+        raise HTTPException(status_code=504, detail=f"Page query cancelled: {e}")
+    except Exception as e:
+        logger.error(f"Result paging error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if page is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    return ResultPage(**page)
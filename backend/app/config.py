@@ -9,9 +9,23 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str
-    DB_POOL_SIZE: int = 5
+    DB_POOL_SIZE: int = 10  # above DB_MAX_CONCURRENT + EXPORT_MAX_CONCURRENT + APPROX_EXACT_MAX_CONCURRENT
+    DB_POOL_MIN_SIZE: int = 2  # connections opened eagerly at startup
+    DB_POOL_TIMEOUT: float = 10.0  # wait for a free connection before failing
     DB_MAX_OVERFLOW: int = 10
     
+    # Tenants (DATABASE_URL above is the "default" tenant), e.g.
+    # {"sales": {"database_url": "...", "search_path": "sales", "pool_size": 3, "api_keys": ["..."]}}
+    # Requests pick a tenant by API key, or by tenant header for tenants without keys.
+    TENANTS: dict = {}
+    TENANT_HEADER: str = "X-Tenant-ID"
+    API_KEY_HEADER: str = "X-API-Key"
+    TENANT_REQUIRED: bool = False  # reject requests that name no tenant
+    TENANT_MAX_ACTIVE: int = 100  # tenants with schema/prompt state kept in memory
+    TENANT_MAX_POOLS: int = 50  # idle pools beyond this are closed, least recently used first
+    TENANT_POOL_IDLE_TIMEOUT: float = 300.0
+    DB_MAX_TOTAL_CONNECTIONS: int = 100  # across all tenant pools
+    
     # LLM settings
     LLM_PROVIDER: str = "openrouter"  # or "ollama"
     OPENROUTER_API_KEY: str = ""
@@ -21,6 +35,106 @@ class Settings(BaseSettings):
     LLM_TEMPERATURE: float = 0.7
     LLM_MAX_TOKENS: int = 1000
     
+    # Multiple OpenAI-compatible providers, e.g.
+    # [{"name": "a", "base_url": "...", "api_key": "...", "model": "..."}, ...]
+    # When empty, LLM_PROVIDER above is the only provider.
+    LLM_PROVIDERS: list = []
+    LLM_HEDGE_PERCENTILE: float = 95.0  # hedge once the primary is slower than this
+    LLM_HEDGE_DELAY: float = 2.0  # until a provider has LLM_HEDGE_MIN_SAMPLES
+    LLM_HEDGE_MIN_DELAY: float = 0.25
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_BREAKER_FAILURES: int = 3
+    LLM_BREAKER_COOLDOWN: float = 30.0
+    
+    # Per-request deadlines (client disconnects cancel the request too)
+    CHAT_REQUEST_TIMEOUT: float = 30.0
+    LLM_TIMEOUT: float = 60.0  # total per LLM call; a request deadline can shorten it
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_FIRST_TOKEN_TIMEOUT: float = 20.0  # also bounds any stall while streaming
+    
+    # Outbound LLM HTTP (one connection pool shared by all providers)
+    LLM_MAX_CONNECTIONS: int = 32
+    LLM_MAX_KEEPALIVE: int = 16
+    LLM_KEEPALIVE_EXPIRY: float = 120.0
+    LLM_HTTP2: bool = False  # needs the h2 package
+    LLM_PROVIDER_MAX_CONCURRENT: int = 8  # per provider; LLM_PROVIDERS entries may set max_concurrent
+    
+    # Admission control (per-stage concurrency, bounded priority wait queue)
+    LLM_MAX_CONCURRENT: int = 4
+    DB_MAX_CONCURRENT: int = 4  # user queries; see DB_POOL_SIZE
+    ADMISSION_QUEUE_SIZE: int = 32
+    ADMISSION_MAX_WAIT: float = 10.0
+    
+    # Planner mode (compound questions answered as parallel sub-questions)
+    PLANNER_MAX_SUBQUESTIONS: int = 4
+    PLANNER_MAX_WORKERS: int = 16  # sub-questions in flight across requests
+    
+    # Few-shot examples retrieved from verified question -> SQL pairs
+    FEWSHOT_EXAMPLES: int = 3
+    
+    # Column value profiling (background, merged into the prompt)
+    PROFILE_REFRESH_INTERVAL: float = 600.0
+    PROFILE_MAX_DISTINCT: int = 20
+    PROFILE_SAMPLE_ROWS: int = 200
+    PROFILE_PROMPT_TOKENS: int = 1500
+    
+    # Export jobs (spooled to DATA_DIR/exports)
+    EXPORT_CHUNK_ROWS: int = 10000
+    EXPORT_MAX_CONCURRENT: int = 2
+    EXPORT_QUEUE_SIZE: int = 8  # jobs waiting beyond EXPORT_MAX_CONCURRENT; more are rejected
+    EXPORT_TIMEOUT: float = 600.0  # statement time per job
+    EXPORT_DOWNLOAD_URL_TTL: int = 3600  # signed download links (no tenant headers needed)
+    URL_SIGNING_SECRET: str = ""  # set when workers don't share DATA_DIR
+    EXPORT_TTL: int = 24 * 3600
+    
+    # Result handles for paging (spooled to DATA_DIR/results)
+    RESULT_STORE_TTL: int = 3600
+    RESULT_STORE_MAX_BYTES: int = 512 * 1024 * 1024
+    RESULT_PAGE_MAX: int = 1000
+    RESULT_SPOOL_ROWS: int = 10000  # per ordered result; pages past them are keyset queries
+    RESULT_PAGE_TIMEOUT: float = 10.0  # statement timeout for keyset pages
+    
+    # Result summaries
+    SUMMARY_TOP_K: int = 5
+    SUMMARY_MAX_POINTS: int = 500  # per downsampled series
+    SUMMARY_MAX_SERIES: int = 5
+    
+    # Approximate answers (opt-in per request) for aggregates over huge tables
+    APPROX_COST_THRESHOLD: float = 1000000.0  # planner cost above which queries are approximated
+    APPROX_SAMPLE_ROWS: int = 100000  # rows TABLESAMPLE SYSTEM aims to read
+    APPROX_MAX_SAMPLE_PERCENT: float = 10.0  # needing a larger sample, run exactly instead
+    APPROX_EXACT_MAX_CONCURRENT: int = 1  # exact queries run in the background
+    
+    # Query log (DATA_DIR/query_log.sqlite3) and index advisor
+    QUERY_LOG_ENABLED: bool = True
+    QUERY_LOG_MAX_EXECUTIONS: int = 100000
+    QUERY_LOG_SLOW_MS: float = 200.0
+    QUERY_LOG_PLAN_TTL: int = 3600
+    QUERY_LOG_QUEUE_SIZE: int = 10000  # pending writes; more are dropped
+    
+    # Startup
+    WARMUP_LLM_CONNECTION: bool = True
+    WARMUP_RETRY_INTERVAL: float = 10.0  # until every warmup step has succeeded
+    
+    # Health probing (runs in the background, probes read cached state)
+    HEALTH_PROBE_INTERVAL: float = 5.0
+    HEALTH_PROBE_TIMEOUT: float = 2.0
+    HEALTH_LLM_PROBE_INTERVAL: float = 60.0
+    
+    # Shared cache (SQLite in WAL mode, shared by all workers on the host)
+    DATA_DIR: str = ".dbbot"
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_FILL_TIMEOUT: float = 30.0
+    SCHEMA_CACHE_TTL: int = 3600
+    NL2SQL_CACHE_TTL: int = 24 * 3600
+    RESULT_CACHE_TTL: int = 60
+    RESULT_CACHE_MAX_ROWS: int = 1000
+    
+    # Response compression (zstd / br need the zstandard / brotli packages)
+    COMPRESSION_MIN_BYTES: int = 1024  # smaller bodies are sent uncompressed
+    COMPRESSION_ENCODINGS: list = ["zstd", "br", "gzip"]  # server preference order
+    COMPRESSION_LEVELS: dict = {"zstd": 3, "br": 4, "gzip": 6}
+    
     # CORS
     CORS_ORIGINS: list = ["http://localhost:3000", "http://localhost:5173"]
     
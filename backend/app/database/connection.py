@@ -1,43 +1,216 @@
-import psycopg2
 from psycopg2 import pool
 from psycopg2.extras import RealDictCursor
 from app.config import get_settings
-from contextlib import contextmanager
+from app.database.tenants import DEFAULT_TENANT, current_tenant, get_tenant_config
+from app.utils.cancellation import CancelToken, RequestCancelled
+from app.utils.metrics import metrics
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 import logging
+import math
+import threading
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# Connection pool
-connection_pool = None
+class TenantPools:
+    """
+    One connection pool per tenant, created on first use.
+
+    Pools are kept in least-recently-used order with a lease count per
+    tenant. When a pool needs a new connection and the process is at
+    DB_MAX_TOTAL_CONNECTIONS, or there are more than TENANT_MAX_POOLS
+    pools, idle pools are closed least recently used first; pools with
+    connections checked out, and the default tenant's (warmed at
+    startup), are never closed. evict_idle() closes pools unused for
+    TENANT_POOL_IDLE_TIMEOUT.
+
+    Every checkout takes one of its pool's slots first, so callers beyond
+    the pool size wait up to DB_POOL_TIMEOUT for a connection instead of
+    failing right away.
+    """
+
+    def __init__(self):
+        self._pools = OrderedDict()
+        self._slots = {}
+        self._leases = {}
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+    def _create(self, tenant_id: str) -> pool.ThreadedConnectionPool:
+        config = get_tenant_config(tenant_id)
+        kwargs = {"dsn": config["database_url"]}
+        if config.get("search_path"):
+            kwargs["options"] = f"-c search_path={config['search_path']}"
+        maxconn = config.get("pool_size", settings.DB_POOL_SIZE)
+        # Only the default tenant opens connections eagerly
+        minconn = min(settings.DB_POOL_MIN_SIZE, maxconn) if tenant_id == DEFAULT_TENANT else 0
+        created = pool.ThreadedConnectionPool(minconn=minconn, maxconn=maxconn, **kwargs)
+        self._slots[tenant_id] = threading.BoundedSemaphore(maxconn)
+        logger.info(f"Database connection pool for tenant {tenant_id} initialized")
+        return created
+
+    @staticmethod
+    def _size(tenant_pool) -> int:
+        # psycopg2 pools expose no public counters, so read their bookkeeping
+        return len(tenant_pool._used) + len(tenant_pool._pool)
+
+    def open_connections(self) -> int:
+        return sum(self._size(tenant_pool) for tenant_pool in self._pools.values())
+
+    def _close(self, tenant_id: str):
+        self._pools.pop(tenant_id).closeall()
+        self._slots.pop(tenant_id, None)
+        self._leases.pop(tenant_id, None)
+        self._last_used.pop(tenant_id, None)
+        metrics.incr("db.pools_evicted")
+        logger.info(f"Closed idle connection pool for tenant {tenant_id}")
+
+    def _make_room(self, tenant_id: str):
+        excess_pools = len(self._pools) - settings.TENANT_MAX_POOLS
+        excess_connections = self.open_connections() + 1 - settings.DB_MAX_TOTAL_CONNECTIONS
+        for other in list(self._pools):
+            if excess_pools <= 0 and excess_connections <= 0:
+                break
+            if other in (tenant_id, DEFAULT_TENANT) or self._leases.get(other):
+                continue
+            freed = self._size(self._pools[other])
+            self._close(other)
+            excess_pools -= 1
+            excess_connections -= freed
+        if excess_connections > 0:
+            raise pool.PoolError(
+                f"Global connection limit reached ({settings.DB_MAX_TOTAL_CONNECTIONS})"
+            )
+
+    def open(self, tenant_id: str) -> pool.ThreadedConnectionPool:
+        """The tenant's pool, created if needed (no lease is taken)"""
+        with self._lock:
+            tenant_pool = self._pools.get(tenant_id)
+            if tenant_pool is None:
+                tenant_pool = self._pools[tenant_id] = self._create(tenant_id)
+                self._last_used[tenant_id] = time.monotonic()
+            return tenant_pool
+
+    def lease(self, tenant_id: str) -> pool.ThreadedConnectionPool:
+        """The tenant's pool, protected from eviction until release(), with a slot held for one connection"""
+        with self._lock:
+            if tenant_id not in self._pools:
+                self._pools[tenant_id] = self._create(tenant_id)
+            self._leases[tenant_id] = self._leases.get(tenant_id, 0) + 1
+            slots = self._slots[tenant_id]
+
+        started = time.monotonic()
+        if not slots.acquire(timeout=settings.DB_POOL_TIMEOUT):
+            self.release(tenant_id, slot=False)
+            metrics.incr("db.pool_timeouts")
+            raise pool.PoolError(f"No database connection free within {settings.DB_POOL_TIMEOUT}s")
+        metrics.observe("db.pool_wait_seconds", time.monotonic() - started)
+
+        with self._lock:
+            tenant_pool = self._pools[tenant_id]
+            self._pools.move_to_end(tenant_id)
+            self._last_used[tenant_id] = time.monotonic()
+            if not tenant_pool._pool and len(tenant_pool._used) < tenant_pool.maxconn:
+                # getconn() will open a new connection
+                try:
+                    self._make_room(tenant_id)
+                except Exception:
+                    slots.release()
+                    self._leases[tenant_id] -= 1
+                    raise
+            return tenant_pool
+
+    def release(self, tenant_id: str, slot: bool = True):
+        with self._lock:
+            if tenant_id in self._leases:
+                self._leases[tenant_id] -= 1
+                self._last_used[tenant_id] = time.monotonic()
+                if slot:
+                    self._slots[tenant_id].release()
+
+    def evict_idle(self):
+        """Close pools with nothing checked out that have not been used for a while"""
+        cutoff = time.monotonic() - settings.TENANT_POOL_IDLE_TIMEOUT
+        with self._lock:
+            for tenant_id in list(self._pools):
+                if tenant_id == DEFAULT_TENANT or self._leases.get(tenant_id):
+                    continue
+                if self._last_used.get(tenant_id, 0) < cutoff:
+                    self._close(tenant_id)
+            metrics.set_gauge("db.tenant_pools", len(self._pools))
+            metrics.set_gauge("db.open_connections", self.open_connections())
+
+    def close_all(self):
+        with self._lock:
+            for tenant_pool in self._pools.values():
+                tenant_pool.closeall()
+            self._pools.clear()
+            self._slots.clear()
+            self._leases.clear()
+            self._last_used.clear()
+
+    def stats(self, tenant_id: str) -> dict:
+        maxconn = get_tenant_config(tenant_id).get("pool_size", settings.DB_POOL_SIZE)
+        with self._lock:
+            tenant_pool = self._pools.get(tenant_id)
+            in_use = len(tenant_pool._used) if tenant_pool is not None else 0
+            idle = len(tenant_pool._pool) if tenant_pool is not None else 0
+            return {
+                "in_use": in_use,
+                "idle": idle,
+                "max": maxconn,
+                "saturation": in_use / maxconn,
+                "tenant_pools": len(self._pools),
+                "open_connections": self.open_connections(),
+                "max_connections": settings.DB_MAX_TOTAL_CONNECTIONS
+            }
+
+tenant_pools = TenantPools()
+
+def check_connection_budget():
+    """Warn when the stages that hold connections for long can fill a tenant's pool between them"""
+    reserved = settings.DB_MAX_CONCURRENT + settings.EXPORT_MAX_CONCURRENT + settings.APPROX_EXACT_MAX_CONCURRENT
+    pool_sizes = {DEFAULT_TENANT: settings.DB_POOL_SIZE}
+    pool_sizes.update({
+        tenant_id: config.get("pool_size", settings.DB_POOL_SIZE) for tenant_id, config in settings.TENANTS.items()
+    })
+    for tenant_id, pool_size in pool_sizes.items():
+        if reserved >= pool_size:
+            logger.warning(
+                f"Tenant {tenant_id}: DB_MAX_CONCURRENT + EXPORT_MAX_CONCURRENT + APPROX_EXACT_MAX_CONCURRENT "
+                f"({reserved}) leave none of its {pool_size} connections for paging, probes and profiling; "
+                f"those will wait up to DB_POOL_TIMEOUT"
+            )
 
 def init_db_pool():
-    """Initialize database connection pool"""
-    global connection_pool
+    """Initialize the default tenant's database connection pool"""
+    check_connection_budget()
     try:
-        connection_pool = psycopg2.pool.ThreadedConnectionPool(
-            minconn=1,
-            maxconn=settings.DB_POOL_SIZE,
-            dsn=settings.DATABASE_URL
-        )
-        logger.info("Database connection pool initialized")
+        tenant_pools.open(DEFAULT_TENANT)
     except Exception as e:
         logger.error(f"Error initializing database pool: {e}")
         raise
 
 def close_db_pool():
-    """Close database connection pool"""
-    global connection_pool
-    if connection_pool:
-        connection_pool.closeall()
-        logger.info("Database connection pool closed")
+    """Close every tenant's database connection pool"""
+    tenant_pools.close_all()
+    logger.info("Database connection pools closed")
+
+def get_pool_stats() -> dict:
+    """Connections in use / idle / max for the current tenant's pool (no connection is taken)"""
+    return tenant_pools.stats(current_tenant.get())
 
 @contextmanager
 def get_db_connection():
-    """Get database connection from pool"""
+    """Get database connection from the current tenant's pool"""
+    tenant_id = current_tenant.get()
+    tenant_pool = tenant_pools.lease(tenant_id)
     conn = None
     try:
-        conn = connection_pool.getconn()
+        conn = tenant_pool.getconn()
         yield conn
         conn.commit()
     except Exception as e:
@@ -47,13 +220,102 @@ def get_db_connection():
         raise
     finally:
         if conn:
-            connection_pool.putconn(conn)
+            tenant_pool.putconn(conn)
+        tenant_pools.release(tenant_id)
+
+class _StatementCancel:
+    """
+    conn.cancel() for one statement.
+
+    CancelToken may run a callback just after it was unregistered, by
+    which time the connection can be back in the pool running someone
+    else's statement. Once finish() returns, cancel() is a no-op and no
+    cancel is still in flight.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def cancel(self):
+        with self._lock:
+            if not self._finished:
+                self._conn.cancel()
+
+    def finish(self):
+        with self._lock:
+            self._finished = True
+
+def _execute(sql: str, params: tuple, cancel_token: CancelToken, cursor_factory):
+    """(cursor.description, rows) of a statement, or (None, None) if it returns no rows"""
+    if cancel_token is not None:
+        cancel_token.check()
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=cursor_factory) as cursor:
+                remaining = cancel_token.remaining() if cancel_token is not None else None
+                if remaining is not None:
+                    cursor.execute("SET LOCAL statement_timeout = %s", (max(1, math.ceil(remaining * 1000)),))
+                statement = _StatementCancel(conn)
+                try:
+                    with cancel_token.on_cancel(statement.cancel) if cancel_token is not None else nullcontext():
+                        cursor.execute(sql, params)
+                        if cursor.description:  # SELECT query
+                            return cursor.description, cursor.fetchall()
+                        return None, None  # INSERT/UPDATE/DELETE
+                finally:
+                    statement.finish()
+    except Exception as e:
+        if cancel_token is not None and cancel_token.cancelled:
+            raise RequestCancelled(cancel_token.reason) from e
+        raise
+
+def execute_query(sql: str, params: tuple = None, cancel_token: CancelToken = None):
+    """
+    Execute SQL query and return results.
+
+    With a cancel token, the statement gets a statement_timeout matching the
+    remaining deadline and is cancelled server-side as soon as the token is,
+    so the connection goes back to the pool right away.
+    """
+    return _execute(sql, params, cancel_token, RealDictCursor)[1]
+
+def execute_query_tuples(sql: str, params: tuple = None, cancel_token: CancelToken = None):
+    """Like execute_query, but returns (cursor.description, rows as tuples), e.g. to build columns"""
+    return _execute(sql, params, cancel_token, None)
+
+def stream_query(sql: str, params: tuple = None, chunk_size: int = 10000, timeout: float = None):
+    """
+    Stream a SELECT through a server-side cursor in bounded-memory chunks.
+
+    Yields (column_names, rows) per chunk, rows being tuples. An empty
+    result still yields one empty chunk so callers learn the columns.
+    With a timeout, every statement (the DECLARE and each FETCH) gets a
+    statement_timeout of the time left, so the whole stream is bounded.
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+
+    def bound(cursor):
+        if deadline is None:
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise RequestCancelled("deadline exceeded")
+        cursor.execute("SET LOCAL statement_timeout = %s", (max(1, math.ceil(remaining * 1000)),))
 
-def execute_query(sql: str, params: tuple = None):
-    """Execute SQL query and return results"""
     with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        with conn.cursor() as settings_cursor, conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+            cursor.itersize = chunk_size
+            bound(settings_cursor)
             cursor.execute(sql, params)
-            if cursor.description:  # SELECT query
-                return cursor.fetchall()
-            return None  # INSERT/UPDATE/DELETE
\ No newline at end of file
+            first = True
+            while True:
+                bound(settings_cursor)
+                rows = cursor.fetchmany(chunk_size)
+                if not rows and not first:
+                    break
+                first = False
+                yield [column[0] for column in cursor.description], rows
+                if not rows:
+                    break
@@ -0,0 +1,57 @@
+from app.config import get_settings
+from contextvars import ContextVar
+from functools import lru_cache
+
+settings = get_settings()
+
+# DATABASE_URL is the "default" tenant; TENANTS adds more
+DEFAULT_TENANT = "default"
+
+# Tenant of the request being served; thread pools started with
+# run_in_threadpool / asyncio.to_thread inherit it
+current_tenant: ContextVar[str] = ContextVar("current_tenant", default=DEFAULT_TENANT)
+
+class UnknownTenant(Exception):
+    """Raised when a request names a tenant or API key that is not configured"""
+
+def get_tenant_config(tenant_id: str) -> dict:
+    """{"database_url", "search_path", "pool_size", "api_keys"} for a tenant"""
+    if tenant_id == DEFAULT_TENANT:
+        return {"database_url": settings.DATABASE_URL}
+    config = settings.TENANTS.get(tenant_id)
+    if config is None:
+        raise UnknownTenant(f"Unknown tenant: {tenant_id}")
+    return config
+
+@lru_cache()
+def _tenants_by_api_key() -> dict:
+    return {
+        api_key: tenant_id
+        for tenant_id, config in settings.TENANTS.items()
+        for api_key in config.get("api_keys", [])
+    }
+
+def resolve_tenant(tenant_header: str = None, api_key: str = None) -> str:
+    """
+    Tenant for a request: the API key's tenant if one is given, otherwise
+    the tenant header. Tenants with API keys can only be selected by key.
+    """
+    if api_key:
+        tenant_id = _tenants_by_api_key().get(api_key)
+        if tenant_id is None:
+            raise UnknownTenant("Invalid API key")
+        return tenant_id
+    if tenant_header:
+        if tenant_header == DEFAULT_TENANT:
+            return DEFAULT_TENANT
+        config = settings.TENANTS.get(tenant_header)
+        if config is None or config.get("api_keys"):
+            raise UnknownTenant(f"Unknown tenant: {tenant_header}")
+        return tenant_header
+    if settings.TENANT_REQUIRED:
+        raise UnknownTenant("No tenant or API key given")
+    return DEFAULT_TENANT
+
+def scoped_key(tenant_id: str, key: str) -> str:
+    """Cache/store key for a tenant; the default tenant keeps unprefixed keys"""
+    return key if tenant_id == DEFAULT_TENANT else f"{tenant_id}:{key}"
@@ -1,12 +1,24 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 from app.config import get_settings
-from app.database.connection import init_db_pool, close_db_pool
-from app.api import chat
+from app.database.connection import close_db_pool
+from app.api import chat, export, results, query_log
+from app.api.dependencies import bind_tenant
 from app.api.health import router as health_router
+from app.services.chat_service import get_chat_service
+from app.services.warmup_service import retry_warm_up, warm_up, warmup_state
+from app.services.health_service import start_health_prober, get_health_prober
+from app.services.llm_transport import get_llm_transport
+from app.services.profiler_service import run_profiler
+from app.utils.compression import CompressionMiddleware
+from app.utils.metrics import metrics
 
 # Setup logging
 logging.basicConfig(
@@ -17,15 +29,28 @@ logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
+warmup_state.process_started = _import_started
+metrics.set_gauge("startup.import_seconds", time.perf_counter() - _import_started)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up...")
-    init_db_pool()
-    yield
-    # Shutdown
-    logger.info("Shutting down...")
-    close_db_pool()
+    chat_service = get_chat_service()
+    tasks = [start_health_prober(chat_service)]
+    try:
+        if not await warm_up(chat_service):
+            tasks.append(asyncio.create_task(retry_warm_up(chat_service)))
+        tasks.append(asyncio.create_task(run_profiler()))
+        yield
+    finally:
+        # Shutdown (also when startup failed)
+        logger.info("Shutting down...")
+        for task in tasks:
+            task.cancel()
+        get_health_prober().close()
+        get_llm_transport().close()
+        close_db_pool()
 
 # Create FastAPI app
 app = FastAPI(
@@ -43,9 +68,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compression (added after CORS so it wraps the CORS-handled response)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_BYTES,
+    encodings=settings.COMPRESSION_ENCODINGS,
+    levels=settings.COMPRESSION_LEVELS,
+)
+
 # Include routers
 app.include_router(health_router)
-app.include_router(chat.router, prefix=f"/{settings.API_VERSION}")
+for tenant_router in (chat.router, export.router, results.router, query_log.router):
+    app.include_router(tenant_router, prefix=f"/{settings.API_VERSION}", dependencies=[Depends(bind_tenant)])
+# Export downloads authenticate with a signed token in the URL instead
+app.include_router(export.download_router, prefix=f"/{settings.API_VERSION}")
 
 @app.get("/")
 async def root():
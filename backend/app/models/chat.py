@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Any
+from typing import Optional, List, Dict, Any, Literal
 
 class ChatMessage(BaseModel):
     role: str = Field(..., description="Role: user, assistant, or system")
@@ -8,6 +8,11 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, description="User message")
     conversation_history: Optional[List[ChatMessage]] = Field(default=None, description="Previous messages")
+    priority: Literal["interactive", "batch"] = Field("interactive", description="Scheduling class under load")
+    include_summary: bool = Field(False, description="Return per-column statistics and a downsampled series")
+    approximate: bool = Field(False, description="Allow approximate answers for expensive aggregate queries")
+    exact_in_background: bool = Field(False, description="When approximated, also compute the exact result for exact_result_id")
+    plan: bool = Field(False, description="Split compound questions into sub-questions answered in parallel")
 
 class ChatResponse(BaseModel):
     response: str = Field(..., description="Assistant's response")
@@ -15,4 +20,9 @@ class ChatResponse(BaseModel):
     sql_explanation: Optional[str] = Field(None, description="Explanation of the SQL query")
     row_count: Optional[int] = Field(None, description="Number of rows returned")
     data_preview: Optional[List[Any]] = Field(None, description="Preview of returned data")
+    result_id: Optional[str] = Field(None, description="Handle for paging the full result via /results")
+    summary: Optional[Dict[str, Any]] = Field(None, description="Column statistics and downsampled time series")
+    approximation: Optional[Dict[str, Any]] = Field(None, description="Method and 95% relative error when the answer is approximate")
+    exact_result_id: Optional[str] = Field(None, description="Result handle the exact answer is delivered to (pending until done)")
+    parts: Optional[List[Dict[str, Any]]] = Field(None, description="Per sub-question answers in planner mode")
     error: Optional[str] = Field(None, description="Error message if any")
\ No newline at end of file
@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import Optional, Literal
+
+class ExportRequest(BaseModel):
+    result_id: str = Field(..., min_length=1, description="Result handle of the answer whose query is exported")
+    format: Literal["csv", "parquet"] = Field("csv", description="Output file format")
+
+class ExportJob(BaseModel):
+    job_id: str = Field(..., description="Export job identifier")
+    status: str = Field(..., description="queued, running, done or failed")
+    format: str = Field(..., description="Output file format")
+    rows_written: int = Field(0, description="Rows written so far")
+    estimated_rows: Optional[int] = Field(None, description="Planner row estimate")
+    progress: Optional[float] = Field(None, description="Estimated completion, 0-1")
+    bytes_written: int = Field(0, description="Size of the output file so far")
+    error: Optional[str] = Field(None, description="Error message if the job failed")
+    download_url: Optional[str] = Field(None, description="Where to fetch the finished file")
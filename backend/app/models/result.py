@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Any
+
+class ResultPage(BaseModel):
+    result_id: str = Field(..., description="Result handle")
+    mode: str = Field(..., description="keyset (re-queried by key), spool (served from disk), or pending/failed for a result still being computed")
+    columns: List[str] = Field(..., description="Column names")
+    row_count: Optional[int] = Field(None, description="Total rows in the result")
+    rows: List[Any] = Field(..., description="Rows in this page")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, null on the last page")
+    error: Optional[str] = Field(None, description="Why a pending result failed")
@@ -0,0 +1,168 @@
+from app.config import get_settings
+from app.utils.cancellation import CancelToken, RequestCancelled
+from app.utils.metrics import metrics
+from contextlib import contextmanager
+from functools import lru_cache
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Lower value is served first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued; carries a Retry-After hint"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class StageLimiter:
+    """
+    Concurrency limit for one pipeline stage with a bounded priority queue.
+
+    Requests beyond the limit wait in priority order (FIFO within a class).
+    A request is shed up front when the queue is full of equal or higher
+    priority work, or when its estimated wait (queue position times the
+    stage's recent service time) would not fit its deadline; a full queue
+    makes room for interactive work by shedding the newest batch waiter.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._queue = []  # heap of [priority, seq, state]
+        self._seq = itertools.count()
+        self._service_time = None  # moving average of seconds per slot
+
+    def _estimate_wait(self, ahead: int) -> float:
+        service_time = self._service_time if self._service_time is not None else 1.0
+        return (ahead // self.limit + 1) * service_time
+
+    def _publish(self):
+        metrics.set_gauge(f"admission.{self.name}.queue_depth", len(self._queue))
+        metrics.set_gauge(f"admission.{self.name}.in_flight", self._in_flight)
+
+    def _reject(self, reason: str, retry_after: float):
+        metrics.incr(f"admission.{self.name}.rejected")
+        logger.warning(f"Shedding {self.name} request: {reason}")
+        raise AdmissionRejected(f"Server busy ({self.name}): {reason}", retry_after)
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def acquire(self, priority: str = "interactive", cancel_token: CancelToken = None):
+        rank = PRIORITIES[priority]
+        cancel_token = cancel_token or CancelToken()
+        cancel_token.check()
+        started = time.monotonic()
+
+        with cancel_token.on_cancel(self._wake), self._cond:
+            if self._in_flight < self.limit and not self._queue:
+                self._in_flight += 1
+                self._admitted(started)
+                return
+
+            ahead = sum(1 for entry in self._queue if entry[0] <= rank)
+            budget = self.max_wait
+            remaining = cancel_token.remaining()
+            if remaining is not None:
+                budget = min(budget, remaining)
+            estimated = self._estimate_wait(ahead)
+            drain_time = self._estimate_wait(len(self._queue))
+            if estimated > budget:
+                self._reject(f"estimated wait {estimated:.1f}s exceeds {budget:.1f}s", drain_time)
+
+            if len(self._queue) >= self.queue_size:
+                victim = max(self._queue)
+                if victim[0] <= rank:
+                    self._reject("queue full", drain_time)
+                self._queue.remove(victim)
+                heapq.heapify(self._queue)
+                victim[2]["shed"] = drain_time
+
+            entry = [rank, next(self._seq), {"shed": None}]
+            heapq.heappush(self._queue, entry)
+            self._publish()
+            self._cond.notify_all()
+
+            try:
+                while True:
+                    if entry[2]["shed"] is not None:
+                        self._reject("displaced by higher-priority work", entry[2]["shed"])
+                    if self._queue[0] is entry and self._in_flight < self.limit:
+                        heapq.heappop(self._queue)
+                        self._in_flight += 1
+                        self._admitted(started)
+                        # The next waiter may have checked (and gone back to sleep) before
+                        # this one left the head, while another slot is still free
+                        self._cond.notify_all()
+                        return
+                    cancel_token.check()
+                    timeout = started + budget - time.monotonic()
+                    if timeout <= 0:
+                        self._reject("timed out in queue", drain_time)
+                    self._cond.wait(timeout)
+            except (AdmissionRejected, RequestCancelled):
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                self._publish()
+                self._cond.notify_all()
+                raise
+
+    def _admitted(self, started: float):
+        metrics.incr(f"admission.{self.name}.admitted")
+        metrics.observe(f"admission.{self.name}.wait_seconds", time.monotonic() - started)
+        self._publish()
+
+    def release(self, service_time: float):
+        with self._cond:
+            self._in_flight -= 1
+            if self._service_time is None:
+                self._service_time = service_time
+            else:
+                self._service_time = 0.8 * self._service_time + 0.2 * service_time
+            self._publish()
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: str = "interactive", cancel_token: CancelToken = None):
+        """Hold one of the stage's slots for the duration of the block"""
+        self.acquire(priority, cancel_token)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+class AdmissionController:
+    """Per-stage limiters in front of the chat pipeline (LLM calls and user queries)"""
+
+    def __init__(self):
+        self.stages = {
+            "llm": StageLimiter(
+                "llm", settings.LLM_MAX_CONCURRENT, settings.ADMISSION_QUEUE_SIZE, settings.ADMISSION_MAX_WAIT
+            ),
+            "db": StageLimiter(
+                "db", settings.DB_MAX_CONCURRENT, settings.ADMISSION_QUEUE_SIZE, settings.ADMISSION_MAX_WAIT
+            )
+        }
+
+    def slot(self, stage: str, priority: str = "interactive", cancel_token: CancelToken = None):
+        return self.stages[stage].slot(priority, cancel_token)
+
+@lru_cache()
+def get_admission_controller() -> AdmissionController:
+    return AdmissionController()
@@ -0,0 +1,277 @@
+from app.config import get_settings
+from app.database.connection import execute_query
+from app.database.tenants import current_tenant
+from app.services.db_service import DatabaseService
+from app.utils.cancellation import CancelToken
+from app.utils.metrics import metrics
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import logging
+import math
+import re
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+Z_95 = 1.96
+# ANALYZE samples 300 x default_statistics_target (100) rows per table
+STATS_SAMPLE_ROWS = 30000
+
+IDENTIFIER = r'(?:[A-Za-z_]\w*|"[^"]+")'
+AGGREGATE_QUERY = re.compile(
+    r"^\s*select\s+(?P<select>.+?)"
+    rf"\s+from\s+(?P<table>(?:{IDENTIFIER}\.)?{IDENTIFIER})"
+    r"(?:\s+(?:as\s+)?(?P<alias>(?!where\b|group\b|order\b)[A-Za-z_]\w*))?"
+    r"(?:\s+where\s+(?P<where>.+?))?"
+    r"(?:\s+group\s+by\s+(?P<group_by>.+?))?"
+    r"(?:\s+order\s+by\s+(?P<order_by>.+?))?"
+    r"\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+# Shapes whose sampled result can't simply be scaled up (or that aren't parsed safely)
+UNSUPPORTED = re.compile(
+    r"\b(join|having|distinct|union|intersect|except|limit|offset|fetch|with|over|tablesample)\b",
+    re.IGNORECASE
+)
+AGGREGATE_ITEM = re.compile(
+    rf"^(?P<func>count|sum|avg)\s*\((?P<arg>.*)\)(?:\s+(?:as\s+)?(?P<alias>{IDENTIFIER}))?$",
+    re.IGNORECASE | re.DOTALL
+)
+ALIASED_ITEM = re.compile(rf"^(?P<expr>.*\S)\s+(?:as\s+)?(?P<alias>{IDENTIFIER})$", re.IGNORECASE | re.DOTALL)
+# String literals and quoted identifiers, whose text must not be read as keywords
+QUOTED = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+EQUALITY = re.compile(
+    rf"^(?:{IDENTIFIER}\.)?(?P<column>{IDENTIFIER})\s*=\s*(?P<value>'(?:[^']|'')*'|-?\d+(?:\.\d+)?)$"
+)
+
+def split_top_level(text: str) -> list:
+    """Split on commas outside parentheses and string literals"""
+    parts, depth, in_string, start = [], 0, False, 0
+    for i, char in enumerate(text):
+        if char == "'":
+            in_string = not in_string
+        elif not in_string and char == "(":
+            depth += 1
+        elif not in_string and char == ")":
+            depth -= 1
+        elif not in_string and depth == 0 and char == ",":
+            parts.append(text[start:i].strip())
+            start = i + 1
+    parts.append(text[start:].strip())
+    return parts
+
+def _balanced(text: str) -> bool:
+    depth = 0
+    for char in text:
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if depth < 0:
+            return False
+    return depth == 0
+
+def _mask_quoted(sql: str) -> str:
+    """sql with the insides of literals and quoted identifiers blanked (same length, so offsets still apply)"""
+    return QUOTED.sub(lambda match: match[0][0] + " " * (len(match[0]) - 2) + match[0][-1], sql)
+
+def _normalize(expression: str) -> str:
+    return re.sub(r"\s+", "", expression.lower())
+
+def _unquote(identifier: str) -> str:
+    return identifier[1:-1] if identifier.startswith('"') else identifier.lower()
+
+def parse_aggregate_query(sql: str):
+    """
+    Parts of a single-table COUNT/SUM/AVG query (optionally filtered,
+    grouped and ordered), or None for any other shape.
+
+    Every non-aggregate output column must be a GROUP BY expression, so
+    each output row is one group whose counts and sums scale with the
+    sample.
+    """
+    masked = _mask_quoted(sql)
+    if masked.lower().count("select") != 1 or UNSUPPORTED.search(masked):
+        return None
+    match = AGGREGATE_QUERY.match(masked)
+    if not match:
+        return None
+    # Clauses are located in the masked text and read from the original
+    parts = {
+        name: sql[match.start(name):match.end(name)] if match[name] is not None else None
+        for name in AGGREGATE_QUERY.groupindex
+    }
+
+    group_by = [_normalize(item) for item in split_top_level(parts["group_by"])] if parts["group_by"] else []
+    items = []
+    for position, item in enumerate(split_top_level(parts["select"]), 1):
+        aggregate = AGGREGATE_ITEM.match(item)
+        if aggregate and _balanced(aggregate["arg"]):
+            func = aggregate["func"].lower()
+            items.append({
+                "func": func,
+                "arg": aggregate["arg"].strip(),
+                "alias": aggregate["alias"] or func,
+                "text": item
+            })
+            continue
+        aliased = ALIASED_ITEM.match(item)
+        expression = aliased["expr"] if aliased else item
+        if _normalize(expression) not in group_by and str(position) not in group_by:
+            return None
+        items.append({"func": None, "text": item})
+
+    if not any(item["func"] for item in items):
+        return None
+    return {**parts, "items": items}
+
+class Approximator:
+    """
+    Approximate answers for aggregate queries that would scan huge tables.
+
+    Only queries whose planner cost exceeds APPROX_COST_THRESHOLD are
+    approximated. A plain COUNT(*), unfiltered or filtered on a column's
+    common value, is answered from pg_class.reltuples and pg_stats without
+    touching the table. Other single-table COUNT/SUM/AVG queries read a
+    TABLESAMPLE SYSTEM sample of about APPROX_SAMPLE_ROWS rows and scale
+    counts and sums up. Every answer carries a 95% relative error bound.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.APPROX_EXACT_MAX_CONCURRENT, thread_name_prefix="exact"
+        )
+
+    @staticmethod
+    def _table_stats(table: str):
+        rows = execute_query("""
+            SELECT c.reltuples, s.n_mod_since_analyze
+            FROM pg_class c
+            LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+            WHERE c.oid = to_regclass(%s)
+        """, (table,))
+        if not rows or rows[0]["reltuples"] is None or rows[0]["reltuples"] < 0:
+            return None  # unknown table, or never analyzed
+        return float(rows[0]["reltuples"]), float(rows[0]["n_mod_since_analyze"] or 0)
+
+    def _count_from_stats(self, query: dict):
+        items = query["items"]
+        if len(items) != 1 or items[0]["func"] != "count" or items[0]["arg"] != "*" or query["group_by"]:
+            return None
+        stats = self._table_stats(query["table"])
+        if stats is None:
+            return None
+        reltuples, modified = stats
+        # Rows changed since the last ANALYZE bound how far off reltuples can be
+        relative_error = modified / max(reltuples, 1.0)
+
+        fraction = 1.0
+        if query["where"]:
+            equality = EQUALITY.match(query["where"].strip())
+            if not equality:
+                return None
+            schema, _, table = query["table"].rpartition(".")
+            rows = execute_query("""
+                SELECT most_common_vals::text::text[] AS common_values, most_common_freqs AS frequencies
+                FROM pg_stats
+                WHERE schemaname = COALESCE(NULLIF(%s, ''), current_schema()) AND tablename = %s AND attname = %s
+            """, (_unquote(schema) if schema else "", _unquote(table), _unquote(equality["column"])))
+            value = equality["value"]
+            value = value[1:-1].replace("''", "'") if value.startswith("'") else value
+            common_values = (rows[0]["common_values"] or []) if rows else []
+            if value not in common_values:
+                return None
+            fraction = float(rows[0]["frequencies"][common_values.index(value)])
+            relative_error += Z_95 * math.sqrt((1 - fraction) / (fraction * STATS_SAMPLE_ROWS))
+
+        return {
+            "success": True,
+            "data": [{_unquote(items[0]["alias"]): int(round(reltuples * fraction))}],
+            "row_count": 1,
+            "approximation": {
+                "method": "statistics",
+                "relative_error": round(relative_error, 4),
+                "confidence": 0.95
+            }
+        }
+
+    def _sample(self, query: dict, cancel_token: CancelToken = None, summarize: bool = False):
+        stats = self._table_stats(query["table"])
+        if stats is None or stats[0] <= 0:
+            return None
+        percent = 100.0 * settings.APPROX_SAMPLE_ROWS / stats[0]
+        if percent >= settings.APPROX_MAX_SAMPLE_PERCENT:
+            return None
+        scale = 100.0 / percent
+
+        select = []
+        for item in query["items"]:
+            if item["func"] == "count":
+                select.append(f"(COUNT({item['arg']}) * {scale!r})::bigint AS {item['alias']}")
+            elif item["func"] == "sum":
+                select.append(f"SUM({item['arg']}) * {scale!r} AS {item['alias']}")
+            else:
+                select.append(item["text"])
+        select.append('COUNT(*) AS "_sample_rows"')
+        select.append('COUNT(DISTINCT (ctid::text::point)[0]) AS "_sample_pages"')
+
+        sql = f"SELECT {', '.join(select)} FROM {query['table']}"
+        if query["alias"]:
+            sql += f" {query['alias']}"
+        sql += f" TABLESAMPLE SYSTEM ({percent:.6f})"
+        for clause, keyword in (("where", "WHERE"), ("group_by", "GROUP BY"), ("order_by", "ORDER BY")):
+            if query[clause]:
+                sql += f" {keyword} {query[clause]}"
+
+        result = DatabaseService.execute_user_query(sql, cancel_token, summarize)
+        if not result["success"]:
+            logger.warning(f"Sampled query failed, running exactly: {result['error']}")
+            return None
+
+        sample_rows = [row.pop("_sample_rows") for row in result["data"]]
+        sample_pages = [row.pop("_sample_pages") for row in result["data"]]
+        if result.get("summary"):
+            for name in ("_sample_rows", "_sample_pages"):
+                result["summary"]["columns"].pop(name, None)
+        # SYSTEM samples whole pages and rows on a page tend to be alike, so
+        # count a group's pages rather than its rows when they are fewer
+        smallest = min((min(rows, pages) for rows, pages in zip(sample_rows, sample_pages)), default=0)
+        result["approximation"] = {
+            "method": "tablesample",
+            "sample_percent": round(percent, 4),
+            "sample_rows": sum(sample_rows),
+            "relative_error": round(Z_95 / math.sqrt(smallest), 4) if smallest else None,
+            "confidence": 0.95
+        }
+        return result
+
+    def approximate(self, sql: str, cancel_token: CancelToken = None, summarize: bool = False):
+        """Approximate result for an expensive aggregate query, or None to run it exactly"""
+        query = parse_aggregate_query(sql)
+        if query is None:
+            return None
+        try:
+            cost = float(DatabaseService.explain(sql)["Total Cost"])
+            if cost < settings.APPROX_COST_THRESHOLD:
+                return None
+            result = self._count_from_stats(query) or self._sample(query, cancel_token, summarize)
+        except Exception as e:
+            logger.warning(f"Could not approximate query, running exactly: {e}")
+            return None
+        if result is None:
+            return None
+        result["approximation"]["estimated_cost"] = cost
+        metrics.incr(f"approx.{result['approximation']['method']}")
+        return result
+
+    def run_exact_later(self, fn):
+        """Run fn (the exact query) in the background under the caller's tenant"""
+        tenant_id = current_tenant.get()
+
+        def run():
+            # Executor threads don't inherit the caller's tenant
+            current_tenant.set(tenant_id)
+            fn()
+
+        self._executor.submit(run)
+
+@lru_cache()
+def get_approximator() -> Approximator:
+    return Approximator()
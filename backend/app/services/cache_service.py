@@ -0,0 +1,270 @@
+from app.config import get_settings
+from functools import lru_cache
+import logging
+import json
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+_MISSING = object()
+
+class SharedCache:
+    """
+    Key/value cache shared by every worker process on the host.
+
+    Entries live in a SQLite database in WAL mode, so readers never block
+    writers. Missing entries are filled by exactly one worker at a time and
+    the total payload size is bounded by evicting least recently used entries.
+
+    Hits don't write: an entry's access time is refreshed at most every
+    TOUCH_INTERVAL seconds, and those touches are batched into the next
+    write transaction. The total size is kept in a meta row by triggers.
+    """
+
+    FILL_POLL_INTERVAL = 0.05
+    TOUCH_INTERVAL = 60.0
+    TOUCH_BATCH = 256
+
+    def __init__(self, path: str, max_bytes: int, fill_timeout: float):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.fill_timeout = fill_timeout
+        self._local = threading.local()
+        self._touches = {}  # (namespace, key) -> access time not yet written
+        self._touches_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_tables()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection to the cache database"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.fill_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_tables(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._create_tables(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)")
+        # Running total of entries.size, so eviction never has to sum the table
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute(
+            "INSERT OR IGNORE INTO meta (name, value) "
+            "SELECT 'total_size', COALESCE(SUM(size), 0) FROM entries"
+        )
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS entries_size_insert AFTER INSERT ON entries BEGIN
+                UPDATE meta SET value = value + NEW.size WHERE name = 'total_size';
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS entries_size_update AFTER UPDATE OF size ON entries BEGIN
+                UPDATE meta SET value = value + NEW.size - OLD.size WHERE name = 'total_size';
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS entries_size_delete AFTER DELETE ON entries BEGIN
+                UPDATE meta SET value = value - OLD.size WHERE name = 'total_size';
+            END
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS fills (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+
+    def get(self, namespace: str, key: str, default=None):
+        """Return a cached value, or default if missing or expired"""
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at, last_access FROM entries WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+        if row is None:
+            return default
+
+        value, expires_at, last_access = row
+        if expires_at is not None and expires_at <= now:
+            return default  # removed by the next eviction
+
+        if now - last_access >= self.TOUCH_INTERVAL:
+            with self._touches_lock:
+                self._touches[(namespace, key)] = now
+                flush = len(self._touches) >= self.TOUCH_BATCH
+            if flush:
+                self._write(lambda conn: None)
+        return json.loads(value)
+
+    def _write(self, statements):
+        """Run statements(conn) in one write transaction, together with the pending access times"""
+        with self._touches_lock:
+            touches, self._touches = self._touches, {}
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "UPDATE entries SET last_access = MAX(last_access, ?) WHERE namespace = ? AND key = ?",
+                [(now, namespace, key) for (namespace, key), now in touches.items()]
+            )
+            statements(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def set(self, namespace: str, key: str, value, ttl: float = None):
+        """Store a JSON-serializable value, evicting old entries if over budget"""
+        payload = json.dumps(value, default=str)
+        size = len(payload)
+        if size > self.max_bytes:
+            logger.warning(f"Cache entry {namespace}/{key} is larger than the cache budget, not stored")
+            return
+
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+
+        def store(conn):
+            # An upsert (not INSERT OR REPLACE) so the size triggers see the update
+            conn.execute(
+                "INSERT INTO entries (namespace, key, value, size, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                "expires_at = excluded.expires_at, last_access = excluded.last_access",
+                (namespace, key, payload, size, expires_at, now)
+            )
+            self._evict(conn, now)
+
+        self._write(store)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then least recently used ones until under budget"""
+        conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        total = self._total_size(conn)
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        victims = []
+        for namespace, key, size in conn.execute(
+            "SELECT namespace, key, size FROM entries ORDER BY last_access"
+        ):
+            victims.append((namespace, key))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", victims)
+        logger.info(f"Evicted {len(victims)} cache entries")
+
+    @staticmethod
+    def _total_size(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT value FROM meta WHERE name = 'total_size'").fetchone()[0]
+
+    def delete(self, namespace: str, key: str):
+        self._connect().execute(
+            "DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+
+    def clear(self, namespace: str):
+        self._connect().execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def _try_claim(self, namespace: str, key: str, owner: str) -> bool:
+        """Try to become the single worker filling namespace/key"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM fills WHERE expires_at <= ?", (now,))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO fills (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, owner, now + self.fill_timeout)
+            )
+            conn.execute("COMMIT")
+            return cursor.rowcount == 1
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _release(self, namespace: str, key: str, owner: str):
+        self._connect().execute(
+            "DELETE FROM fills WHERE namespace = ? AND key = ? AND owner = ?",
+            (namespace, key, owner)
+        )
+
+    def get_or_compute(self, namespace: str, key: str, compute, ttl: float = None):
+        """
+        Return the cached value, computing it if missing.
+
+        Only one worker runs compute() for a given key; the others wait for
+        its result. If the filling worker does not finish within the fill
+        timeout, waiters compute the value themselves.
+        """
+        value = self.get(namespace, key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        owner = f"{os.getpid()}:{threading.get_ident()}"
+        deadline = time.monotonic() + self.fill_timeout
+
+        while True:
+            if self._try_claim(namespace, key, owner):
+                try:
+                    # Another worker may have finished between our get and claim
+                    value = self.get(namespace, key, _MISSING)
+                    if value is _MISSING:
+                        value = compute()
+                        self.set(namespace, key, value, ttl)
+                    return value
+                finally:
+                    self._release(namespace, key, owner)
+
+            time.sleep(self.FILL_POLL_INTERVAL)
+            value = self.get(namespace, key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            if time.monotonic() > deadline:
+                logger.warning(f"Timed out waiting for cache fill of {namespace}/{key}, computing locally")
+                return compute()
+
+@lru_cache()
+def get_cache() -> SharedCache:
+    return SharedCache(
+        path=os.path.join(settings.DATA_DIR, "cache.sqlite3"),
+        max_bytes=settings.CACHE_MAX_BYTES,
+        fill_timeout=settings.CACHE_FILL_TIMEOUT
+    )
@@ -1,23 +1,175 @@
+from app.database.tenants import DEFAULT_TENANT, current_tenant, scoped_key
 from app.services.llm_service import LLMService
 from app.services.db_service import DatabaseService
+from app.services.cache_service import get_cache
+from app.services.example_store import get_example_store
+from app.services.result_store import get_result_store
+from app.services.admission_service import get_admission_controller, AdmissionRejected
+from app.services.approximate_service import get_approximator
+from app.utils.cancellation import CancelToken, RequestCancelled
+from app.utils.metrics import metrics
+from app.config import get_settings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import contextvars
 import logging
+import hashlib
 import json
+import re
+import threading
+import time
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 class ChatService:
-    def __init__(self):
+    """
+    Question answering for one tenant.
+
+    Each tenant has its own schema snapshot, profile and rendered prompts;
+    shared caches and stores are keyed by tenant (see scoped_key).
+    """
+
+    def __init__(self, tenant_id: str = DEFAULT_TENANT):
+        self.tenant_id = tenant_id
         self.llm_service = LLMService()
         self.db_service = DatabaseService()
+        self.cache = get_cache()
+        self.example_store = get_example_store()
+        self.result_store = get_result_store()
+        self.admission = get_admission_controller()
+        self.approximator = get_approximator()
         self.schema = None
+        self.schema_fingerprint = None
+        self.schema_loaded_at = None
+        self.profile = None  # refreshed in the background by run_profiler
+    
+    def scoped(self, key: str) -> str:
+        """Shared cache/store key for this tenant"""
+        return scoped_key(self.tenant_id, key)
     
     def initialize(self):
-        """Load database schema"""
-        self.schema = self.db_service.get_schema()
-        logger.info("Chat service initialized with database schema")
+        """(Re)load database schema (shared across workers through the cache)"""
+        schema = self.cache.get_or_compute(
+            "schema", self.scoped("public"), self.db_service.get_schema, ttl=settings.SCHEMA_CACHE_TTL
+        )
+        fingerprint = self.db_service.schema_fingerprint(schema)
+        if self.schema_fingerprint is not None and fingerprint != self.schema_fingerprint:
+            logger.info(f"Schema of tenant {self.tenant_id} changed")
+        # Profile built by any worker's background profiler, if there is one yet
+        profile = self.cache.get("profile", self.scoped(fingerprint))
+        self.schema, self.schema_fingerprint, self.profile = schema, fingerprint, profile
+        self.schema_loaded_at = time.time()
+        logger.info(f"Chat service for tenant {self.tenant_id} initialized with database schema")
+    
+    def refresh_schema_if_stale(self):
+        """Reload the schema well before the in-memory copy outlives SCHEMA_CACHE_TTL"""
+        if self.schema_loaded_at is None:
+            return
+        if time.time() - self.schema_loaded_at >= 0.75 * settings.SCHEMA_CACHE_TTL:
+            self.initialize()
+    
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Normalize a question so trivially different phrasings share a cache key"""
+        return re.sub(r'\s+', ' ', question.strip().lower()).rstrip('?.! ')
+    
+    def run_query(self, sql: str, cancel_token: CancelToken = None, priority: str = "interactive",
+                  approximate: bool = False, summarize: bool = False):
+        """
+        Execute a query, serving small recent results from the shared cache.
+
+        With approximate, expensive aggregate queries may be answered from
+        statistics or a sample instead (the result has an "approximation").
+        With summarize, the result has a "summary" (see summarize_columns).
+        """
+        key = self.scoped(hashlib.sha1(sql.encode('utf-8')).hexdigest())
+        cached = self.cache.get("result", key)
+        if cached is not None and (not summarize or "summary" in cached):
+            return cached
+        
+        with self.admission.slot("db", priority, cancel_token):
+            query_result = self.approximator.approximate(sql, cancel_token, summarize) if approximate else None
+            if query_result is not None:
+                return query_result
+            query_result = self.db_service.execute_user_query(sql, cancel_token, summarize)
+        if query_result["success"] and query_result["row_count"] <= settings.RESULT_CACHE_MAX_ROWS:
+            self.cache.set("result", key, query_result, ttl=settings.RESULT_CACHE_TTL)
+        return query_result
+    
+    def run_exact_in_background(self, sql: str) -> str:
+        """Reserve a result handle and fill it with the exact result in the background"""
+        result_id = self.result_store.reserve(sql, self.tenant_id)
+
+        def run():
+            try:
+                query_result = self.run_query(sql, priority="batch")
+            except Exception as e:
+                query_result = {"success": False, "error": str(e)}
+            if query_result["success"]:
+                self.result_store.save(sql, query_result, self.tenant_id, result_id)
+            else:
+                self.result_store.fail(result_id, query_result["error"])
+
+        self.approximator.run_exact_later(run)
+        return result_id
+    
+    @staticmethod
+    def record_answer():
+        """Track LLM round trips (including failed questions) per answered question"""
+        metrics.incr("chat.answered")
+        metrics.set_gauge(
+            "chat.llm_calls_per_answer",
+            metrics.counter("chat.llm_calls") / metrics.counter("chat.answered")
+        )
+    
+    def build_success_response(self, sql: str, query_result: dict, include_summary: bool = False,
+                               exact_in_background: bool = False):
+        """Build the chat response for a successfully executed query"""
+        data_preview = query_result["data"][:5] if query_result["data"] else []
+
+        # Create a natural language response
+        if query_result["row_count"] == 0:
+            response_text = "The query returned no results."
+        elif query_result["row_count"] == 1:
+            response_text = f"Found 1 result: {json.dumps(data_preview[0], indent=2)}"
+        else:
+            response_text = f"Found {query_result['row_count']} results. Here are the first few:\n{json.dumps(data_preview, indent=2)}"
+
+        approximation = query_result.get("approximation")
+        if approximation:
+            error = approximation["relative_error"]
+            margin = f" (±{error:.1%} at 95% confidence)" if error is not None else ""
+            response_text = f"Approximate answer{margin}. {response_text}"
+
+        response = {
+            "response": response_text,
+            "sql_executed": sql,
+            "row_count": query_result["row_count"],
+            "data_preview": data_preview,
+            "result_id": self.result_store.save(sql, query_result, self.tenant_id)
+        }
+        if approximation:
+            response["approximation"] = approximation
+            if exact_in_background:
+                response["exact_result_id"] = self.run_exact_in_background(sql)
+        if include_summary:
+            response["summary"] = query_result.get("summary")
+        return response
     
-    def process_message(self, user_message: str):
-        """Process user message and return response"""
+    def process_message(self, user_message: str, cancel_token: CancelToken = None, priority: str = "interactive",
+                        include_summary: bool = False, approximate: bool = False, exact_in_background: bool = False):
+        """
+        Process user message and return response.
+
+        Every stage checks cancel_token (client gone or deadline passed) and
+        raises RequestCancelled instead of starting more work. LLM and
+        database stages go through admission control, which raises
+        AdmissionRejected when the request should be shed.
+        """
+        if cancel_token is None:
+            cancel_token = CancelToken()
 
         if not self.schema:
             self.initialize()
@@ -28,11 +180,33 @@ class ChatService:
         # Get LLM response (SQL as text) with retry on error
         max_retries = 2
         last_error = None
+        nl2sql_key = self.scoped(f"{self.schema_fingerprint}:{self.normalize_question(user_message)}")
 
         try:
+            # Reuse SQL another worker already generated for this question
+            cached_sql = self.cache.get("nl2sql", nl2sql_key)
+            if cached_sql:
+                query_result = self.run_query(cached_sql, cancel_token, priority, approximate, include_summary)
+                if query_result["success"]:
+                    logger.info(f"Answered from cached SQL: {cached_sql}")
+                    self.record_answer()
+                    return self.build_success_response(
+                        cached_sql, query_result, include_summary, exact_in_background
+                    )
+                self.cache.delete("nl2sql", nl2sql_key)
+
+            examples = self.example_store.search(
+                user_message, self.scoped(self.schema_fingerprint), settings.FEWSHOT_EXAMPLES
+            )
+            metrics.observe("chat.fewshot_examples", len(examples))
+
             for attempt in range(max_retries):
-                response = self.llm_service.chat(messages, self.schema)
-                sql_text = response.choices[0].message.content
+                cancel_token.check()
+                with self.admission.slot("llm", priority, cancel_token):
+                    sql_text = self.llm_service.generate(
+                        messages, self.schema, examples, self.profile, cancel_token
+                    )
+                metrics.incr("chat.llm_calls")
 
                 # Extract SQL
                 sql = self.llm_service.extract_sql(sql_text)
@@ -40,26 +214,14 @@ class ChatService:
                 logger.info(f"Generated SQL (attempt {attempt + 1}): {sql}")
 
                 # Execute query
-                query_result = self.db_service.execute_user_query(sql)
+                query_result = self.run_query(sql, cancel_token, priority, approximate, include_summary)
 
                 # Build response
                 if query_result["success"]:
-                    data_preview = query_result["data"][:5] if query_result["data"] else []
-
-                    # Create a natural language response
-                    if query_result["row_count"] == 0:
-                        response_text = "The query returned no results."
-                    elif query_result["row_count"] == 1:
-                        response_text = f"Found 1 result: {json.dumps(data_preview[0], indent=2)}"
-                    else:
-                        response_text = f"Found {query_result['row_count']} results. Here are the first few:\n{json.dumps(data_preview, indent=2)}"
-
-                    return {
-                        "response": response_text,
-                        "sql_executed": sql,
-                        "row_count": query_result["row_count"],
-                        "data_preview": data_preview
-                    }
+                    self.cache.set("nl2sql", nl2sql_key, sql, ttl=settings.NL2SQL_CACHE_TTL)
+                    self.example_store.add(user_message, sql, self.scoped(self.schema_fingerprint))
+                    self.record_answer()
+                    return self.build_success_response(sql, query_result, include_summary, exact_in_background)
                 else:
                     # Query failed - provide error feedback to LLM for retry
                     last_error = query_result["error"]
@@ -84,10 +246,109 @@ class ChatService:
                             "error": last_error
                         }
                 
+        except RequestCancelled as e:
+            metrics.incr("chat.cancelled")
+            logger.warning(f"Request cancelled: {e}")
+            raise
+        except AdmissionRejected:
+            raise
         except Exception as e:
             logger.error(f"Error in process_message: {e}")
             return {
                 "response": f"An error occurred: {str(e)}",
                 "sql_executed": None,
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+
+    def process_planned(self, user_message: str, cancel_token: CancelToken = None, priority: str = "interactive",
+                        **options):
+        """
+        Planner mode: answer a compound question as independent sub-questions.
+
+        The LLM splits the question, then every sub-question goes through
+        process_message concurrently (its own SQL generation and pool
+        connection), so the answer takes about as long as the slowest part.
+        A question that doesn't split is answered normally.
+        """
+        if cancel_token is None:
+            cancel_token = CancelToken()
+
+        if not self.schema:
+            self.initialize()
+
+        try:
+            with self.admission.slot("llm", priority, cancel_token):
+                sub_questions = self.llm_service.decompose(user_message, self.schema, cancel_token)
+            metrics.incr("chat.llm_calls")
+        except (RequestCancelled, AdmissionRejected):
+            raise
+        except Exception as e:
+            logger.warning(f"Question decomposition failed, answering as one question: {e}")
+            sub_questions = [user_message]
+
+        if len(sub_questions) < 2:
+            return self.process_message(user_message, cancel_token, priority, **options)
+
+        metrics.incr("chat.planned")
+        metrics.observe("chat.plan_parts", len(sub_questions))
+        logger.info(f"Answering {len(sub_questions)} sub-questions in parallel: {sub_questions}")
+
+        executor = _planner_executor()
+        with metrics.timer("chat.plan_seconds"):
+            # Executor threads don't inherit the request's context (tenant)
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    self.process_message, question, cancel_token, priority, **options
+                )
+                for question in sub_questions
+            ]
+            parts = []
+            try:
+                for question, future in zip(sub_questions, futures):
+                    parts.append({"question": question, **future.result()})
+            except Exception:
+                # The request fails as a whole; stop the other parts
+                cancel_token.cancel("sub-question failed")
+                raise
+
+        sections = [f"**{i}. {part['question']}**\n{part['response']}" for i, part in enumerate(parts, 1)]
+        answered = [part for part in parts if not part.get("error")]
+        return {
+            "response": f"Answered in {len(parts)} parts:\n\n" + "\n\n".join(sections),
+            "sql_executed": ";\n\n".join(part["sql_executed"] for part in parts if part.get("sql_executed")) or None,
+            "parts": parts,
+            "error": None if answered else "None of the sub-questions could be answered"
+        }
+
+@lru_cache()
+def _planner_executor() -> ThreadPoolExecutor:
+    """Threads answering sub-questions (admission control still bounds LLM/DB work)"""
+    return ThreadPoolExecutor(max_workers=settings.PLANNER_MAX_WORKERS, thread_name_prefix="planner")
+
+_services = OrderedDict()
+_services_lock = threading.Lock()
+
+def get_chat_service(tenant_id: str = None) -> ChatService:
+    """
+    Chat service for a tenant (the current request's by default), created on
+    first use. Beyond TENANT_MAX_ACTIVE the least recently used tenant's
+    in-memory state is dropped; the default tenant's is always kept.
+    """
+    tenant_id = tenant_id or current_tenant.get()
+    with _services_lock:
+        service = _services.get(tenant_id)
+        if service is None:
+            service = _services[tenant_id] = ChatService(tenant_id)
+        _services.move_to_end(tenant_id)
+        for other in list(_services):
+            if len(_services) <= settings.TENANT_MAX_ACTIVE:
+                break
+            if other not in (tenant_id, DEFAULT_TENANT):
+                del _services[other]
+        return service
+
+def active_chat_services() -> list:
+    """Chat services of the tenants currently held in memory"""
+    with _services_lock:
+        return list(_services.values())
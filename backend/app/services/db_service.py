@@ -1,6 +1,13 @@
-from app.database.connection import execute_query
+from app.database.connection import execute_query, execute_query_tuples
+from app.services.query_log import get_query_log
+from app.services.summary_service import summarize_columns
+from app.utils.cancellation import CancelToken, RequestCancelled
+from app.utils.metrics import metrics
 import logging
+import hashlib
+import json
 import re
+import time
 from decimal import Decimal
 from datetime import datetime, date
 
@@ -10,7 +17,7 @@ class DatabaseService:
     
     @staticmethod
     def get_schema():
-        """Get comprehensive database schema information including relationships"""
+        """Get comprehensive schema information (of the search_path schema) including relationships"""
         sql = """
             WITH table_info AS (
                 SELECT
@@ -27,7 +34,7 @@ class DatabaseService:
                                    ON tc.constraint_name = kcu.constraint_name
                                    AND tc.table_schema = kcu.table_schema
                                  WHERE tc.constraint_type = 'PRIMARY KEY'
-                                   AND tc.table_schema = 'public'
+                                   AND tc.table_schema = current_schema()
                                    AND tc.table_name = t.table_name
                                    AND kcu.column_name = c.column_name
                                  LIMIT 1
@@ -38,7 +45,8 @@ class DatabaseService:
                 FROM information_schema.tables t
                 JOIN information_schema.columns c
                     ON t.table_name = c.table_name
-                WHERE t.table_schema = 'public'
+                    AND t.table_schema = c.table_schema
+                WHERE t.table_schema = current_schema()
                     AND t.table_type = 'BASE TABLE'
                 GROUP BY t.table_name
             ),
@@ -60,7 +68,7 @@ class DatabaseService:
                     ON ccu.constraint_name = tc.constraint_name
                     AND ccu.table_schema = tc.table_schema
                 WHERE tc.constraint_type = 'FOREIGN KEY'
-                    AND tc.table_schema = 'public'
+                    AND tc.table_schema = current_schema()
                 GROUP BY tc.table_name
             )
             SELECT
@@ -78,6 +86,30 @@ class DatabaseService:
             logger.error(f"Error getting schema: {e}")
             raise
     
+    @staticmethod
+    def get_indexes():
+        """Key columns of every index in the current schema, in index order"""
+        sql = """
+            SELECT
+                t.relname AS table_name,
+                i.indexrelid::regclass::text AS index_name,
+                array_agg(a.attname ORDER BY k.ordinality) AS columns
+            FROM pg_index i
+            JOIN pg_class t ON t.oid = i.indrelid
+            JOIN pg_namespace n ON n.oid = t.relnamespace
+            CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ordinality)
+            JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+            WHERE n.nspname = current_schema()
+            GROUP BY t.relname, i.indexrelid
+        """
+        return execute_query(sql) or []
+    
+    @staticmethod
+    def schema_fingerprint(schema) -> str:
+        """Short stable hash of the schema, used to key schema-dependent caches"""
+        payload = json.dumps(schema, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+    
     @staticmethod
     def validate_sql(sql: str) -> tuple[bool, str]:
         """Validate SQL query for safety"""
@@ -99,6 +131,19 @@ class DatabaseService:
         
         return True, "Valid"
     
+    @staticmethod
+    def explain(sql: str) -> dict:
+        """Planner estimate (EXPLAIN without ANALYZE) for a validated query"""
+        is_valid, message = DatabaseService.validate_sql(sql)
+        if not is_valid:
+            raise ValueError(message)
+
+        results = execute_query(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = results[0]["QUERY PLAN"]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]["Plan"]
+    
     @staticmethod
     def serialize_value(value):
         """Convert non-JSON-serializable types to JSON-serializable ones"""
@@ -135,32 +180,51 @@ class DatabaseService:
             return []
     
     @staticmethod
-    def execute_user_query(sql: str):
-        """Execute user-provided SQL query with validation"""
+    def execute_user_query(sql: str, cancel_token: CancelToken = None, summarize: bool = False):
+        """
+        Execute user-provided SQL query with validation.
+
+        With summarize, the result also has a "summary" built from the raw
+        cursor tuples before they are serialized.
+        """
         # Validate
         is_valid, message = DatabaseService.validate_sql(sql)
         if not is_valid:
             raise ValueError(message)
         
+        started = time.perf_counter()
         try:
-            results = execute_query(sql)
+            description, results = execute_query_tuples(sql, cancel_token=cancel_token)
+            duration_ms = (time.perf_counter() - started) * 1000
             
             # Serialize results to make them JSON-compatible
             if results:
+                names = [column.name for column in description]
                 serialized_results = [
-                    DatabaseService.serialize_row(row) 
+                    dict(zip(names, map(DatabaseService.serialize_value, row)))
                     for row in results
                 ]
             else:
                 serialized_results = []
             
-            return {
+            get_query_log().record(sql, duration_ms, len(serialized_results))
+            result = {
                 "success": True,
                 "data": serialized_results,
                 "row_count": len(serialized_results) if serialized_results else 0
             }
+            if summarize and description:
+                with metrics.timer("chat.summary_seconds"):
+                    result["summary"] = summarize_columns(
+                        [column.name for column in description], [column.type_code for column in description], results
+                    )
+            return result
+        except RequestCancelled:
+            get_query_log().record(sql, (time.perf_counter() - started) * 1000, error="cancelled")
+            raise
         except Exception as e:
             logger.error(f"Error executing query: {e}")
+            get_query_log().record(sql, (time.perf_counter() - started) * 1000, error=str(e))
             return {
                 "success": False,
                 "error": str(e),
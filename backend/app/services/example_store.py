@@ -0,0 +1,170 @@
+from app.config import get_settings
+from collections import Counter, defaultdict
+from functools import lru_cache
+import heapq
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "by", "with",
+    "is", "are", "was", "were", "be", "me", "my", "show", "list", "give", "get",
+    "what", "which", "who", "how", "do", "does", "all", "there", "their", "per"
+}
+
+def tokenize(text: str) -> list:
+    """Lowercased content words with a naive plural strip"""
+    tokens = []
+    for word in re.findall(r"[a-z0-9_]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+class _BM25Index:
+    """In-memory BM25 index over example questions"""
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.docs = {}
+        self.doc_ids = {}  # normalized question -> doc id
+        self.postings = defaultdict(set)
+        self.total_length = 0
+        self.last_id = 0
+
+    def add(self, doc_id: int, normalized: str, question: str, sql: str):
+        if doc_id in self.docs:
+            return
+        previous = self.doc_ids.get(normalized)
+        if previous is not None:
+            self._remove(previous)
+        self.doc_ids[normalized] = doc_id
+
+        terms = Counter(tokenize(question))
+        length = sum(terms.values()) or 1
+        self.docs[doc_id] = (question, sql, terms, length)
+        self.total_length += length
+        for term in terms:
+            self.postings[term].add(doc_id)
+        self.last_id = max(self.last_id, doc_id)
+
+    def _remove(self, doc_id: int):
+        _, _, terms, length = self.docs.pop(doc_id)
+        self.total_length -= length
+        for term in terms:
+            self.postings[term].discard(doc_id)
+
+    def search(self, question: str, k: int) -> list:
+        if not self.docs:
+            return []
+
+        n_docs = len(self.docs)
+        avg_length = self.total_length / n_docs
+        scores = defaultdict(float)
+        for term in set(tokenize(question)):
+            matching = self.postings.get(term)
+            if not matching:
+                continue
+            idf = math.log(1 + (n_docs - len(matching) + 0.5) / (len(matching) + 0.5))
+            for doc_id in matching:
+                _, _, terms, length = self.docs[doc_id]
+                tf = terms[term]
+                scores[doc_id] += idf * tf * (self.K1 + 1) / (
+                    tf + self.K1 * (1 - self.B + self.B * length / avg_length)
+                )
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [
+            {"question": self.docs[doc_id][0], "sql": self.docs[doc_id][1], "score": score}
+            for doc_id, score in best
+        ]
+
+class ExampleStore:
+    """
+    Persistent store of verified question -> SQL pairs used as few-shot examples.
+
+    Pairs are stored per schema fingerprint in SQLite, so every worker (and
+    every restart) sees the same examples. Retrieval uses an in-memory BM25
+    index per fingerprint that picks up rows added by other workers.
+    """
+
+    SYNC_INTERVAL = 5.0
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._synced_at = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS examples (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                schema_fingerprint TEXT NOT NULL,
+                question TEXT NOT NULL,
+                normalized_question TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                UNIQUE (schema_fingerprint, normalized_question)
+            )
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, question: str, sql: str, schema_fingerprint: str):
+        """Record a question whose SQL executed successfully"""
+        normalized = " ".join(tokenize(question))
+        if not normalized:
+            return
+        self._connect().execute(
+            "INSERT OR REPLACE INTO examples "
+            "(schema_fingerprint, question, normalized_question, sql, created_at) VALUES (?, ?, ?, ?, ?)",
+            (schema_fingerprint, question, normalized, sql, time.time())
+        )
+
+    def _sync(self, schema_fingerprint: str) -> _BM25Index:
+        """Load rows added since the last sync (possibly by other workers)"""
+        index = self._indexes.get(schema_fingerprint)
+        if index is None:
+            index = self._indexes[schema_fingerprint] = _BM25Index()
+
+        now = time.monotonic()
+        if now - self._synced_at.get(schema_fingerprint, 0) >= self.SYNC_INTERVAL:
+            rows = self._connect().execute(
+                "SELECT id, normalized_question, question, sql FROM examples WHERE schema_fingerprint = ? AND id > ? ORDER BY id",
+                (schema_fingerprint, index.last_id)
+            ).fetchall()
+            for doc_id, normalized, question, sql in rows:
+                index.add(doc_id, normalized, question, sql)
+            self._synced_at[schema_fingerprint] = now
+        return index
+
+    def search(self, question: str, schema_fingerprint: str, k: int) -> list:
+        """Top-k most similar verified examples for this schema"""
+        with self._lock:
+            index = self._sync(schema_fingerprint)
+            return index.search(question, k)
+
+@lru_cache()
+def get_example_store() -> ExampleStore:
+    return ExampleStore(os.path.join(settings.DATA_DIR, "examples.sqlite3"))
@@ -0,0 +1,231 @@
+from app.config import get_settings
+from app.database.connection import stream_query
+from app.database.tenants import DEFAULT_TENANT, current_tenant
+from app.services.admission_service import AdmissionRejected
+from app.services.db_service import DatabaseService
+from app.services.result_store import get_result_store
+from app.utils.metrics import metrics
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from functools import lru_cache
+import csv
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+class ExportService:
+    """
+    Runs export jobs in the background and spools their files to disk.
+
+    Jobs re-run the stored (already validated) SQL of a result handle.
+    Rows are read through a server-side cursor and written chunk by chunk,
+    so memory stays bounded whatever the result size, and each job's
+    statements are bounded by EXPORT_TIMEOUT. At most EXPORT_MAX_CONCURRENT
+    jobs run and EXPORT_QUEUE_SIZE wait; more are rejected. Job state is kept in
+    a JSON file next to the output, so any worker can report progress and
+    serve the finished file.
+    """
+
+    EXTENSIONS = {"csv": "csv", "parquet": "parquet"}
+
+    def __init__(self, spool_dir: str):
+        self.spool_dir = spool_dir
+        os.makedirs(spool_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.EXPORT_MAX_CONCURRENT, thread_name_prefix="export"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0  # queued or running in this process
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.spool_dir, f"{job_id}.json")
+
+    def file_path(self, job: dict) -> str:
+        return os.path.join(self.spool_dir, f"{job['job_id']}.{self.EXTENSIONS[job['format']]}")
+
+    def _save(self, job: dict):
+        tmp_path = self._state_path(job["job_id"]) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self._state_path(job["job_id"]))
+
+    def get_job(self, job_id: str):
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(self._state_path(job_id)) as f:
+                job = json.load(f)
+        except FileNotFoundError:
+            return None
+        # Jobs are only visible to the tenant that created them
+        return job if job.get("tenant_id", DEFAULT_TENANT) == current_tenant.get() else None
+
+    def create_job(self, result_id: str, fmt: str):
+        """Queue an export of a result handle's query, or None if the handle is unknown/expired"""
+        meta = get_result_store().get_meta(result_id)
+        if meta is None:
+            return None
+        sql = meta["sql"]
+        if fmt == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ValueError("Parquet export requires the pyarrow package")
+
+        with self._lock:
+            if self._pending >= settings.EXPORT_MAX_CONCURRENT + settings.EXPORT_QUEUE_SIZE:
+                metrics.incr("export.rejected")
+                raise AdmissionRejected("Server busy (export): too many export jobs", 30)
+            self._pending += 1
+        try:
+            job = self._queue(result_id, sql, fmt)
+        except Exception:
+            # Never queued, so _run won't give the slot back
+            with self._lock:
+                self._pending -= 1
+            raise
+        metrics.incr("export.jobs_created")
+        return job
+
+    def _queue(self, result_id: str, sql: str, fmt: str) -> dict:
+        """Record a new job and hand it to the executor"""
+        self.cleanup()
+
+        try:
+            estimated_rows = int(DatabaseService.explain(sql)["Plan Rows"])
+        except Exception as e:
+            logger.warning(f"Could not estimate export size: {e}")
+            estimated_rows = None
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "tenant_id": current_tenant.get(),
+            "status": "queued",
+            "format": fmt,
+            "result_id": result_id,
+            "sql": sql,
+            "rows_written": 0,
+            "estimated_rows": estimated_rows,
+            "progress": 0.0,
+            "bytes_written": 0,
+            "error": None,
+            "created_at": time.time()
+        }
+        self._save(job)
+        self._executor.submit(self._run, dict(job))
+        return job
+
+    def _run(self, job: dict):
+        try:
+            self._export(job)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _export(self, job: dict):
+        # Executor threads don't inherit the request's tenant
+        current_tenant.set(job["tenant_id"])
+        job["status"] = "running"
+        self._save(job)
+        started = time.perf_counter()
+        final_path = self.file_path(job)
+        part_path = final_path + ".part"
+
+        try:
+            writer = CsvChunkWriter(part_path) if job["format"] == "csv" else ParquetChunkWriter(part_path)
+            try:
+                for columns, rows in stream_query(
+                    job["sql"], chunk_size=settings.EXPORT_CHUNK_ROWS, timeout=settings.EXPORT_TIMEOUT
+                ):
+                    writer.write(columns, rows)
+                    job["rows_written"] += len(rows)
+                    job["bytes_written"] = os.path.getsize(part_path)
+                    if job["estimated_rows"]:
+                        job["progress"] = min(0.99, job["rows_written"] / job["estimated_rows"])
+                    self._save(job)
+            finally:
+                writer.close()
+
+            os.replace(part_path, final_path)
+            job.update(status="done", progress=1.0, bytes_written=os.path.getsize(final_path))
+            metrics.observe("export.duration_seconds", time.perf_counter() - started)
+            logger.info(f"Export {job['job_id']} finished: {job['rows_written']} rows")
+        except Exception as e:
+            logger.error(f"Export {job['job_id']} failed: {e}")
+            job.update(status="failed", error=str(e))
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        self._save(job)
+
+    def cleanup(self):
+        """Delete jobs (state and files) older than EXPORT_TTL"""
+        cutoff = time.time() - settings.EXPORT_TTL
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+class CsvChunkWriter:
+    def __init__(self, path: str):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._header_written = False
+
+    def write(self, columns, rows):
+        if not self._header_written:
+            self._writer.writerow(columns)
+            self._header_written = True
+        self._writer.writerows(
+            [DatabaseService.serialize_value(value) for value in row] for row in rows
+        )
+
+    def close(self):
+        self._file.close()
+
+class ParquetChunkWriter:
+    """Writes each chunk as a row group; the schema is fixed by the first chunk"""
+
+    def __init__(self, path: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._pq = pq
+        self._path = path
+        self._writer = None
+
+    def write(self, columns, rows):
+        pa = self._pa
+        data = {
+            name: [float(row[i]) if isinstance(row[i], Decimal) else row[i] for row in rows]
+            for i, name in enumerate(columns)
+        }
+        if self._writer is None:
+            table = pa.Table.from_pydict(data)
+            # All-null columns in the first chunk would pin the type to null
+            schema = pa.schema([
+                pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                for field in table.schema
+            ])
+            self._writer = self._pq.ParquetWriter(self._path, schema)
+        self._writer.write_table(pa.Table.from_pydict(data, schema=self._writer.schema))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+@lru_cache()
+def get_export_service() -> ExportService:
+    return ExportService(os.path.join(settings.DATA_DIR, "exports"))
@@ -0,0 +1,113 @@
+from app.config import get_settings
+from app.database.connection import get_pool_stats, tenant_pools
+from app.utils.metrics import metrics
+import psycopg2
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+class HealthProber:
+    """
+    Refreshes health state in the background so probes never touch the DB.
+
+    The prober holds its own database connection outside the pool, so a
+    saturated pool cannot make the pod look dead, and its checks never take
+    a connection away from user requests.
+    """
+
+    def __init__(self, chat_service):
+        self.chat_service = chat_service
+        self._conn = None
+        self._last_llm_probe = 0.0
+        self.state = {
+            "updated_at": None,
+            "database": {"ok": False, "error": "not probed yet"},
+            "pool": get_pool_stats(),
+            "llm": {"ok": None},
+            "schema": {"ok": False, "age_seconds": None}
+        }
+
+    def _probe_database(self) -> dict:
+        started = time.perf_counter()
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = psycopg2.connect(
+                    settings.DATABASE_URL,
+                    connect_timeout=max(1, int(settings.HEALTH_PROBE_TIMEOUT)),
+                    application_name="dbbot-health"
+                )
+                self._conn.autocommit = True
+            with self._conn.cursor() as cursor:
+                cursor.execute("SET statement_timeout = %s", (int(settings.HEALTH_PROBE_TIMEOUT * 1000),))
+                cursor.execute("SELECT 1")
+            latency = time.perf_counter() - started
+            metrics.observe("health.db_latency_seconds", latency)
+            return {"ok": True, "latency_ms": round(latency * 1000, 2)}
+        except Exception as e:
+            self.close()
+            return {"ok": False, "error": str(e)}
+
+    def _probe_llm(self) -> dict:
+        try:
+            return self.chat_service.llm_service.router.probe(settings.HEALTH_PROBE_TIMEOUT)
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def _schema_state(self) -> dict:
+        loaded_at = self.chat_service.schema_loaded_at
+        if loaded_at is None:
+            return {"ok": False, "age_seconds": None}
+        age = time.time() - loaded_at
+        return {"ok": age <= settings.SCHEMA_CACHE_TTL, "age_seconds": round(age, 1)}
+
+    def probe_once(self):
+        """Run every check once and publish the new state (blocking)"""
+        state = dict(self.state)
+        state["database"] = self._probe_database()
+        tenant_pools.evict_idle()
+        state["pool"] = get_pool_stats()
+
+        now = time.monotonic()
+        if now - self._last_llm_probe >= settings.HEALTH_LLM_PROBE_INTERVAL:
+            state["llm"] = self._probe_llm()
+            self._last_llm_probe = now
+
+        state["schema"] = self._schema_state()
+        state["updated_at"] = time.time()
+
+        metrics.set_gauge("db.pool_saturation", state["pool"]["saturation"])
+        self.state = state
+
+    def is_stale(self) -> bool:
+        updated_at = self.state["updated_at"]
+        return updated_at is None or time.time() - updated_at > 3 * settings.HEALTH_PROBE_INTERVAL
+
+    async def run(self):
+        """Probe forever on a fixed interval; cancelled on shutdown"""
+        while True:
+            try:
+                await asyncio.to_thread(self.probe_once)
+            except Exception as e:
+                logger.error(f"Health probe failed: {e}")
+            await asyncio.sleep(settings.HEALTH_PROBE_INTERVAL)
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+_prober = None
+
+def get_health_prober():
+    return _prober
+
+def start_health_prober(chat_service) -> asyncio.Task:
+    global _prober
+    _prober = HealthProber(chat_service)
+    return asyncio.create_task(_prober.run())
@@ -0,0 +1,324 @@
+from app.config import get_settings
+from app.services.llm_transport import get_llm_transport
+from app.utils.cancellation import CancelToken, RequestCancelled
+from app.utils.metrics import metrics
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+HEDGE_LOST = "hedge lost"
+FIRST_TOKEN_TIMEOUT = "first token timeout"
+TOTAL_TIMEOUT = "LLM timeout"
+
+class LLMProvider:
+    """One OpenAI-compatible endpoint with its latency history and circuit breaker"""
+
+    def __init__(self, name: str, base_url: str, api_key: str = "none", model: str = None,
+                 headers: dict = None, max_concurrent: int = None):
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key or "none"
+        self.model = model or settings.LLM_MODEL
+        self.headers = headers or {}
+        self.transport = get_llm_transport()
+        self.transport.add_provider(name, max_concurrent)
+        self._client = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=256)
+        self._failures = 0
+        self._open_until = 0.0
+
+    @property
+    def client(self):
+        """OpenAI client over the shared transport, created (and openai imported) on first use"""
+        if self._client is None:
+            from openai import OpenAI
+
+            self._client = OpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                default_headers=self.headers or None,
+                http_client=self.transport.client
+            )
+        return self._client
+
+    @property
+    def available(self) -> bool:
+        """False while the circuit breaker is open"""
+        return time.monotonic() >= self._open_until
+
+    def latency_percentile(self, q: float):
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))]
+
+    @property
+    def sample_count(self) -> int:
+        return len(self._latencies)
+
+    def observe_latency(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+        metrics.observe(f"llm.{self.name}.latency_seconds", seconds)
+
+    def record_success(self, seconds: float):
+        self.observe_latency(seconds)
+        with self._lock:
+            self._failures = 0
+            self._open_until = 0.0
+        metrics.set_gauge(f"llm.{self.name}.circuit_open", 0)
+
+    def record_failure(self, error: Exception):
+        metrics.incr(f"llm.{self.name}.failures")
+        with self._lock:
+            self._failures += 1
+            # Past the threshold every failure (including the half-open trial) re-opens it
+            if self._failures < settings.LLM_BREAKER_FAILURES:
+                return
+            self._open_until = time.monotonic() + settings.LLM_BREAKER_COOLDOWN
+        metrics.set_gauge(f"llm.{self.name}.circuit_open", 1)
+        logger.warning(f"LLM provider {self.name} circuit opened after {self._failures} failures: {error}")
+
+    def complete(self, messages: list, cancel_token: CancelToken, max_retries: int = 2, **params) -> str:
+        """
+        Stream one completion and return its text.
+
+        Waits for one of the provider's concurrency slots first. Cancelling
+        the token aborts the HTTP response mid-stream. Timing out (no token
+        within LLM_FIRST_TOKEN_TIMEOUT, or past LLM_TIMEOUT in total) raises
+        TimeoutError, which counts against the provider's breaker.
+        """
+        cancel_token.check()
+        with self.transport.slot(self.name, cancel_token):
+            remaining = cancel_token.remaining()
+            timers = [threading.Timer(settings.LLM_FIRST_TOKEN_TIMEOUT, cancel_token.cancel, (FIRST_TOKEN_TIMEOUT,))]
+            if remaining is None or settings.LLM_TIMEOUT < remaining:
+                # Otherwise the request deadline comes first
+                timers.append(threading.Timer(settings.LLM_TIMEOUT, cancel_token.cancel, (TOTAL_TIMEOUT,)))
+            for timer in timers:
+                timer.daemon = True
+                timer.start()
+            stream = None
+            try:
+                # Abortable from the start: the wait for response headers is where
+                # the first-token timer usually fires
+                with self.transport.abortable(cancel_token):
+                    stream = self.client.with_options(
+                        timeout=self.transport.timeout(remaining),
+                        max_retries=max_retries
+                    ).chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        stream=True,
+                        **params
+                    )
+                    parts = []
+                    # HTTP/2 calls aren't aborted above; closing resets just this stream
+                    with cancel_token.on_cancel(stream.response.close):
+                        for chunk in stream:
+                            cancel_token.check()
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                timers[0].cancel()
+                                parts.append(chunk.choices[0].delta.content)
+                cancel_token.check()
+                return "".join(parts)
+
+            except Exception as e:
+                if cancel_token.cancelled and cancel_token.reason in (FIRST_TOKEN_TIMEOUT, TOTAL_TIMEOUT):
+                    metrics.incr(f"llm.{self.name}.timeouts")
+                    raise TimeoutError(f"{cancel_token.reason} ({self.name})") from e
+                if isinstance(e, RequestCancelled):
+                    raise
+                if cancel_token.cancelled:
+                    raise RequestCancelled(cancel_token.reason) from e
+                raise
+            finally:
+                for timer in timers:
+                    timer.cancel()
+                if stream is not None:
+                    stream.response.close()
+
+    def state(self) -> dict:
+        p50 = self.latency_percentile(50)
+        return {
+            "available": self.available,
+            "consecutive_failures": self._failures,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None
+        }
+
+class ProviderRouter:
+    """
+    Routes completions over several OpenAI-compatible providers.
+
+    The fastest available provider (by median latency) gets each request.
+    If it has not answered by its LLM_HEDGE_PERCENTILE latency, the same
+    request is sent to the next provider and whichever finishes first
+    wins; the other is aborted. Errors fail over to the next provider, and
+    providers that keep failing are skipped until their breaker cools down.
+    """
+
+    def __init__(self, providers: list):
+        if not providers:
+            raise ValueError("At least one LLM provider is required")
+        self.providers = providers
+        self._executor = ThreadPoolExecutor(
+            max_workers=4 * settings.LLM_MAX_CONCURRENT, thread_name_prefix="llm"
+        )
+
+    @classmethod
+    def from_settings(cls) -> "ProviderRouter":
+        """Providers from LLM_PROVIDERS, or the single LLM_PROVIDER endpoint"""
+        if settings.LLM_PROVIDERS:
+            return cls([LLMProvider(**config) for config in settings.LLM_PROVIDERS])
+        if settings.LLM_PROVIDER == "openrouter":
+            provider = LLMProvider(
+                "openrouter",
+                settings.OPENROUTER_BASE_URL,
+                api_key=settings.OPENROUTER_API_KEY,
+                headers={
+                    "HTTP-Referer": "http://localhost:8000",
+                    "X-Title": "DB Chatbot"
+                }
+            )
+        else:
+            provider = LLMProvider("ollama", settings.OLLAMA_BASE_URL, api_key="ollama")
+        return cls([provider])
+
+    def ranked(self) -> list:
+        """Available providers, fastest first; providers without samples are tried early"""
+        available = [provider for provider in self.providers if provider.available]
+        if not available:
+            # Every breaker is open: try the one that will close soonest rather than fail
+            return sorted(self.providers, key=lambda provider: provider._open_until)
+        return sorted(available, key=lambda provider: provider.latency_percentile(50) or 0.0)
+
+    def hedge_delay(self, provider: LLMProvider) -> float:
+        if provider.sample_count < settings.LLM_HEDGE_MIN_SAMPLES:
+            return settings.LLM_HEDGE_DELAY
+        return max(settings.LLM_HEDGE_MIN_DELAY, provider.latency_percentile(settings.LLM_HEDGE_PERCENTILE))
+
+    def _attempt(self, provider: LLMProvider, messages: list, cancel_token: CancelToken,
+                 max_retries: int, params: dict) -> str:
+        started = time.perf_counter()
+        try:
+            text = provider.complete(messages, cancel_token, max_retries, **params)
+        except RequestCancelled:
+            if cancel_token.reason == HEDGE_LOST:
+                # Censored sample: the loser took at least this long
+                provider.observe_latency(time.perf_counter() - started)
+            raise
+        except Exception as e:
+            logger.error(f"LLM error from {provider.name}: {e}")
+            provider.record_failure(e)
+            raise
+        provider.record_success(time.perf_counter() - started)
+        return text
+
+    def complete(self, messages: list, cancel_token: CancelToken = None, **params) -> str:
+        """Completion text from whichever provider answers first"""
+        cancel_token = cancel_token or CancelToken()
+        cancel_token.check()
+
+        candidates = self.ranked()
+        primary = candidates[0]
+        # With somewhere to fail over to (or a deadline), don't spend time on client retries
+        max_retries = 0 if len(self.providers) > 1 or cancel_token.deadline is not None else 2
+        attempts = {}
+
+        def launch(provider):
+            """Start an attempt under the request's deadline; once that has passed, launch no more"""
+            if cancel_token.cancelled:
+                candidates.clear()
+                return None
+            # CancelToken(remaining()) would be unbounded at 0.0; share the deadline itself
+            token = CancelToken()
+            token.deadline = cancel_token.deadline
+            attempts[self._executor.submit(self._attempt, provider, messages, token, max_retries, params)] = (provider, token)
+            return time.monotonic() + self.hedge_delay(provider)
+
+        def cancel_all():
+            for _, token in list(attempts.values()):
+                token.cancel(cancel_token.reason or "cancelled")
+
+        last_error = None
+        with cancel_token.on_cancel(cancel_all):
+            hedge_at = launch(candidates.pop(0))
+            pending = set(attempts)
+            while pending:
+                timeout = max(0.0, hedge_at - time.monotonic()) if candidates else None
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    # Slower than this provider usually is: race the next one
+                    metrics.incr("llm.hedged")
+                    hedge_at = launch(candidates.pop(0))
+                    pending = {future for future in attempts if not future.done()}
+                    continue
+
+                for future in done:
+                    provider, _ = attempts[future]
+                    try:
+                        text = future.result()
+                    except RequestCancelled:
+                        continue
+                    except Exception as e:
+                        last_error = e
+                        continue
+
+                    for other_future, (_, other_token) in attempts.items():
+                        if other_future is not future:
+                            other_token.cancel(HEDGE_LOST)
+                    if provider is not primary:
+                        metrics.incr("llm.secondary_wins")
+                    return text
+
+                if not pending and candidates and not cancel_token.cancelled:
+                    metrics.incr("llm.failover")
+                    hedge_at = launch(candidates.pop(0))
+                    pending = {future for future in attempts if not future.done()}
+
+        cancel_token.check()
+        if last_error is None:
+            raise RequestCancelled("deadline exceeded")
+        raise last_error
+
+    def warm(self, timeout: float = 5.0):
+        """Open a connection to every provider; fails only if none is reachable"""
+        errors = {}
+        for provider in self.providers:
+            try:
+                provider.client.with_options(max_retries=0, timeout=timeout).models.list()
+            except Exception as e:
+                errors[provider.name] = str(e)
+        if len(errors) == len(self.providers):
+            raise RuntimeError(f"No LLM provider reachable: {errors}")
+
+    def probe(self, timeout: float) -> dict:
+        """Reachability and breaker state per provider (and transport stats), for health checks"""
+        providers = {}
+        for provider in self.providers:
+            state = provider.state()
+            started = time.perf_counter()
+            try:
+                provider.client.with_options(max_retries=0, timeout=timeout).models.list()
+                state.update(ok=True, latency_ms=round((time.perf_counter() - started) * 1000, 2))
+            except Exception as e:
+                state.update(ok=False, error=str(e))
+            providers[provider.name] = state
+        return {
+            "ok": any(state["ok"] and state["available"] for state in providers.values()),
+            "providers": providers,
+            "transport": get_llm_transport().stats()
+        }
+
+@lru_cache()
+def get_provider_router() -> ProviderRouter:
+    """Process-wide router, shared by every tenant's LLMService"""
+    return ProviderRouter.from_settings()
@@ -1,5 +1,8 @@
-from openai import OpenAI
 from app.config import get_settings
+from app.services.db_service import DatabaseService
+from app.services.profiler_service import render_profile_hints
+from app.services.llm_router import get_provider_router
+from app.utils.cancellation import CancelToken
 import logging
 import json
 import re
@@ -10,27 +13,51 @@ settings = get_settings()
 class LLMService:
     def __init__(self):
         self.settings = settings
-        
-        if settings.LLM_PROVIDER == "openrouter":
-            self.client = OpenAI(
-                api_key=settings.OPENROUTER_API_KEY,
-                base_url=settings.OPENROUTER_BASE_URL,
-                default_headers={
-                    "HTTP-Referer": "http://localhost:8000",
-                    "X-Title": "DB Chatbot"
-                }
-            )
-        else:
-            self.client = OpenAI(
-                api_key="ollama",
-                base_url=settings.OLLAMA_BASE_URL
-            )
-        
         self.model = settings.LLM_MODEL
+        self.router = get_provider_router()
+        self._prompt_cache = (None, None)  # (schema fingerprint, rendered prompt)
         logger.info(f"✅ LLM Service initialized with model: {self.model}")
     
-    def create_system_prompt(self, schema):
-        """Create detailed system prompt with schema"""
+    def warm_connection(self):
+        """Open (and keep alive) the HTTP connections to the LLM providers"""
+        self.router.warm()
+        logger.info("LLM provider connections warmed up")
+    
+    def get_system_prompt(self, schema, profile=None):
+        """Rendered system prompt, re-rendered only when the schema or profile changes"""
+        fingerprint = DatabaseService.schema_fingerprint([schema, profile])
+        cached_fingerprint, prompt = self._prompt_cache
+        if fingerprint != cached_fingerprint:
+            prompt = self.create_system_prompt(schema, profile)
+            self._prompt_cache = (fingerprint, prompt)
+        return prompt
+    
+    GENERIC_EXAMPLES = [
+        {"question": "Show all users", "sql": "SELECT * FROM users"},
+        {"question": "Get names and emails of active users", "sql": "SELECT name, email FROM users WHERE status = 'active'"},
+        {"question": "Count total orders per user", "sql": "SELECT user_id, COUNT(*) as order_count FROM orders GROUP BY user_id"},
+        {"question": "Show user names with their order totals", "sql": "SELECT u.name, COUNT(o.id) as total_orders FROM users u LEFT JOIN orders o ON u.id = o.user_id GROUP BY u.id, u.name"},
+        {"question": "Find top 5 products by sales", "sql": "SELECT product_name, SUM(quantity) as total_sold FROM order_items GROUP BY product_name ORDER BY total_sold DESC LIMIT 5"}
+    ]
+    
+    def create_examples_section(self, examples=None):
+        """Few-shot section: verified examples for this database, or generic ones"""
+        if examples:
+            header = "EXAMPLE QUERIES (verified against THIS database):"
+        else:
+            header = "EXAMPLE QUERIES (generic - adapt names to the schema above):"
+            examples = self.GENERIC_EXAMPLES
+
+        section = f"\n\n{header}\n" + "━" * 78 + "\n\n"
+        for example in examples:
+            section += f"Q: \"{example['question']}\"\nA: {example['sql']}\n\n"
+        return section.rstrip() + "\n"
+    
+    def create_system_prompt(self, schema, profile=None):
+        """Create detailed system prompt with schema (and column value hints)"""
+
+        # ~4 characters per token
+        hints = render_profile_hints(profile or {}, settings.PROFILE_PROMPT_TOKENS * 4)
 
         # Format schema with detailed information
         schema_text = "=" * 80 + "\n"
@@ -55,7 +82,9 @@ class LLMService:
             for col in columns:
                 pk_marker = " [PK]" if col.get('is_primary_key') else ""
                 nullable = "NULL" if col.get('is_nullable') == 'YES' else "NOT NULL"
-                schema_text += f"  - {col['column_name']}{pk_marker} ({col['data_type']}, {nullable})\n"
+                hint = hints.get((table_name, col['column_name']))
+                hint_text = f" -- {hint}" if hint else ""
+                schema_text += f"  - {col['column_name']}{pk_marker} ({col['data_type']}, {nullable}){hint_text}\n"
 
             # Foreign keys
             if foreign_keys:
@@ -94,24 +123,6 @@ CRITICAL INSTRUCTIONS:
    ✓ Use proper PostgreSQL syntax
    ✓ Only SELECT queries allowed (no INSERT, UPDATE, DELETE, DROP, ALTER, etc.)
 
-EXAMPLE QUERIES:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Q: "Show all users"
-A: SELECT * FROM users
-
-Q: "Get names and emails of active users"
-A: SELECT name, email FROM users WHERE status = 'active'
-
-Q: "Count total orders per user"
-A: SELECT user_id, COUNT(*) as order_count FROM orders GROUP BY user_id
-
-Q: "Show user names with their order totals"
-A: SELECT u.name, COUNT(o.id) as total_orders FROM users u LEFT JOIN orders o ON u.id = o.user_id GROUP BY u.id, u.name
-
-Q: "Find top 5 products by sales"
-A: SELECT product_name, SUM(quantity) as total_sold FROM order_items GROUP BY product_name ORDER BY total_sold DESC LIMIT 5
-
 COMMON MISTAKES TO AVOID:
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
@@ -122,35 +133,74 @@ COMMON MISTAKES TO AVOID:
 
 Remember: Accuracy is critical. Always verify names against the schema above!"""
 
-    def chat(self, messages: list, schema: list):
-        """Send chat to LLM"""
+    def build_messages(self, messages: list, schema: list, examples: list = None, profile: dict = None):
+        """System prompt plus the user/assistant turns"""
+        # The schema part is cached; only the few-shot section varies per request
+        system_prompt = self.get_system_prompt(schema, profile) + self.create_examples_section(examples)
+
+        full_messages = [{"role": "system", "content": system_prompt}]
+
+        for msg in messages:
+            if msg.get("role") in ["user", "assistant"]:
+                full_messages.append({
+                    "role": msg["role"],
+                    "content": msg["content"]
+                })
+        return full_messages
+
+    def generate(self, messages: list, schema: list, examples: list = None, profile: dict = None,
+                 cancel_token: CancelToken = None) -> str:
+        """
+        Generate a completion and return its text, honouring a cancel token.
+
+        The provider router streams the response (so cancelling the token
+        aborts it mid-way), hedges slow requests and fails over on errors.
+        """
+        full_messages = self.build_messages(messages, schema, examples, profile)
+        logger.info(f"Sending {len(full_messages)} messages to LLM")
+
+        return self.router.complete(
+            full_messages,
+            cancel_token,
+            temperature=0.1,  # Lower temperature for precise SQL generation
+            max_tokens=settings.LLM_MAX_TOKENS
+        )
+    
+    DECOMPOSE_PROMPT = """You split database questions into independent sub-questions.
+
+Available tables: {tables}
+
+If the question asks for several things that can each be answered by a separate
+SQL query (e.g. "compare revenue by region and list the top customers"), return
+each as a self-contained sub-question. If it asks for one thing, return it unchanged.
+Return at most {max_parts} sub-questions.
+
+Respond with ONLY a JSON array of strings, e.g. ["How many ...?", "Which ...?"]"""
+
+    def decompose(self, question: str, schema: list, cancel_token: CancelToken = None) -> list:
+        """Independent sub-questions of a compound question ([question] if it isn't one)"""
+        max_parts = settings.PLANNER_MAX_SUBQUESTIONS
+        tables = ", ".join(table["table_name"] for table in schema)
+        text = self.router.complete(
+            [
+                {"role": "system", "content": self.DECOMPOSE_PROMPT.format(tables=tables, max_parts=max_parts)},
+                {"role": "user", "content": question}
+            ],
+            cancel_token,
+            temperature=0.0,
+            max_tokens=400
+        )
         try:
-            system_prompt = self.create_system_prompt(schema)
-
-            full_messages = [{"role": "system", "content": system_prompt}]
-
-            for msg in messages:
-                if msg.get("role") in ["user", "assistant"]:
-                    full_messages.append({
-                        "role": msg["role"],
-                        "content": msg["content"]
-                    })
-
-            logger.info(f"Sending {len(full_messages)} messages to LLM")
-
-            # Use lower temperature for more deterministic SQL generation
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=full_messages,
-                temperature=0.1,  # Lower temperature for precise SQL generation
-                max_tokens=settings.LLM_MAX_TOKENS
-            )
-
-            return response
-
-        except Exception as e:
-            logger.error(f"LLM error: {e}")
-            raise
+            parts = json.loads(text[text.index("["):text.rindex("]") + 1])
+        except ValueError:
+            logger.warning(f"Could not parse sub-questions, answering as one question: {text[:200]}")
+            return [question]
+
+        sub_questions = []
+        for part in parts:
+            if isinstance(part, str) and part.strip() and part.strip() not in sub_questions:
+                sub_questions.append(part.strip())
+        return sub_questions[:max_parts] or [question]
     
     def extract_sql(self, text: str) -> str:
         """Extract SQL from LLM response"""
@@ -0,0 +1,258 @@
+from app.config import get_settings
+from app.utils.cancellation import CancelToken
+from app.utils.metrics import metrics
+from contextlib import contextmanager
+from functools import lru_cache
+import logging
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# The CallAbort of the call the current thread is making, if any
+_calls = threading.local()
+
+class CallAbort:
+    """
+    Aborts one HTTP/1.1 call from another thread at any point, including
+    while it waits for the response headers.
+
+    The connection the calling thread writes its request on is attached
+    here, and abort() shuts its socket down, which wakes the blocked
+    reader; the pool then discards the connection. Once the call has
+    finished (and the connection may serve another call) abort() is a
+    no-op.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stream = None
+        self.aborted = False
+        self.finished = False
+
+    def attach(self, stream):
+        with self._lock:
+            self._stream = stream
+            aborted = self.aborted
+        if aborted:
+            stream.shutdown(self)
+
+    def abort(self):
+        with self._lock:
+            if self.aborted or self.finished:
+                return
+            self.aborted = True
+            stream = self._stream
+        if stream is not None:
+            stream.shutdown(self)
+
+    def finish(self):
+        with self._lock:
+            self.finished = True
+            self._stream = None
+
+class _AbortableStream:
+    """httpcore network stream that attaches itself to the writing thread's CallAbort"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._owner = None
+
+    def read(self, max_bytes: int, timeout: float = None) -> bytes:
+        return self._stream.read(max_bytes, timeout)
+
+    def write(self, buffer: bytes, timeout: float = None) -> None:
+        call = getattr(_calls, "current", None)
+        ssl_object = self._stream.get_extra_info("ssl_object")
+        # An HTTP/2 connection carries other calls' streams; never shut it down
+        if call is not None and not (ssl_object and ssl_object.selected_alpn_protocol() == "h2"):
+            self._owner = call
+            call.attach(self)
+        self._stream.write(buffer, timeout)
+
+    def shutdown(self, call: CallAbort):
+        """Shut the socket down if call is still the one using this connection"""
+        sock = self._stream.get_extra_info("socket")
+        if self._owner is call and sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        self._stream.close()
+
+    def start_tls(self, ssl_context, server_hostname: str = None, timeout: float = None):
+        return _AbortableStream(self._stream.start_tls(ssl_context, server_hostname, timeout))
+
+    def get_extra_info(self, info: str):
+        return self._stream.get_extra_info(info)
+
+class _AbortableBackend:
+    """httpcore network backend whose TCP streams are _AbortableStreams"""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def connect_tcp(self, host: str, port: int, timeout: float = None, local_address: str = None,
+                    socket_options=None):
+        return _AbortableStream(self._backend.connect_tcp(host, port, timeout, local_address, socket_options))
+
+    def connect_unix_socket(self, path: str, timeout: float = None, socket_options=None):
+        return self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    def sleep(self, seconds: float) -> None:
+        self._backend.sleep(seconds)
+
+class LLMTransport:
+    """
+    Process-wide HTTP layer under every LLM provider's OpenAI client.
+
+    All providers share one httpx connection pool (LLM_MAX_CONNECTIONS,
+    keep-alive, optionally HTTP/2), and each provider has a semaphore
+    bounding its in-flight calls. Calls made inside abortable() can be
+    aborted from another thread at any point (see CallAbort). Connection
+    reuse, TLS handshakes and the time calls queue for a provider's
+    semaphore are recorded as metrics.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._requests = 0
+        self._connections = 0
+        self._tls_handshakes = 0
+        self.http2 = False
+
+    @property
+    def client(self):
+        """Shared httpx.Client, created (and httpx imported) on first use"""
+        with self._lock:
+            if self._client is None:
+                import httpx
+
+                self.http2 = settings.LLM_HTTP2
+                if self.http2:
+                    try:
+                        import h2  # noqa: F401
+                    except ImportError:
+                        logger.warning("LLM_HTTP2 requires the h2 package; using HTTP/1.1")
+                        self.http2 = False
+                http_transport = httpx.HTTPTransport(
+                    http2=self.http2,
+                    limits=httpx.Limits(
+                        max_connections=settings.LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE,
+                        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY
+                    )
+                )
+                # httpx takes no network backend, so wrap the one its connection pool uses
+                pool = http_transport._pool
+                pool._network_backend = _AbortableBackend(pool._network_backend)
+                self._client = httpx.Client(
+                    transport=http_transport,
+                    timeout=self.timeout(None),
+                    event_hooks={"request": [self._on_request]}
+                )
+            return self._client
+
+    def timeout(self, remaining):
+        """
+        httpx timeout for one call: connecting is bounded by
+        LLM_CONNECT_TIMEOUT, and every read (the response headers and first
+        token included) by LLM_FIRST_TOKEN_TIMEOUT
+        """
+        import httpx
+
+        total = settings.LLM_TIMEOUT if remaining is None else min(remaining, settings.LLM_TIMEOUT)
+        return httpx.Timeout(
+            total,
+            connect=min(settings.LLM_CONNECT_TIMEOUT, total),
+            read=min(settings.LLM_FIRST_TOKEN_TIMEOUT, total)
+        )
+
+    @contextmanager
+    def abortable(self, cancel_token: CancelToken):
+        """Calls made by this thread inside the block are aborted as soon as the token is cancelled"""
+        call = CallAbort()
+        _calls.current = call
+        try:
+            with cancel_token.on_cancel(call.abort):
+                yield call
+        finally:
+            call.finish()
+            _calls.current = None
+
+    def add_provider(self, name: str, max_concurrent: int = None):
+        with self._lock:
+            self._semaphores[name] = threading.BoundedSemaphore(
+                max_concurrent or settings.LLM_PROVIDER_MAX_CONCURRENT
+            )
+
+    @contextmanager
+    def slot(self, name: str, cancel_token: CancelToken):
+        """Hold one of a provider's concurrency slots; waiting ends early if the token is cancelled"""
+        semaphore = self._semaphores[name]
+        started = time.perf_counter()
+        while not semaphore.acquire(timeout=0.05):
+            cancel_token.check()
+        queued = time.perf_counter() - started
+        metrics.observe("llm.transport.queue_seconds", queued)
+        metrics.observe(f"llm.{name}.queue_seconds", queued)
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    def _on_request(self, request):
+        request.extensions["trace"] = self._trace
+        with self._lock:
+            self._requests += 1
+        metrics.incr("llm.transport.requests")
+        self._update_reuse_rate()
+
+    def _trace(self, event: str, info: dict):
+        """httpcore trace callback; fires only for connections opened by this request"""
+        if event == "connection.connect_tcp.complete":
+            with self._lock:
+                self._connections += 1
+            metrics.incr("llm.transport.connections_opened")
+            self._update_reuse_rate()
+        elif event == "connection.start_tls.complete":
+            with self._lock:
+                self._tls_handshakes += 1
+            metrics.incr("llm.transport.tls_handshakes")
+
+    def _update_reuse_rate(self):
+        """Share of requests sent over an already open connection"""
+        with self._lock:
+            reuse_rate = 1 - self._connections / self._requests if self._requests else 0.0
+        metrics.set_gauge("llm.transport.connection_reuse_rate", round(max(reuse_rate, 0.0), 4))
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests, connections, tls_handshakes = self._requests, self._connections, self._tls_handshakes
+        p50 = metrics.percentile("llm.transport.queue_seconds", 50)
+        p95 = metrics.percentile("llm.transport.queue_seconds", 95)
+        return {
+            "http2": self.http2,
+            "requests": requests,
+            "connections_opened": connections,
+            "tls_handshakes": tls_handshakes,
+            "connection_reuse_rate": round(max(1 - connections / requests, 0.0), 4) if requests else None,
+            "queue_p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+            "queue_p95_ms": round(p95 * 1000, 2) if p95 is not None else None
+        }
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+@lru_cache()
+def get_llm_transport() -> LLMTransport:
+    return LLMTransport()
@@ -0,0 +1,190 @@
+from app.config import get_settings
+from app.database.connection import execute_query
+from app.database.tenants import current_tenant
+from app.services.db_service import DatabaseService
+from app.services.cache_service import get_cache
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+NUMERIC_TYPES = {"smallint", "integer", "bigint", "numeric", "real", "double precision", "money"}
+TEMPORAL_TYPES = {
+    "date", "timestamp without time zone", "timestamp with time zone",
+    "time without time zone", "time with time zone"
+}
+CATEGORICAL_TYPES = {"character varying", "character", "text", "boolean", "USER-DEFINED"}
+
+class ColumnProfiler:
+    """
+    Builds compact per-column value profiles for the prompt.
+
+    Profiles come from the planner statistics in pg_stats, which cost a
+    single catalog query. Tables without statistics (never analyzed) fall
+    back to a small sample read through DatabaseService.get_sample_data.
+    """
+
+    MAX_VALUE_LENGTH = 40
+
+    def __init__(self, db_service: DatabaseService = None):
+        self.db_service = db_service or DatabaseService()
+
+    def build_profile(self, schema) -> dict:
+        """Return {table: {column: {"null_frac", "values", "min", "max"}}}"""
+        column_types = {
+            (table["table_name"], col["column_name"]): col["data_type"]
+            for table in schema
+            for col in table["columns"]
+        }
+
+        profile = {}
+        for row in self._fetch_stats():
+            key = (row["tablename"], row["attname"])
+            if key not in column_types:
+                continue
+            column = self._profile_from_stats(row, column_types[key])
+            if column:
+                profile.setdefault(row["tablename"], {})[row["attname"]] = column
+
+        for table in schema:
+            if table["table_name"] not in profile:
+                sampled = self._profile_from_sample(table)
+                if sampled:
+                    profile[table["table_name"]] = sampled
+
+        logger.info(f"Built column profile for {len(profile)} tables")
+        return profile
+
+    def _fetch_stats(self):
+        return execute_query("""
+            SELECT
+                tablename,
+                attname,
+                null_frac,
+                n_distinct,
+                most_common_vals::text::text[] AS common_values,
+                histogram_bounds::text::text[] AS bounds
+            FROM pg_stats
+            WHERE schemaname = current_schema()
+        """) or []
+
+    def _shorten(self, value):
+        value = str(value)
+        if len(value) > self.MAX_VALUE_LENGTH:
+            return value[:self.MAX_VALUE_LENGTH] + "…"
+        return value
+
+    def _profile_from_stats(self, row, data_type: str) -> dict:
+        column = {"null_frac": round(float(row["null_frac"] or 0), 3)}
+        common_values = row["common_values"] or []
+        bounds = row["bounds"] or []
+
+        n_distinct = float(row["n_distinct"] or 0)
+        if (data_type in CATEGORICAL_TYPES and common_values
+                and 0 < n_distinct <= settings.PROFILE_MAX_DISTINCT):
+            column["values"] = [self._shorten(value) for value in common_values[:settings.PROFILE_MAX_DISTINCT]]
+
+        candidates = [value for value in bounds + common_values if value is not None]
+        if candidates and data_type in NUMERIC_TYPES:
+            try:
+                numbers = [float(value) for value in candidates]
+                column["min"], column["max"] = (
+                    int(number) if number.is_integer() else number
+                    for number in (min(numbers), max(numbers))
+                )
+            except ValueError:
+                pass
+        elif candidates and data_type in TEMPORAL_TYPES:
+            # ISO DateStyle sorts correctly as text
+            column["min"], column["max"] = min(candidates), max(candidates)
+
+        return column
+
+    def _profile_from_sample(self, table) -> dict:
+        rows = self.db_service.get_sample_data(table["table_name"], limit=settings.PROFILE_SAMPLE_ROWS)
+        if not rows:
+            return {}
+
+        profile = {}
+        for col in table["columns"]:
+            name, data_type = col["column_name"], col["data_type"]
+            values = [row.get(name) for row in rows]
+            present = [value for value in values if value is not None]
+            column = {"null_frac": round(1 - len(present) / len(values), 3)}
+
+            distinct = sorted({str(value) for value in present})
+            if data_type in CATEGORICAL_TYPES and 0 < len(distinct) <= settings.PROFILE_MAX_DISTINCT:
+                column["values"] = [self._shorten(value) for value in distinct]
+            if present and (data_type in NUMERIC_TYPES or data_type in TEMPORAL_TYPES):
+                column["min"], column["max"] = min(present), max(present)
+
+            profile[name] = column
+        return profile
+
+def render_profile_hints(profile: dict, budget_chars: int) -> dict:
+    """
+    Turn a profile into per-column prompt hints that fit in budget_chars.
+
+    Value lists are the most useful hint (they stop the LLM guessing
+    literals), so they get the budget first, then ranges, then null rates.
+    """
+    hints = {}
+    remaining = budget_chars
+
+    def add(table, column, text):
+        nonlocal remaining
+        if len(text) + 2 > remaining:
+            return
+        key = (table, column)
+        hints[key] = f"{hints[key]}; {text}" if key in hints else text
+        remaining -= len(text) + 2
+
+    passes = [
+        lambda stats: "values: " + ", ".join(f"'{value}'" for value in stats["values"]) if stats.get("values") else None,
+        lambda stats: f"range: {stats['min']} .. {stats['max']}" if "min" in stats else None,
+        lambda stats: f"nulls: {stats['null_frac']:.0%}" if stats.get("null_frac", 0) >= 0.05 else None
+    ]
+    for render in passes:
+        for table, columns in profile.items():
+            for column, stats in columns.items():
+                text = render(stats)
+                if text:
+                    add(table, column, text)
+    return hints
+
+async def run_profiler():
+    """
+    Refresh the schema (once it nears SCHEMA_CACHE_TTL) and column profile
+    of every active tenant forever on PROFILE_REFRESH_INTERVAL, or a
+    quarter of SCHEMA_CACHE_TTL if that is shorter.
+
+    Profiles are shared through the cache keyed by tenant and schema
+    fingerprint, so only one worker per interval actually queries each
+    tenant's database.
+    """
+    from app.services.chat_service import active_chat_services
+
+    cache = get_cache()
+
+    def refresh(chat_service):
+        if not chat_service.schema:
+            return
+        current_tenant.set(chat_service.tenant_id)
+        chat_service.refresh_schema_if_stale()
+        profiler = ColumnProfiler(chat_service.db_service)
+        schema = chat_service.schema
+        chat_service.profile = cache.get_or_compute(
+            "profile",
+            chat_service.scoped(chat_service.schema_fingerprint),
+            lambda: profiler.build_profile(schema),
+            ttl=settings.PROFILE_REFRESH_INTERVAL
+        )
+
+    while True:
+        for chat_service in active_chat_services():
+            try:
+                await asyncio.to_thread(refresh, chat_service)
+            except Exception as e:
+                logger.error(f"Column profiling failed for tenant {chat_service.tenant_id}: {e}")
+        await asyncio.sleep(min(settings.PROFILE_REFRESH_INTERVAL, settings.SCHEMA_CACHE_TTL / 4))
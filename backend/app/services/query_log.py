@@ -0,0 +1,359 @@
+from app.config import get_settings
+from app.database.connection import execute_query
+from app.database.tenants import current_tenant, scoped_key
+from app.utils.metrics import metrics
+from functools import lru_cache
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![\w.])[-+]?\d+(?:\.\d+)?(?:e[-+]?\d+)?\b", re.IGNORECASE)
+VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+QUOTED_IDENTIFIER = re.compile(r'"(?:[^"]|"")*"')
+# Literals, quoted identifiers and comments, matched left to right so none is read inside another
+SQL_TOKEN = re.compile(
+    rf"(?P<string>{STRING_LITERAL.pattern})|(?P<identifier>{QUOTED_IDENTIFIER.pattern})|(?P<comment>{COMMENT.pattern})",
+    re.DOTALL
+)
+# Type names after "::", multi-word ones first, with optional modifiers and array brackets
+TYPE_NAME = (
+    r'(?:(?:timestamp|time)(?:\s*\(\s*\d+\s*\))?\s+with(?:out)?\s+time\s+zone'
+    r'|double\s+precision|(?:character|bit)\s+varying|"?\w+"?)'
+    r'(?:\s*\(\s*\d+(?:\s*,\s*\d+)?\s*\))?(?:\[\])*'
+)
+CAST = re.compile(rf'::\s*{TYPE_NAME}', re.IGNORECASE)
+COLUMN_REF = re.compile(r'(?:"?(\w+)"?\.)?"?([A-Za-z_]\w*)"?')
+ORDER_COLUMNS = {
+    "total_ms": "total_ms",
+    "mean_ms": "total_ms / calls",
+    "calls": "calls",
+    "max_ms": "max_ms"
+}
+
+def normalize_sql(sql: str) -> str:
+    """
+    Statement shape with comments and literals stripped, for grouping.
+
+    Quoted identifiers are kept verbatim (case and digits included).
+    """
+    identifiers = []
+
+    def replace(match):
+        if match["string"]:
+            return "?"
+        if match["identifier"]:
+            identifiers.append(match["identifier"])
+            return "\x00"
+        return " "
+
+    text = SQL_TOKEN.sub(replace, sql)
+    text = NUMBER_LITERAL.sub("?", text)
+    # Canonical spacing around operators, commas and parentheses
+    text = re.sub(r"\s*([=<>!]+)\s*", r" \1 ", text)
+    text = re.sub(r"\s*,\s*", ", ", text)
+    text = re.sub(r"\(\s+", "(", re.sub(r"\s+\)", ")", text))
+    text = VALUE_LIST.sub("(?)", text)  # IN (1, 2, 3) and IN (4) are the same query
+    text = re.sub(r"\s+", " ", text).strip().rstrip(";").strip().lower()
+    restored = iter(identifiers)
+    return re.sub("\x00", lambda match: next(restored), text)
+
+def summarize_plan(plan: dict) -> dict:
+    """Compact summary of an EXPLAIN (FORMAT JSON) plan: node types, scans and join conditions"""
+    summary = {
+        "total_cost": plan.get("Total Cost"),
+        "plan_rows": plan.get("Plan Rows"),
+        "node_types": [],
+        "scans": [],
+        "joins": [],
+        "aliases": {}
+    }
+
+    def walk(node):
+        node_type = node.get("Node Type")
+        if node_type not in summary["node_types"]:
+            summary["node_types"].append(node_type)
+        relation = node.get("Relation Name")
+        if relation:
+            alias = node.get("Alias", relation)
+            summary["aliases"][alias] = relation
+            summary["scans"].append({
+                "table": relation,
+                "alias": alias,
+                "type": node_type,
+                "rows": node.get("Plan Rows"),
+                "filter": node.get("Filter")
+            })
+        for key in ("Hash Cond", "Merge Cond", "Join Filter"):
+            if node.get(key):
+                summary["joins"].append(node[key])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan)
+    return summary
+
+def condition_columns(condition: str) -> list:
+    """(qualifier, column) references in a plan condition such as "(o.customer_id = c.id)" """
+    text = CAST.sub(" ", STRING_LITERAL.sub(" ", condition))
+    return COLUMN_REF.findall(text)
+
+def is_equality(condition: str, column: str) -> bool:
+    """Whether the condition compares column with = (possibly through a cast)"""
+    pattern = rf'\b{re.escape(column)}"?\)*(?:{CAST.pattern})?\)*\s*=(?!=)'
+    return re.search(pattern, condition) is not None
+
+class QueryLog:
+    """
+    Log of statements run for chat users, grouped by fingerprint.
+
+    Each execution is recorded (duration, rows, error) in a capped table
+    and folded into per-fingerprint totals. The plan of a fingerprint is
+    captured when it is first seen and refreshed after slow executions,
+    which is what the index advisor works from. Writes happen on a
+    background thread so logging never delays a response; at most
+    QUERY_LOG_QUEUE_SIZE wait, and executions beyond that are dropped
+    (counted as query_log.dropped).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._queue = queue.Queue(maxsize=settings.QUERY_LOG_QUEUE_SIZE)
+        self._inserts = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                fingerprint TEXT PRIMARY KEY,
+                tenant_id TEXT NOT NULL DEFAULT 'default',
+                normalized_sql TEXT NOT NULL,
+                sample_sql TEXT NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                total_ms REAL NOT NULL DEFAULT 0,
+                max_ms REAL NOT NULL DEFAULT 0,
+                total_rows INTEGER NOT NULL DEFAULT 0,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                plan_summary TEXT,
+                plan_at REAL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS executions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fingerprint TEXT NOT NULL,
+                executed_at REAL NOT NULL,
+                duration_ms REAL NOT NULL,
+                row_count INTEGER,
+                error TEXT
+            )
+        """)
+        # Logs created before tenants existed belong to the default tenant
+        if "tenant_id" not in {row[1] for row in conn.execute("PRAGMA table_info(fingerprints)")}:
+            conn.execute("ALTER TABLE fingerprints ADD COLUMN tenant_id TEXT NOT NULL DEFAULT 'default'")
+
+        threading.Thread(target=self._drain, name="query-log", daemon=True).start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, sql: str, duration_ms: float, row_count: int = None, error: str = None):
+        """Queue one execution of the current tenant for logging (non-blocking)"""
+        if not settings.QUERY_LOG_ENABLED:
+            return
+        try:
+            self._queue.put_nowait((current_tenant.get(), sql, duration_ms, row_count, error, time.time()))
+        except queue.Full:
+            metrics.incr("query_log.dropped")
+
+    def _drain(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                self._write(*entry)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, tenant_id: str, sql: str, duration_ms: float, row_count: int, error: str,
+               executed_at: float):
+        try:
+            # The plan is captured on this thread, which doesn't inherit the caller's tenant
+            current_tenant.set(tenant_id)
+            normalized = normalize_sql(sql)
+            fingerprint = hashlib.sha1(scoped_key(tenant_id, normalized).encode("utf-8")).hexdigest()[:16]
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO fingerprints (fingerprint, tenant_id, normalized_sql, sample_sql, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (fingerprint) DO NOTHING",
+                (fingerprint, tenant_id, normalized, sql, executed_at, executed_at)
+            )
+            conn.execute(
+                "UPDATE fingerprints SET calls = calls + 1, errors = errors + ?, total_ms = total_ms + ?, "
+                "max_ms = MAX(max_ms, ?), total_rows = total_rows + ?, last_seen = ? WHERE fingerprint = ?",
+                (1 if error else 0, duration_ms, duration_ms, row_count or 0, executed_at, fingerprint)
+            )
+            conn.execute(
+                "INSERT INTO executions (fingerprint, executed_at, duration_ms, row_count, error) VALUES (?, ?, ?, ?, ?)",
+                (fingerprint, executed_at, duration_ms, row_count, error)
+            )
+            metrics.incr("query_log.recorded")
+
+            plan_at = conn.execute(
+                "SELECT plan_at FROM fingerprints WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()[0]
+            slow = duration_ms >= settings.QUERY_LOG_SLOW_MS
+            if not error and (plan_at is None or (slow and executed_at - plan_at > settings.QUERY_LOG_PLAN_TTL)):
+                self._capture_plan(fingerprint, sql)
+
+            self._inserts += 1
+            if self._inserts % 1000 == 0:
+                self._trim()
+        except Exception as e:
+            logger.warning(f"Query log write failed: {e}")
+
+    def _capture_plan(self, fingerprint: str, sql: str):
+        results = execute_query(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = results[0]["QUERY PLAN"]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        self._connect().execute(
+            "UPDATE fingerprints SET plan_summary = ?, plan_at = ? WHERE fingerprint = ?",
+            (json.dumps(summarize_plan(plan[0]["Plan"])), time.time(), fingerprint)
+        )
+
+    def _trim(self):
+        """Keep only the newest QUERY_LOG_MAX_EXECUTIONS executions"""
+        self._connect().execute(
+            "DELETE FROM executions WHERE id <= (SELECT MAX(id) FROM executions) - ?",
+            (settings.QUERY_LOG_MAX_EXECUTIONS,)
+        )
+
+    def flush(self):
+        """Wait for queued writes (used before reading a report)"""
+        self._queue.join()
+
+    def top_fingerprints(self, limit: int = 20, order_by: str = "total_ms") -> list:
+        """The current tenant's statement shapes ranked by total (or mean/max) execution time or calls"""
+        order = ORDER_COLUMNS[order_by]
+        rows = self._connect().execute(
+            "SELECT fingerprint, normalized_sql, sample_sql, calls, errors, total_ms, max_ms, total_rows, "
+            f"last_seen, plan_summary FROM fingerprints WHERE tenant_id = ? ORDER BY {order} DESC LIMIT ?",
+            (current_tenant.get(), limit)
+        ).fetchall()
+
+        report = []
+        for fingerprint, normalized, sample, calls, errors, total_ms, max_ms, total_rows, last_seen, plan in rows:
+            plan = json.loads(plan) if plan else None
+            report.append({
+                "fingerprint": fingerprint,
+                "normalized_sql": normalized,
+                "sample_sql": sample,
+                "calls": calls,
+                "errors": errors,
+                "total_ms": round(total_ms, 2),
+                "mean_ms": round(total_ms / calls, 2) if calls else None,
+                "max_ms": round(max_ms, 2),
+                "mean_rows": round(total_rows / calls, 1) if calls else None,
+                "last_seen": last_seen,
+                "plan": {
+                    "total_cost": plan["total_cost"],
+                    "plan_rows": plan["plan_rows"],
+                    "node_types": plan["node_types"]
+                } if plan else None
+            })
+        return report
+
+    def advise_indexes(self, schema: list, existing_indexes: list, limit: int = 10) -> list:
+        """
+        Index suggestions from the plans of the current tenant's slow fingerprints.
+
+        Columns filtered on in sequential scans, and join columns of tables
+        that are sequentially scanned, become candidates. Only columns that
+        exist in the schema and are not already the leading columns of an
+        index are suggested, ranked by the time spent in those statements.
+        """
+        columns_by_table = {
+            table["table_name"]: {column["column_name"] for column in table["columns"]}
+            for table in schema
+        }
+        indexed = [(index["table_name"], tuple(index["columns"])) for index in existing_indexes]
+
+        rows = self._connect().execute(
+            "SELECT fingerprint, total_ms, plan_summary FROM fingerprints "
+            "WHERE tenant_id = ? AND plan_summary IS NOT NULL AND calls > 0 AND total_ms / calls >= ?",
+            (current_tenant.get(), settings.QUERY_LOG_SLOW_MS)
+        ).fetchall()
+
+        candidates = {}
+
+        def add(table, columns, reason, fingerprint, total_ms):
+            if any(table == name and index_columns[:len(columns)] == columns for name, index_columns in indexed):
+                return
+            candidate = candidates.setdefault((table, columns), {
+                "table": table,
+                "columns": list(columns),
+                "reasons": [],
+                "fingerprints": [],
+                "total_ms": 0.0
+            })
+            if reason not in candidate["reasons"]:
+                candidate["reasons"].append(reason)
+            if fingerprint not in candidate["fingerprints"]:
+                candidate["fingerprints"].append(fingerprint)
+                candidate["total_ms"] += total_ms
+
+        for fingerprint, total_ms, plan in rows:
+            plan = json.loads(plan)
+            seq_scanned = {scan["alias"] for scan in plan["scans"] if scan["type"] == "Seq Scan"}
+
+            for scan in plan["scans"]:
+                if scan["type"] != "Seq Scan" or not scan["filter"]:
+                    continue
+                known = columns_by_table.get(scan["table"], set())
+                columns = []
+                for qualifier, name in condition_columns(scan["filter"]):
+                    if qualifier in ("", scan["alias"]) and name in known and name not in columns:
+                        columns.append(name)
+                if columns:
+                    # Equality columns lead a composite index, range columns follow
+                    columns.sort(key=lambda name: not is_equality(scan["filter"], name))
+                    add(scan["table"], tuple(columns[:3]), "filter", fingerprint, total_ms)
+
+            for condition in plan["joins"]:
+                for qualifier, name in condition_columns(condition):
+                    table = plan["aliases"].get(qualifier)
+                    if qualifier in seq_scanned and name in columns_by_table.get(table, set()):
+                        add(table, (name,), "join", fingerprint, total_ms)
+
+        suggestions = sorted(candidates.values(), key=lambda candidate: candidate["total_ms"], reverse=True)[:limit]
+        for suggestion in suggestions:
+            suggestion["total_ms"] = round(suggestion["total_ms"], 2)
+            suggestion["statement"] = 'CREATE INDEX CONCURRENTLY ON "{}" ({})'.format(
+                suggestion["table"], ", ".join(f'"{name}"' for name in suggestion["columns"])
+            )
+        return suggestions
+
+@lru_cache()
+def get_query_log() -> QueryLog:
+    return QueryLog(os.path.join(settings.DATA_DIR, "query_log.sqlite3"))
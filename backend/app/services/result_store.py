@@ -0,0 +1,391 @@
+from app.config import get_settings
+from app.database.connection import execute_query
+from app.database.tenants import DEFAULT_TENANT, current_tenant
+from app.services.admission_service import get_admission_controller
+from app.services.db_service import DatabaseService
+from app.utils.cancellation import CancelToken
+from app.utils.metrics import metrics
+from psycopg2 import sql as pgsql
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+import base64
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+RESULT_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+ORDER_ITEM_PATTERN = re.compile(
+    r'^(?:"(?P<quoted>[^"]+)"|(?P<name>[A-Za-z_]\w*)|(?P<position>\d+))(?:\s+(?P<direction>asc|desc))?$',
+    re.IGNORECASE
+)
+
+def encode_cursor(state: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, default=str).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+# Key types JSON would turn into floats or untyped strings, tagged so cursors keep them exact
+KEY_TYPES = {"numeric": Decimal, "timestamp": datetime.fromisoformat, "date": date.fromisoformat}
+
+def encode_key(values: list) -> list:
+    encoded = []
+    for value in values:
+        if isinstance(value, Decimal):
+            value = {"type": "numeric", "value": str(value)}
+        elif isinstance(value, datetime):
+            value = {"type": "timestamp", "value": value.isoformat()}
+        elif isinstance(value, date):
+            value = {"type": "date", "value": value.isoformat()}
+        encoded.append(value)
+    return encoded
+
+def decode_key(values: list) -> list:
+    return [
+        KEY_TYPES[value["type"]](value["value"]) if isinstance(value, dict) else value
+        for value in values
+    ]
+
+def _top_level_order_by(sql: str):
+    """Text of the outermost ORDER BY clause (without LIMIT/OFFSET), or None"""
+    depth = 0
+    in_string = False
+    order_start = None
+    masked = []
+    for char in sql:
+        if char == "'":
+            in_string = not in_string
+        elif not in_string and char == "(":
+            depth += 1
+        elif not in_string and char == ")":
+            depth -= 1
+        # Blank out nested/quoted text so keyword searches only see the top level
+        masked.append(char if depth == 0 and not in_string and char not in "()'" else " ")
+    masked = "".join(masked)
+
+    for match in re.finditer(r"\border\s+by\b", masked, re.IGNORECASE):
+        order_start = match.end()
+    if order_start is None:
+        return None
+
+    tail = masked[order_start:]
+    end = re.search(r"\b(limit|offset|fetch)\b", tail, re.IGNORECASE)
+    clause = sql[order_start:order_start + end.start()] if end else sql[order_start:]
+    if clause.strip() != (tail[:end.start()] if end else tail).strip():
+        return None  # ORDER BY contains expressions with parentheses or literals
+    return clause.strip()
+
+def keyset_order(sql: str, columns: list):
+    """
+    Ordering usable for keyset pagination, as (column_names, descending).
+
+    Only plain output column names or positions sorted in a single
+    direction qualify; anything else (expressions, qualified names, NULLS
+    FIRST/LAST, mixed directions) returns None.
+    """
+    if not columns or len(set(columns)) != len(columns):
+        return None
+    clause = _top_level_order_by(sql)
+    if not clause:
+        return None
+
+    names, directions = [], set()
+    for item in clause.split(","):
+        match = ORDER_ITEM_PATTERN.match(item.strip())
+        if not match:
+            return None
+        if match.group("position"):
+            position = int(match.group("position"))
+            if not 1 <= position <= len(columns):
+                return None
+            name = columns[position - 1]
+        else:
+            name = match.group("quoted") or match.group("name")
+            if name not in columns:
+                return None
+        names.append(name)
+        directions.add((match.group("direction") or "asc").lower())
+
+    if len(directions) != 1:
+        return None
+    return names, directions.pop() == "desc"
+
+class ResultStore:
+    """
+    Server-side result handles that can be paged without asking the LLM again.
+
+    Results are spooled once as JSON lines plus an offset index, and pages
+    are sliced out of the memory-mapped files. Only the first
+    RESULT_SPOOL_ROWS rows are spooled when the SQL has a usable ORDER BY;
+    pages past them are keyset queries against the database (admitted as
+    "db" work, under RESULT_PAGE_TIMEOUT). Handles expire after RESULT_STORE_TTL and the spool directory is
+    kept under RESULT_STORE_MAX_BYTES, checked at most every EVICT_INTERVAL seconds.
+    """
+
+    EVICT_INTERVAL = 30.0
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._evict_lock = threading.Lock()
+        self._last_evict = 0.0
+
+    def _path(self, result_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{result_id}.{suffix}")
+
+    def _write_meta(self, meta: dict):
+        tmp_path = self._path(meta["result_id"], "json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(meta["result_id"], "json"))
+
+    def reserve(self, sql: str, tenant_id: str = None) -> str:
+        """Create a pending handle for a result that save() or fail() fills in later"""
+        result_id = uuid.uuid4().hex
+        self._write_meta({
+            "result_id": result_id,
+            "tenant_id": tenant_id or current_tenant.get(),
+            "sql": sql,
+            "columns": [],
+            "row_count": None,
+            "created_at": time.time(),
+            "mode": "pending"
+        })
+        return result_id
+
+    def fail(self, result_id: str, error: str):
+        meta = self.get_meta(result_id)
+        if meta is None:
+            return
+        meta.update(mode="failed", error=error)
+        self._write_meta(meta)
+
+    def save(self, sql: str, query_result: dict, tenant_id: str = None, result_id: str = None) -> str:
+        """Create (or fill a reserved) handle for an executed query's result, visible to its tenant only"""
+        rows = query_result["data"] or []
+        columns = list(rows[0].keys()) if rows else []
+        result_id = result_id or uuid.uuid4().hex
+        meta = {
+            "result_id": result_id,
+            "tenant_id": tenant_id or current_tenant.get(),
+            "sql": sql,
+            "columns": columns,
+            "row_count": query_result["row_count"],
+            "created_at": time.time()
+        }
+
+        # Keyset pages re-run the SQL, which would page exact rows under an approximate answer
+        order = keyset_order(sql, columns) if "approximation" not in query_result else None
+        if order:
+            keys = [tuple(row[name] for name in order[0]) for row in rows]
+            # Keyset paging needs unique, non-NULL keys to be exact
+            if len(set(keys)) != len(keys) or any(None in key for key in keys):
+                order = None
+        spooled = rows[:max(1, settings.RESULT_SPOOL_ROWS)] if order else rows
+        if len(spooled) < len(rows):
+            meta.update(
+                mode="keyset",
+                order_columns=order[0],
+                descending=order[1],
+                spooled_rows=len(spooled)
+            )
+        else:
+            meta["mode"] = "spool"
+        self._spool(result_id, spooled)
+        self._write_meta(meta)
+
+        metrics.incr(f"results.saved_{meta['mode']}")
+        self._maybe_evict()
+        return result_id
+
+    def _maybe_evict(self):
+        # evict() lists and stats the whole directory, too much to do on every save
+        with self._evict_lock:
+            now = time.monotonic()
+            if now - self._last_evict < self.EVICT_INTERVAL:
+                return
+            self._last_evict = now
+        self.evict()
+
+    def _spool(self, result_id: str, rows: list):
+        offsets = array("Q", [0])
+        with open(self._path(result_id, "jsonl"), "wb") as f:
+            for row in rows:
+                line = json.dumps(row, default=str).encode("utf-8") + b"\n"
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        with open(self._path(result_id, "idx"), "wb") as f:
+            offsets.tofile(f)
+
+    def get_meta(self, result_id: str):
+        if not RESULT_ID_PATTERN.match(result_id):
+            return None
+        try:
+            with open(self._path(result_id, "json")) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        if time.time() - meta["created_at"] > settings.RESULT_STORE_TTL:
+            return None
+        if meta.get("tenant_id", DEFAULT_TENANT) != current_tenant.get():
+            return None
+        return meta
+
+    def get_page(self, result_id: str, cursor: str = None, limit: int = 100):
+        """Return {"rows", "next_cursor", ...} or None if the handle is unknown/expired"""
+        meta = self.get_meta(result_id)
+        if meta is None:
+            return None
+        if meta["mode"] in ("pending", "failed"):
+            return {
+                "result_id": result_id,
+                "mode": meta["mode"],
+                "columns": [],
+                "row_count": None,
+                "rows": [],
+                "next_cursor": None,
+                "error": meta.get("error")
+            }
+
+        limit = max(1, min(limit, settings.RESULT_PAGE_MAX))
+        state = decode_cursor(cursor) if cursor else {"position": 0}
+        source = "spool"
+        try:
+            if state.get("position", 0) < meta.get("spooled_rows", meta["row_count"]):
+                rows, next_state = self._spool_page(meta, state, limit)
+            else:
+                source = "keyset"
+                rows, next_state = self._keyset_page(meta, state, limit)
+        except FileNotFoundError:
+            # Evicted since get_meta(); an ordered result can still be paged from the database
+            if meta["mode"] != "keyset":
+                return None
+            source = "keyset"
+            rows, next_state = self._keyset_page(meta, {"position": state.get("position", 0)}, limit)
+
+        metrics.incr(f"results.pages_{source}")
+        return {
+            "result_id": result_id,
+            "mode": meta["mode"],
+            "columns": meta["columns"],
+            "row_count": meta["row_count"],
+            "rows": rows,
+            "next_cursor": encode_cursor(next_state) if next_state else None
+        }
+
+    def _spool_page(self, meta: dict, state: dict, limit: int):
+        spooled = meta.get("spooled_rows", meta["row_count"])
+        start = state.get("position", 0)
+        end = min(start + limit, spooled)
+        if start >= end:
+            return [], None
+
+        result_id = meta["result_id"]
+        with open(self._path(result_id, "idx"), "rb") as idx_file, \
+                open(self._path(result_id, "jsonl"), "rb") as data_file:
+            with mmap.mmap(idx_file.fileno(), 0, access=mmap.ACCESS_READ) as idx_map:
+                first, last = struct.unpack_from("=Q", idx_map, start * 8)[0], struct.unpack_from("=Q", idx_map, end * 8)[0]
+            with mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as data_map:
+                chunk = data_map[first:last]
+
+        rows = [json.loads(line) for line in chunk.splitlines()]
+        if end < spooled:
+            return rows, {"position": end}
+        if end < meta["row_count"]:
+            # Spooled rows are serialized (numerics as floats), so the first keyset page goes by OFFSET
+            return rows, {"position": end}
+        return rows, None
+
+    def _keyset_page(self, meta: dict, state: dict, limit: int):
+        """
+        Keyset page over the wrapped query: WHERE (keys) > (last key).
+
+        Keys were unique and non-NULL when the result was saved. The first
+        page after the spool, and any page after a NULL key shows up (the
+        data has changed since), go by OFFSET from the absolute position
+        instead.
+        """
+        order_columns = meta["order_columns"]
+        direction = pgsql.SQL("DESC" if meta["descending"] else "ASC")
+        # The inner SQL is embedded verbatim; escape % since we pass parameters
+        inner = pgsql.SQL(meta["sql"].replace("%", "%%"))
+
+        key = decode_key(state["key"]) if state.get("key") is not None else None
+        position = state.get("position", 0)
+
+        query = pgsql.SQL("SELECT * FROM ({}) AS _page").format(inner)
+        params = []
+        if key is not None:
+            query += pgsql.SQL(" WHERE ({}) {} ({})").format(
+                pgsql.SQL(", ").join(pgsql.Identifier(name) for name in order_columns),
+                pgsql.SQL("<" if meta["descending"] else ">"),
+                pgsql.SQL(", ").join(pgsql.Placeholder() * len(key))
+            )
+            params.extend(key)
+        query += pgsql.SQL(" ORDER BY {} LIMIT %s").format(
+            pgsql.SQL(", ").join(
+                pgsql.SQL("{} {}").format(pgsql.Identifier(name), direction) for name in order_columns
+            )
+        )
+        params.append(limit)
+        if key is None and position:
+            query += pgsql.SQL(" OFFSET %s")
+            params.append(position)
+
+        cancel_token = CancelToken(settings.RESULT_PAGE_TIMEOUT)
+        with get_admission_controller().slot("db", "interactive", cancel_token):
+            results = execute_query(query, tuple(params), cancel_token=cancel_token)
+        rows = [DatabaseService.serialize_row(row) for row in results or []]
+        if len(rows) < limit:
+            return rows, None
+
+        position += len(rows)
+        # Raw values, so the next page compares against the exact key
+        last_key = [results[-1][name] for name in order_columns]
+        if None in last_key:
+            return rows, {"position": position}
+        return rows, {"key": encode_key(last_key), "position": position}
+
+    def evict(self):
+        """Drop expired handles, then the oldest until under the disk quota"""
+        handles = {}
+        for name in os.listdir(self.directory):
+            result_id = name.split(".", 1)[0]
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entry = handles.setdefault(result_id, {"paths": [], "size": 0, "mtime": stat.st_mtime})
+            entry["paths"].append(path)
+            entry["size"] += stat.st_size
+            entry["mtime"] = min(entry["mtime"], stat.st_mtime)
+
+        cutoff = time.time() - settings.RESULT_STORE_TTL
+        total = sum(entry["size"] for entry in handles.values())
+        for result_id, entry in sorted(handles.items(), key=lambda item: item[1]["mtime"]):
+            if entry["mtime"] >= cutoff and total <= settings.RESULT_STORE_MAX_BYTES:
+                break
+            for path in entry["paths"]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= entry["size"]
+            metrics.incr("results.evicted")
+
+@lru_cache()
+def get_result_store() -> ResultStore:
+    return ResultStore(os.path.join(settings.DATA_DIR, "results"))
@@ -0,0 +1,145 @@
+from app.config import get_settings
+from datetime import timezone
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# PostgreSQL type OIDs (cursor.description type_code) by summary kind
+NUMERIC_TYPES = {20, 21, 23, 700, 701, 1700}  # int8, int2, int4, float4, float8, numeric
+DATE_TYPES = {1082, 1114}  # date, timestamp
+TIMESTAMPTZ_TYPES = {1184}
+
+def _to_array(values: tuple, type_code: int):
+    """(kind, array) of one column; missing values become NaN / NaT / None"""
+    if type_code in NUMERIC_TYPES:
+        return "numeric", np.array(values, dtype=np.float64)
+    if type_code in TIMESTAMPTZ_TYPES:
+        # NumPy has no time zones; normalize to naive UTC
+        values = [value.astimezone(timezone.utc).replace(tzinfo=None) if value is not None else None for value in values]
+        return "temporal", np.array(values, dtype="datetime64[ms]")
+    if type_code in DATE_TYPES:
+        return "temporal", np.array(values, dtype="datetime64[ms]")
+    return "categorical", np.array(values, dtype=object)
+
+def _present(kind: str, array):
+    """Mask of the non-missing values"""
+    if kind == "numeric":
+        return ~np.isnan(array)
+    if kind == "temporal":
+        return ~np.isnat(array)
+    return array != None  # noqa: E711 (elementwise)
+
+def _format_times(times) -> list:
+    """Dates when every value is at midnight, timestamps otherwise"""
+    whole_days = bool(np.all(times == times.astype("datetime64[D]")))
+    return np.datetime_as_string(times, unit="D" if whole_days else "s").tolist()
+
+def _round(value):
+    return round(float(value), 6)
+
+def lttb(x, y, threshold: int):
+    """
+    Largest-Triangle-Three-Buckets downsampling; returns the kept indices.
+
+    x must be sorted. The first and last points are always kept, and each
+    bucket in between keeps the point forming the largest triangle with the
+    previously kept point and the average of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return kept
+
+def _column_summary(kind: str, array) -> dict:
+    present = array[_present(kind, array)]
+    summary = {"count": int(len(present)), "nulls": int(len(array) - len(present))}
+    if not len(present):
+        summary["type"] = "empty"
+        return summary
+
+    if kind == "numeric":
+        summary.update(
+            type="numeric",
+            min=_round(present.min()),
+            max=_round(present.max()),
+            mean=_round(present.mean()),
+            quantiles={str(q): _round(v) for q, v in zip(QUANTILES, np.quantile(present, QUANTILES))}
+        )
+        return summary
+
+    if kind == "temporal":
+        summary.update(type="temporal", min=_format_times(present.min(keepdims=True))[0],
+                       max=_format_times(present.max(keepdims=True))[0])
+        return summary
+
+    distinct, counts = np.unique(present.astype(str), return_counts=True)
+    top = np.argsort(-counts, kind="stable")[:settings.SUMMARY_TOP_K]
+    summary.update(
+        type="categorical",
+        distinct=int(len(distinct)),
+        top=[{"value": str(distinct[i]), "count": int(counts[i])} for i in top]
+    )
+    return summary
+
+def summarize_columns(names: list, type_codes: list, rows: list):
+    """
+    Compact summary of a query result: per-column statistics and, when the
+    result has a time column, a downsampled series per numeric column.
+
+    Takes the cursor's column names and type codes and its raw row tuples,
+    which are transposed into one typed NumPy array per column, so the
+    statistics never go through serialized values.
+    """
+    if not rows:
+        return {"columns": {}, "series": None}
+
+    arrays = {
+        name: _to_array(values, type_code)
+        for name, type_code, values in zip(names, type_codes, zip(*rows))
+    }
+    summaries = {name: _column_summary(kind, array) for name, (kind, array) in arrays.items()}
+
+    series = None
+    time_column = next((name for name in names if summaries[name]["type"] == "temporal"), None)
+    numeric_columns = [name for name in names if summaries[name]["type"] == "numeric"]
+    if time_column and numeric_columns:
+        series = {"x": time_column, "method": "lttb", "series": {}}
+        all_times = arrays[time_column][1]
+        for name in numeric_columns[:settings.SUMMARY_MAX_SERIES]:
+            all_values = arrays[name][1]
+            mask = ~np.isnat(all_times) & ~np.isnan(all_values)
+            if not mask.any():
+                continue
+            times, values = all_times[mask], all_values[mask]
+            order = np.argsort(times, kind="stable")
+            times, values = times[order], values[order]
+            kept = lttb(times.astype(np.int64).astype(np.float64), values, settings.SUMMARY_MAX_POINTS)
+            series["series"][name] = {
+                "x": _format_times(times[kept]),
+                "y": [_round(value) for value in values[kept]],
+                "points": int(len(values))
+            }
+
+    return {"columns": summaries, "series": series}
@@ -0,0 +1,98 @@
+from app.config import get_settings
+from app.database.connection import init_db_pool, execute_query
+from app.utils.metrics import metrics
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+class WarmupState:
+    """Startup progress of this worker, reported by the readiness endpoint"""
+
+    def __init__(self):
+        self.process_started = time.perf_counter()
+        self.ready = False
+        self.timings = {}
+        self.errors = {}
+        self.first_answer_seconds = None
+
+    def record_first_answer(self):
+        """Record time-to-first-answer once, on the first successful chat"""
+        if self.first_answer_seconds is None:
+            self.first_answer_seconds = time.perf_counter() - self.process_started
+            metrics.set_gauge("startup.time_to_first_answer_seconds", self.first_answer_seconds)
+            logger.info(f"Time to first answer: {self.first_answer_seconds:.2f}s")
+
+    def to_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "timings": self.timings,
+            "errors": self.errors,
+            "time_to_first_answer_seconds": self.first_answer_seconds
+        }
+
+warmup_state = WarmupState()
+
+async def _step(name: str, fn, required: bool = False):
+    """Run one blocking warmup step in a worker thread and time it"""
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(fn)
+    except Exception as e:
+        warmup_state.errors[name] = str(e)
+        logger.warning(f"Warmup step '{name}' failed: {e}")
+        if required:
+            raise
+    finally:
+        elapsed = time.perf_counter() - started
+        warmup_state.timings[name] = elapsed
+        metrics.set_gauge(f"startup.warmup.{name}_seconds", elapsed)
+
+async def warm_up(chat_service):
+    """
+    Warm the DB pool, schema snapshot, rendered prompt and LLM connection.
+
+    The pool and the LLM connection are opened concurrently; the schema
+    (which may need a pool connection on a shared-cache miss) and the
+    prompt rendered from it follow as soon as the pool is up. Returns
+    whether every step succeeded; only then is the worker ready.
+    """
+    started = time.perf_counter()
+    warmup_state.errors = {}
+
+    def warm_pool():
+        init_db_pool()
+        execute_query("SELECT 1")
+
+    async def warm_schema_and_prompt():
+        await pool_task
+        await _step("schema", chat_service.initialize)
+        if chat_service.schema is not None:
+            await _step("prompt", lambda: chat_service.llm_service.get_system_prompt(chat_service.schema, chat_service.profile))
+
+    pool_task = asyncio.create_task(_step("pool", warm_pool, required=True))
+    tasks = [pool_task, warm_schema_and_prompt()]
+    if settings.WARMUP_LLM_CONNECTION:
+        tasks.append(_step("llm_connection", chat_service.llm_service.warm_connection))
+
+    await asyncio.gather(*tasks)
+
+    warmup_state.timings["total"] = time.perf_counter() - started
+    metrics.set_gauge("startup.warmup_seconds", warmup_state.timings["total"])
+    if warmup_state.errors:
+        logger.warning(f"Warmup incomplete after {warmup_state.timings['total']:.2f}s, not ready")
+        return False
+    warmup_state.ready = True
+    logger.info(f"Warmup finished in {warmup_state.timings['total']:.2f}s")
+    return True
+
+async def retry_warm_up(chat_service):
+    """Re-run warm_up every WARMUP_RETRY_INTERVAL until it fully succeeds"""
+    while not warmup_state.ready:
+        await asyncio.sleep(settings.WARMUP_RETRY_INTERVAL)
+        try:
+            await warm_up(chat_service)
+        except Exception as e:
+            logger.error(f"Warmup retry failed: {e}")
@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class RequestCancelled(Exception):
+    """Raised when a request was cancelled or ran past its deadline"""
+
+class CancelToken:
+    """
+    Per-request deadline and cancellation signal shared by every stage.
+
+    Stages call check() between steps and register an abort callback
+    (closing an HTTP stream, cancelling a Postgres statement) with
+    on_cancel() around blocking calls, so cancel() from another thread
+    interrupts whatever is running at that moment.
+    """
+
+    def __init__(self, timeout: float = None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def cancel(self, reason: str = "cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks = list(self._callbacks)
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Cancel callback failed: {e}")
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+        return self._event.is_set()
+
+    def remaining(self):
+        """Seconds left before the deadline, or None without a deadline"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+
+    @contextmanager
+    def on_cancel(self, callback):
+        """Run callback if the token is cancelled while the block executes"""
+        with self._lock:
+            already_cancelled = self._event.is_set()
+            if not already_cancelled:
+                self._callbacks.append(callback)
+        if already_cancelled:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
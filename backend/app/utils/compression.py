@@ -0,0 +1,183 @@
+from app.utils.metrics import metrics
+from starlette.datastructures import Headers, MutableHeaders
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Media types worth compressing; anything else (parquet, images) is sent as is
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml")
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip header and trailer
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+class _Brotli:
+    def __init__(self, level: int, brotli):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+class _Zstd:
+    def __init__(self, level: int, zstandard):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+def available_encoders(levels: dict) -> dict:
+    """Encoder factories by content-coding; br and zstd only when their package is installed"""
+    encoders = {"gzip": lambda: _Gzip(levels.get("gzip", 6))}
+    try:
+        import brotli
+        encoders["br"] = lambda: _Brotli(levels.get("br", 4), brotli)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        encoders["zstd"] = lambda: _Zstd(levels.get("zstd", 3), zstandard)
+    except ImportError:
+        pass
+    return encoders
+
+def negotiate(accept_encoding: str, preferred: list):
+    """
+    Content-coding to use for an Accept-Encoding header, or None for identity.
+
+    The client's highest q-value wins; ties go to the earliest entry of
+    preferred. A "*" entry covers codings the client didn't name.
+    """
+    weights = {}
+    for entry in accept_encoding.split(","):
+        name, _, params = entry.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for name in preferred:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+def _compressible(headers: MutableHeaders) -> bool:
+    content_type = headers.get("content-type", "").lower()
+    return (
+        "content-encoding" not in headers
+        # Range responses index into the identity body
+        and "content-range" not in headers
+        and "accept-ranges" not in headers
+        and content_type.startswith(COMPRESSIBLE_TYPES)
+    )
+
+class _CompressingSend:
+    """ASGI send wrapper that compresses one response"""
+
+    def __init__(self, send, encoding: str, factory, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.factory = factory
+        self.minimum_size = minimum_size
+        self.start = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(raw=start["headers"])
+            if (
+                start["status"] in (204, 206, 304)
+                or not _compressible(headers)
+                or (not more_body and len(body) < self.minimum_size)
+            ):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+
+            self.encoder = self.factory()
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body:
+                data = self.encoder.compress(body) + self.encoder.finish()
+                headers["Content-Length"] = str(len(data))
+                self._record(len(body), len(data))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": data})
+                return
+            # Streamed: the compressed length isn't known up front
+            if "content-length" in headers:
+                del headers["content-length"]
+            await self.send(start)
+
+        data = self.encoder.compress(body)
+        if not more_body:
+            data += self.encoder.finish()
+        self._record(len(body), len(data))
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def _record(self, identity_bytes: int, wire_bytes: int):
+        metrics.incr("http.compression.identity_bytes", identity_bytes)
+        metrics.incr("http.compression.wire_bytes", wire_bytes)
+        metrics.incr(f"http.compression.{self.encoding}_bytes", wire_bytes)
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the best content-coding both sides support.
+
+    zstd and br are offered when the zstandard / brotli packages are
+    installed, gzip always. Bodies smaller than minimum_size, already
+    encoded or ranged responses and binary media types are sent as is;
+    streamed bodies are compressed chunk by chunk.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, encodings: list = ("zstd", "br", "gzip"), levels: dict = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        available = available_encoders(levels or {})
+        self.encoders = {name: available[name] for name in encodings if name in available}
+        logger.info(f"Response compression: {', '.join(self.encoders) or 'disabled'}")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encoders:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), list(self.encoders))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.encoders[encoding], self.minimum_size))
@@ -0,0 +1,77 @@
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import threading
+import time
+
+class Metrics:
+    """Thread-safe in-process counters, gauges and timing summaries"""
+
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._totals = defaultdict(lambda: [0, 0.0])
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Record one timing/size sample"""
+        with self._lock:
+            self._samples[name].append(value)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += value
+
+    @contextmanager
+    def timer(self, name: str):
+        """Observe the wall-clock seconds spent in the block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def percentile(self, name: str, q: float):
+        """Percentile (0-100) over the recent sample window, or None if empty"""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            totals = {name: tuple(values) for name, values in self._totals.items()}
+
+        timings = {}
+        for name, values in samples.items():
+            if not values:
+                continue
+            count, total = totals[name]
+            timings[name] = {
+                "count": count,
+                "mean": total / count,
+                "p50": values[int(0.50 * (len(values) - 1))],
+                "p95": values[int(0.95 * (len(values) - 1))],
+                "p99": values[int(0.99 * (len(values) - 1))],
+                "max": values[-1]
+            }
+
+        return {"counters": counters, "gauges": gauges, "timings": timings}
+
+metrics = Metrics()
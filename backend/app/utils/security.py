@@ -0,0 +1,62 @@
+from app.config import get_settings
+from functools import lru_cache
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+@lru_cache()
+def _secret() -> bytes:
+    """URL_SIGNING_SECRET, or a random secret kept in DATA_DIR so every worker on the host shares it"""
+    if settings.URL_SIGNING_SECRET:
+        return settings.URL_SIGNING_SECRET.encode()
+    path = os.path.join(settings.DATA_DIR, "url_signing_secret")
+    if not os.path.exists(path):
+        os.makedirs(settings.DATA_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+            f.write(secrets.token_bytes(32))
+        try:
+            # Atomic, and fails if another worker got there first
+            os.link(tmp_path, path)
+            logger.info("Generated URL signing secret")
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path, "rb") as f:
+        return f.read()
+
+def _signature(body: str) -> str:
+    return _b64encode(hmac.new(_secret(), body.encode(), hashlib.sha256).digest())
+
+def sign_token(claims: dict, ttl: float) -> str:
+    """Opaque token carrying claims, valid for ttl seconds"""
+    body = _b64encode(json.dumps({**claims, "exp": time.time() + ttl}).encode())
+    return f"{body}.{_signature(body)}"
+
+def verify_token(token: str):
+    """The claims of a valid, unexpired token, or None"""
+    body, _, signature = token.partition(".")
+    if not hmac.compare_digest(signature, _signature(body)):
+        return None
+    try:
+        claims = json.loads(_b64decode(body))
+    except ValueError:
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
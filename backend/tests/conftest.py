@@ -0,0 +1,4 @@
+import os
+
+# Settings need a database URL; unit tests never connect to it
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/test")
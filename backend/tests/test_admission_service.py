@@ -0,0 +1,133 @@
+from app.services.admission_service import AdmissionRejected, StageLimiter
+from app.utils.cancellation import CancelToken, RequestCancelled
+import threading
+import time
+import pytest
+
+def hold(limiter: StageLimiter, count: int) -> threading.Event:
+    """Occupy count slots until the returned event is set"""
+    done = threading.Event()
+    for _ in range(count):
+        limiter.acquire()
+
+    def release():
+        done.wait()
+        for _ in range(count):
+            limiter.release(0.01)
+
+    threading.Thread(target=release, daemon=True).start()
+    return done
+
+def queue(limiter: StageLimiter, priority: str, order: list, label, hold_for: float = 0.0,
+          token: CancelToken = None) -> threading.Thread:
+    """Start a thread that waits for a slot, records label in order and holds the slot briefly"""
+    def run():
+        try:
+            with limiter.slot(priority, token):
+                order.append(label)
+                time.sleep(hold_for)
+        except (AdmissionRejected, RequestCancelled) as e:
+            order.append((label, type(e).__name__))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+def wait_for_queue(limiter: StageLimiter, depth: int):
+    deadline = time.monotonic() + 2
+    while len(limiter._queue) < depth:
+        assert time.monotonic() < deadline, "waiters did not queue"
+        time.sleep(0.005)
+
+def test_admits_up_to_limit_without_queueing():
+    limiter = StageLimiter("t", 2, 4, 5.0)
+    limiter.acquire()
+    limiter.acquire()
+    assert limiter._in_flight == 2 and not limiter._queue
+
+def test_interactive_before_batch_and_fifo_within_class():
+    limiter = StageLimiter("t", 1, 10, 5.0)
+    done = hold(limiter, 1)
+    order = []
+    threads = []
+    for label, priority in [("b1", "batch"), ("i1", "interactive"), ("b2", "batch"), ("i2", "interactive")]:
+        threads.append(queue(limiter, priority, order, label))
+        wait_for_queue(limiter, len(threads))
+    done.set()
+    for thread in threads:
+        thread.join(2)
+    assert order == ["i1", "i2", "b1", "b2"]
+
+def test_freed_slots_admit_every_waiter():
+    # Two slots freed at once must admit both queued waiters, not just the head
+    limiter = StageLimiter("t", 2, 10, 5.0)
+    done = hold(limiter, 2)
+    order = []
+    threads = [queue(limiter, "interactive", order, i, hold_for=1.0) for i in range(2)]
+    wait_for_queue(limiter, 2)
+    done.set()
+    deadline = time.monotonic() + 0.5
+    while len(order) < 2 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert sorted(order) == [0, 1]
+    for thread in threads:
+        thread.join(2)
+
+def test_full_queue_sheds_equal_priority():
+    limiter = StageLimiter("t", 1, 1, 5.0)
+    done = hold(limiter, 1)
+    order = []
+    waiter = queue(limiter, "interactive", order, "queued")
+    wait_for_queue(limiter, 1)
+    with pytest.raises(AdmissionRejected) as rejected:
+        limiter.acquire("interactive")
+    assert rejected.value.retry_after >= 1
+    done.set()
+    waiter.join(2)
+    assert order == ["queued"]
+
+def test_full_queue_displaces_batch_for_interactive():
+    limiter = StageLimiter("t", 1, 1, 5.0)
+    done = hold(limiter, 1)
+    order = []
+    batch = queue(limiter, "batch", order, "batch")
+    wait_for_queue(limiter, 1)
+    interactive = queue(limiter, "interactive", order, "interactive")
+    batch.join(2)
+    assert order == [("batch", "AdmissionRejected")]
+    done.set()
+    interactive.join(2)
+    assert order[-1] == "interactive"
+
+def test_sheds_when_estimated_wait_exceeds_deadline():
+    limiter = StageLimiter("t", 1, 10, 5.0)
+    limiter._service_time = 2.0
+    hold(limiter, 1)
+    with pytest.raises(AdmissionRejected):
+        limiter.acquire("interactive", CancelToken(1.0))
+    assert not limiter._queue
+
+def test_queue_timeout():
+    limiter = StageLimiter("t", 1, 10, 0.3)
+    limiter._service_time = 0.1
+    done = hold(limiter, 1)
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected, match="timed out in queue"):
+        limiter.acquire()
+    assert 0.25 <= time.monotonic() - started < 1.0
+    assert not limiter._queue
+    done.set()
+
+def test_cancelled_waiter_leaves_queue():
+    limiter = StageLimiter("t", 1, 10, 5.0)
+    limiter._service_time = 0.1
+    done = hold(limiter, 1)
+    token = CancelToken()
+    order = []
+    waiter = queue(limiter, "interactive", order, "w", token=token)
+    wait_for_queue(limiter, 1)
+    token.cancel("client disconnected")
+    waiter.join(2)
+    assert order == [("w", "RequestCancelled")]
+    assert not limiter._queue
+    done.set()
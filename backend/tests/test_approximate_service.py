@@ -0,0 +1,57 @@
+from app.services.approximate_service import parse_aggregate_query, split_top_level
+import pytest
+
+def test_parse_plain_count():
+    query = parse_aggregate_query("SELECT COUNT(*) FROM orders")
+    assert query["table"] == "orders"
+    assert query["where"] is None and query["group_by"] is None
+    assert query["items"] == [{"func": "count", "arg": "*", "alias": "count", "text": "COUNT(*)"}]
+
+def test_parse_grouped_query():
+    query = parse_aggregate_query(
+        "select region, count(*) as n, sum(amount) total from sales.orders o "
+        "where note = 'vip' group by region order by n desc;"
+    )
+    assert query["table"] == "sales.orders"
+    assert query["alias"] == "o"
+    assert query["where"] == "note = 'vip'"
+    assert query["group_by"] == "region"
+    assert query["order_by"] == "n desc"
+    assert [(item["func"], item.get("alias")) for item in query["items"]] == [
+        (None, None), ("count", "n"), ("sum", "total")
+    ]
+
+def test_parse_group_by_position():
+    query = parse_aggregate_query("SELECT note, AVG(amount) FROM orders GROUP BY 1")
+    assert query["group_by"] == "1"
+    assert query["items"][1]["func"] == "avg"
+
+def test_parse_quoted_identifiers():
+    query = parse_aggregate_query('SELECT "Join Date", SUM("Amount") AS "Total" FROM "Orders" GROUP BY "Join Date"')
+    assert query["table"] == '"Orders"'
+    assert query["group_by"] == '"Join Date"'
+    assert query["items"][1]["arg"] == '"Amount"'
+    assert query["items"][1]["alias"] == '"Total"'
+
+@pytest.mark.parametrize("literal", ["'join us'", "'select'", "'a, b'", "'x group by y'", "'order by 1 limit 5'"])
+def test_parse_keywords_inside_literals(literal):
+    query = parse_aggregate_query(f"SELECT note, COUNT(*) FROM orders WHERE note = {literal} GROUP BY note")
+    assert query["where"] == f"note = {literal}"
+    assert query["group_by"] == "note"
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(*) FROM orders o JOIN customers c ON c.id = o.customer_id",
+    "SELECT COUNT(*) FROM orders LIMIT 5",
+    "SELECT COUNT(DISTINCT note) FROM orders",
+    "SELECT COUNT(*) FROM (SELECT 1 FROM orders) t",
+    "SELECT note, COUNT(*) FROM orders GROUP BY note HAVING COUNT(*) > 1",
+    "SELECT MAX(amount) FROM orders",
+    "SELECT region, COUNT(*) FROM orders",
+    "SELECT region FROM orders GROUP BY region",
+    "WITH t AS (SELECT 1) SELECT COUNT(*) FROM t",
+])
+def test_parse_rejects_unsupported_shapes(sql):
+    assert parse_aggregate_query(sql) is None
+
+def test_split_top_level():
+    assert split_top_level("a, f(b, c), 'x, y', d") == ["a", "f(b, c)", "'x, y'", "d"]
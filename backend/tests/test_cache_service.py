@@ -0,0 +1,110 @@
+from app.services.cache_service import SharedCache
+import threading
+import time
+import pytest
+
+@pytest.fixture
+def cache(tmp_path):
+    return SharedCache(str(tmp_path / "cache.sqlite3"), max_bytes=1000, fill_timeout=5.0)
+
+def stored_sizes(cache: SharedCache):
+    conn = cache._connect()
+    return conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0], cache._total_size(conn)
+
+def entry(size: int) -> str:
+    """A value whose JSON payload is size bytes"""
+    return "x" * (size - 2)
+
+def test_get_set_delete(cache):
+    assert cache.get("ns", "k") is None
+    cache.set("ns", "k", {"a": [1, 2]})
+    assert cache.get("ns", "k") == {"a": [1, 2]}
+    assert cache.get("other", "k", "default") == "default"
+    cache.delete("ns", "k")
+    assert cache.get("ns", "k") is None
+
+def test_expired_entries_are_misses(cache):
+    cache.set("ns", "k", 1, ttl=0.05)
+    time.sleep(0.1)
+    assert cache.get("ns", "k") is None
+
+def test_running_total_tracks_every_change(cache):
+    cache.set("ns", "a", entry(100))
+    cache.set("ns", "b", entry(200))
+    cache.set("ns", "a", entry(50))  # replaced
+    assert stored_sizes(cache) == (250, 250)
+    cache.delete("ns", "b")
+    assert stored_sizes(cache) == (50, 50)
+    cache.set("other", "c", entry(10))
+    cache.clear("ns")
+    assert stored_sizes(cache) == (10, 10)
+
+def test_total_survives_reopening(cache):
+    cache.set("ns", "a", entry(100))
+    reopened = SharedCache(cache.path, max_bytes=1000, fill_timeout=5.0)
+    assert stored_sizes(reopened) == (100, 100)
+
+def test_budget_evicts_least_recently_used(cache):
+    cache.TOUCH_INTERVAL = 0
+    for key in "abcd":
+        cache.set("ns", key, entry(300))
+        time.sleep(0.01)
+    # d pushed the total to 1200: a, the oldest, is gone
+    assert cache.get("ns", "a") is None
+    time.sleep(0.01)
+    assert cache.get("ns", "b") is not None  # b is now more recent than c and d
+    cache.set("ns", "e", entry(300))
+    assert [key for key in "bcde" if cache.get("ns", key) is not None] == ["b", "d", "e"]
+    total, tracked = stored_sizes(cache)
+    assert total == tracked <= cache.max_bytes
+
+def test_oversized_entry_is_not_stored(cache):
+    cache.set("ns", "big", entry(2000))
+    assert cache.get("ns", "big") is None
+    assert stored_sizes(cache) == (0, 0)
+
+def test_hits_do_not_write_until_touch_interval(cache):
+    cache.set("ns", "k", 1)
+    conn = cache._connect()
+    before = conn.execute("SELECT last_access FROM entries").fetchone()[0]
+    cache.get("ns", "k")
+    assert conn.execute("SELECT last_access FROM entries").fetchone()[0] == before
+    assert not cache._touches
+
+    cache.TOUCH_INTERVAL = 0
+    cache.get("ns", "k")
+    assert ("ns", "k") in cache._touches
+    # Written with the next write transaction
+    cache.set("ns", "other", 2)
+    assert not cache._touches
+    assert conn.execute("SELECT last_access FROM entries WHERE key = 'k'").fetchone()[0] > before
+
+def test_get_or_compute_single_flight(cache):
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(threading.get_ident())
+        time.sleep(0.3)
+        return {"value": 42}
+
+    def worker():
+        results.append(cache.get_or_compute("ns", "k", compute))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert results == [{"value": 42}] * 8
+    assert cache.get_or_compute("ns", "k", compute) == {"value": 42}
+    assert len(calls) == 1
+
+def test_get_or_compute_after_fill_timeout(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache.sqlite3"), max_bytes=1000, fill_timeout=0.2)
+    # Another worker holds the fill and never finishes it
+    assert cache._try_claim("ns", "k", "elsewhere")
+    started = time.monotonic()
+    assert cache.get_or_compute("ns", "k", lambda: "local") == "local"
+    assert 0.2 <= time.monotonic() - started < 2
@@ -0,0 +1,22 @@
+from app.utils.compression import negotiate
+import pytest
+
+PREFERRED = ["zstd", "br", "gzip"]
+
+@pytest.mark.parametrize("accept_encoding, preferred, expected", [
+    ("gzip, deflate, br", PREFERRED, "br"),
+    ("gzip;q=0.5, br;q=0.8", PREFERRED, "br"),
+    ("gzip;q=1, br;q=0.8", PREFERRED, "gzip"),
+    ("br;q=0, gzip", PREFERRED, "gzip"),
+    ("*", PREFERRED, "zstd"),
+    ("*, zstd;q=0", PREFERRED, "br"),
+    ("GZIP;Q=1", ["gzip"], "gzip"),
+    ("gzip ; q=0.3", ["gzip"], "gzip"),
+    ("gzip;q=abc, br", ["gzip", "br"], "br"),
+    ("identity", PREFERRED, None),
+    ("", PREFERRED, None),
+    ("gzip;q=0", PREFERRED, None),
+    ("zstd", ["br", "gzip"], None),
+])
+def test_negotiate(accept_encoding, preferred, expected):
+    assert negotiate(accept_encoding, preferred) == expected
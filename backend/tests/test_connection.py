@@ -0,0 +1,29 @@
+from app.database.connection import _StatementCancel
+import threading
+import time
+
+class SlowCancelConnection:
+    def __init__(self):
+        self.cancels = 0
+        self.cancelling = threading.Event()
+
+    def cancel(self):
+        self.cancelling.set()
+        time.sleep(0.2)
+        self.cancels += 1
+
+def test_cancel_after_finish_is_a_no_op():
+    conn = SlowCancelConnection()
+    statement = _StatementCancel(conn)
+    statement.finish()
+    statement.cancel()
+    assert conn.cancels == 0
+
+def test_finish_waits_for_an_in_flight_cancel():
+    conn = SlowCancelConnection()
+    statement = _StatementCancel(conn)
+    threading.Thread(target=statement.cancel).start()
+    conn.cancelling.wait(1)
+    statement.finish()
+    # The connection is not handed back while its cancel request is still being sent
+    assert conn.cancels == 1
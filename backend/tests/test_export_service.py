@@ -0,0 +1,41 @@
+from app.config import get_settings
+from app.services import export_service
+from app.services.admission_service import AdmissionRejected
+from app.services.db_service import DatabaseService
+from app.services.export_service import ExportService
+import threading
+import pytest
+
+settings = get_settings()
+
+class StubStore:
+    def get_meta(self, result_id):
+        return {"sql": "SELECT 1"}
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_MAX_CONCURRENT", 1)
+    monkeypatch.setattr(settings, "EXPORT_QUEUE_SIZE", 1)
+    monkeypatch.setattr(export_service, "get_result_store", lambda: StubStore())
+    monkeypatch.setattr(DatabaseService, "explain", staticmethod(lambda sql: {"Plan Rows": 1}))
+    return ExportService(str(tmp_path))
+
+def test_failed_queueing_releases_slot(service, monkeypatch):
+    def broken_save(job):
+        raise OSError("disk full")
+    monkeypatch.setattr(service, "_save", broken_save)
+
+    for _ in range(settings.EXPORT_MAX_CONCURRENT + settings.EXPORT_QUEUE_SIZE + 1):
+        with pytest.raises(OSError):
+            service.create_job("r", "csv")
+    assert service._pending == 0
+
+def test_rejects_when_full(service, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(service, "_export", lambda job: release.wait(5))
+
+    for _ in range(settings.EXPORT_MAX_CONCURRENT + settings.EXPORT_QUEUE_SIZE):
+        assert service.create_job("r", "csv")["status"] == "queued"
+    with pytest.raises(AdmissionRejected):
+        service.create_job("r", "csv")
+    release.set()
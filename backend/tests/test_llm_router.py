@@ -0,0 +1,184 @@
+from app.config import get_settings
+from app.services.llm_router import HEDGE_LOST, LLMProvider, ProviderRouter
+from app.utils.cancellation import CancelToken, RequestCancelled
+from app.utils.metrics import metrics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import threading
+import time
+import pytest
+
+settings = get_settings()
+names = itertools.count()
+
+class StubHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible streaming completions; behaviour per path prefix (see StubServer.modes)"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        name = self.path.strip("/").split("/")[0]
+        mode = self.server.modes[name]
+        self.server.calls[name] = self.server.calls.get(name, 0) + 1
+        time.sleep(mode.get("header_delay", 0))
+        if mode.get("status", 200) != 200:
+            body = json.dumps({"error": {"message": "stub failure"}}).encode()
+            self.send_response(mode["status"])
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        time.sleep(mode.get("token_delay", 0))
+        chunk = {
+            "id": "x", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+            "choices": [{"index": 0, "delta": {"content": mode.get("text", name)}, "finish_reason": None}]
+        }
+        try:
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode())
+        except OSError:
+            pass
+
+@pytest.fixture(scope="module")
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.modes, server.calls = {}, {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+@pytest.fixture(autouse=True)
+def fast_settings(monkeypatch):
+    for name, value in {
+        "LLM_HEDGE_DELAY": 5.0,
+        "LLM_HEDGE_MIN_SAMPLES": 1000,
+        "LLM_BREAKER_FAILURES": 2,
+        "LLM_BREAKER_COOLDOWN": 0.5,
+        "LLM_FIRST_TOKEN_TIMEOUT": 5.0,
+        "LLM_TIMEOUT": 10.0,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+
+def provider(stub, **mode) -> LLMProvider:
+    """A provider on the stub whose calls behave as mode says; answers with its own name"""
+    name = f"stub{next(names)}"
+    stub.modes[name] = mode
+    return LLMProvider(name, f"http://127.0.0.1:{stub.server_port}/{name}", model="stub", max_concurrent=1)
+
+def slot_free_within(p: LLMProvider, seconds: float) -> bool:
+    """Whether the provider's only concurrency slot is released within seconds"""
+    semaphore = p.transport._semaphores[p.name]
+    if semaphore.acquire(timeout=seconds):
+        semaphore.release()
+        return True
+    return False
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+def test_secondary_wins_hedge_and_loser_is_aborted(stub, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY", 0.2)
+    slow, fast = provider(stub, header_delay=5), provider(stub)
+    wins = metrics.counter("llm.secondary_wins")
+
+    started = time.monotonic()
+    assert ProviderRouter([slow, fast]).complete(MESSAGES, CancelToken(10)) == fast.name
+    assert time.monotonic() - started < 2
+    assert metrics.counter("llm.secondary_wins") == wins + 1
+    # The loser is aborted while still waiting for response headers
+    assert slot_free_within(slow, 1.5)
+    # and its wait is kept as a censored latency sample, not a failure
+    assert slow.sample_count == 1 and slow.state()["consecutive_failures"] == 0
+
+def test_hedge_loser_token_reason(stub):
+    slow = provider(stub, header_delay=5)
+    token = CancelToken(10)
+    threading.Timer(0.2, token.cancel, (HEDGE_LOST,)).start()
+    started = time.monotonic()
+    with pytest.raises(RequestCancelled):
+        slow.complete(MESSAGES, token, max_retries=0)
+    assert time.monotonic() - started < 1.5
+
+def test_failover_after_error(stub):
+    broken, healthy = provider(stub, status=500), provider(stub)
+    router = ProviderRouter([broken, healthy])
+    failovers = metrics.counter("llm.failover")
+
+    assert router.complete(MESSAGES, CancelToken(10)) == healthy.name
+    assert metrics.counter("llm.failover") == failovers + 1
+    assert broken.state()["consecutive_failures"] == 1
+
+def test_breaker_opens_and_half_opens(stub):
+    broken, healthy = provider(stub, status=500), provider(stub)
+    router = ProviderRouter([broken, healthy])
+
+    for _ in range(settings.LLM_BREAKER_FAILURES):
+        assert router.complete(MESSAGES, CancelToken(10)) == healthy.name
+    assert not broken.available
+    calls = stub.calls[broken.name]
+    # Open: skipped entirely
+    assert router.ranked() == [healthy]
+    assert router.complete(MESSAGES, CancelToken(10)) == healthy.name
+    assert stub.calls[broken.name] == calls
+
+    # Half-open after the cooldown: one trial call, and failing it re-opens at once
+    time.sleep(settings.LLM_BREAKER_COOLDOWN)
+    assert broken.available
+    with pytest.raises(Exception):
+        broken.complete(MESSAGES, CancelToken(10), max_retries=0)
+    broken.record_failure(RuntimeError("trial failed"))
+    assert not broken.available
+
+    # A successful trial closes it
+    time.sleep(settings.LLM_BREAKER_COOLDOWN)
+    stub.modes[broken.name] = {}
+    assert broken.complete(MESSAGES, CancelToken(10), max_retries=0) == broken.name
+    broken.record_success(0.01)
+    assert broken.available and broken.state()["consecutive_failures"] == 0
+
+@pytest.mark.parametrize("mode", [{"header_delay": 5}, {"token_delay": 5}])
+def test_first_token_timeout(stub, monkeypatch, mode):
+    monkeypatch.setattr(settings, "LLM_FIRST_TOKEN_TIMEOUT", 0.3)
+    stalled = provider(stub, **mode)
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        stalled.complete(MESSAGES, CancelToken(10), max_retries=0)
+    assert time.monotonic() - started < 1.5
+    assert slot_free_within(stalled, 0.5)
+
+def test_deadline_expiry(stub):
+    slow = provider(stub, header_delay=5)
+
+    started = time.monotonic()
+    with pytest.raises(RequestCancelled):
+        ProviderRouter([slow]).complete(MESSAGES, CancelToken(0.3))
+    assert time.monotonic() - started < 1.5
+    assert slot_free_within(slow, 0.5)
+    assert slow.state()["consecutive_failures"] == 0
+
+def test_no_attempt_after_deadline(stub):
+    p = provider(stub)
+    token = CancelToken(0.01)
+    time.sleep(0.05)
+    with pytest.raises(RequestCancelled):
+        ProviderRouter([p]).complete(MESSAGES, token)
+    assert p.name not in stub.calls
+
+def test_hedge_past_deadline_is_not_launched(stub, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY", 0.3)
+    slow, spare = provider(stub, header_delay=5), provider(stub)
+
+    with pytest.raises(RequestCancelled):
+        ProviderRouter([slow, spare]).complete(MESSAGES, CancelToken(0.2))
+    time.sleep(0.3)
+    assert spare.name not in stub.calls
@@ -0,0 +1,58 @@
+from app.config import get_settings
+from app.services.query_log import QueryLog, condition_columns, normalize_sql
+from app.utils.metrics import metrics
+import threading
+import pytest
+
+settings = get_settings()
+
+@pytest.mark.parametrize("first, second", [
+    ("SELECT * FROM t WHERE id = 42 AND name = 'bob' -- hi", "select *  from t where id=7 and name='o''brien';"),
+    ("SELECT * FROM t WHERE id IN (1, 2, 3)", "SELECT * FROM t WHERE id IN ( 4 )"),
+    ("/* one */ SELECT a,b FROM t", "SELECT a , b FROM t"),
+])
+def test_normalize_sql_groups_same_shape(first, second):
+    assert normalize_sql(first) == normalize_sql(second)
+
+def test_normalize_sql_strips_literals():
+    assert normalize_sql("SELECT x1, 1.5e3 FROM t2 WHERE note = 'where 1 = 1'") == "select x1, ? from t2 where note = ?"
+
+def test_normalize_sql_comment_markers_inside_literals():
+    assert normalize_sql("SELECT * FROM t WHERE note = 'a -- b' AND x = 1") == "select * from t where note = ? and x = ?"
+
+def test_normalize_sql_keeps_quoted_identifiers():
+    assert normalize_sql('SELECT "Q1 2024", "Region" FROM T') == 'select "Q1 2024", "Region" from t'
+    assert normalize_sql('SELECT "Region" FROM t') != normalize_sql("SELECT region FROM t")
+
+@pytest.mark.parametrize("condition, expected", [
+    ("(o.customer_id = c.id)", [("o", "customer_id"), ("c", "id")]),
+    ("((o.created_at)::timestamp without time zone = '2024-01-01'::timestamp without time zone)", [("o", "created_at")]),
+    ("((amount)::double precision > (1.5)::double precision)", [("", "amount")]),
+    ("((c.name)::character varying(20) = 'x'::character varying)", [("c", "name")]),
+    ("((x)::numeric(10,2) = y)", [("", "x"), ("", "y")]),
+    ("((note)::text = 'a = b'::text)", [("", "note")]),
+])
+def test_condition_columns(condition, expected):
+    assert condition_columns(condition) == expected
+
+def test_record_drops_when_the_queue_is_full(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_LOG_QUEUE_SIZE", 2)
+    query_log = QueryLog(str(tmp_path / "query_log.db"))
+    writing, release, written = threading.Event(), threading.Event(), []
+
+    def blocked_write(*entry):
+        writing.set()
+        release.wait(5)
+        written.append(entry[1])
+    monkeypatch.setattr(query_log, "_write", blocked_write)
+    dropped = metrics.counter("query_log.dropped")
+
+    query_log.record("SELECT 0", 1.0)
+    assert writing.wait(5)
+    for i in range(1, 5):
+        query_log.record(f"SELECT {i}", 1.0)
+    assert metrics.counter("query_log.dropped") == dropped + 2
+
+    release.set()
+    query_log.flush()
+    assert written == ["SELECT 0", "SELECT 1", "SELECT 2"]
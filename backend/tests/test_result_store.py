@@ -0,0 +1,98 @@
+from app.config import get_settings
+from app.services.result_store import ResultStore, decode_cursor, decode_key, encode_cursor, encode_key, keyset_order
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+import os
+import pytest
+
+settings = get_settings()
+
+COLUMNS = ["created_at", "total", "Region"]
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT created_at, total FROM t ORDER BY created_at", (["created_at"], False)),
+    ("SELECT * FROM t ORDER BY created_at ASC, total asc", (["created_at", "total"], False)),
+    ("SELECT * FROM t ORDER BY 1 DESC, total DESC", (["created_at", "total"], True)),
+    ('SELECT * FROM t ORDER BY "Region" LIMIT 10', (["Region"], False)),
+    ("SELECT * FROM t WHERE note = 'order by total' ORDER BY created_at", (["created_at"], False)),
+    ("SELECT * FROM (SELECT * FROM u ORDER BY x) s ORDER BY total", (["total"], False)),
+])
+def test_keyset_order_supported(sql, expected):
+    assert keyset_order(sql, COLUMNS) == expected
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM t",
+    "SELECT * FROM (SELECT * FROM u ORDER BY x) s",
+    "SELECT * FROM t ORDER BY created_at, total DESC",
+    "SELECT * FROM t ORDER BY lower(created_at)",
+    "SELECT * FROM t ORDER BY t.created_at",
+    "SELECT * FROM t ORDER BY created_at NULLS FIRST",
+    "SELECT * FROM t ORDER BY 4",
+    "SELECT * FROM t ORDER BY missing",
+    "SELECT * FROM t ORDER BY region",
+])
+def test_keyset_order_rejected(sql):
+    assert keyset_order(sql, COLUMNS) is None
+
+def test_keyset_order_needs_unique_columns():
+    assert keyset_order("SELECT a, a FROM t ORDER BY a", ["a", "a"]) is None
+    assert keyset_order("SELECT 1 ORDER BY 1", []) is None
+
+def test_cursor_keys_are_exact():
+    key = [
+        Decimal("12345678901234567.8901"),
+        datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=timezone(timedelta(hours=2))),
+        date(2024, 1, 2),
+        "text", 7, 1.5
+    ]
+    state = decode_cursor(encode_cursor({"key": encode_key(key), "position": 10}))
+    decoded = decode_key(state["key"])
+    assert decoded == key
+    assert [type(value) for value in decoded] == [type(value) for value in key]
+
+def ordered_result(count: int) -> dict:
+    return {"data": [{"id": i, "total": i * 1.5} for i in range(count)], "row_count": count}
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultStore(str(tmp_path))
+
+def test_eviction_is_throttled(store, monkeypatch):
+    calls = []
+    monkeypatch.setattr(store, "evict", lambda: calls.append(1))
+    for _ in range(5):
+        store.save("SELECT id, total FROM t", ordered_result(3))
+    assert len(calls) == 1
+
+    store._last_evict -= store.EVICT_INTERVAL
+    store.save("SELECT id, total FROM t", ordered_result(3))
+    assert len(calls) == 2
+
+def test_evicted_spool_falls_back_to_keyset(store, monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_SPOOL_ROWS", 5)
+    result_id = store.save("SELECT id, total FROM t ORDER BY id", ordered_result(8))
+    page = store.get_page(result_id, limit=2)
+    assert [row["id"] for row in page["rows"]] == [0, 1]
+
+    requested = []
+    def keyset_page(meta, state, limit):
+        requested.append(state)
+        return [{"id": 2, "total": 3.0}], None
+    monkeypatch.setattr(store, "_keyset_page", keyset_page)
+    os.remove(store._path(result_id, "jsonl"))
+
+    page = store.get_page(result_id, page["next_cursor"], limit=2)
+    assert page["rows"] == [{"id": 2, "total": 3.0}]
+    assert requested == [{"position": 2}]
+
+def test_evicted_unordered_spool_is_gone(store):
+    result_id = store.save("SELECT id, total FROM t", ordered_result(3))
+    os.remove(store._path(result_id, "idx"))
+    assert store.get_page(result_id) is None
+
+def test_keyset_starts_after_spool_by_position(store, monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_SPOOL_ROWS", 2)
+    result_id = store.save("SELECT id, total FROM t ORDER BY id", ordered_result(4))
+    page = store.get_page(result_id, limit=5)
+    assert len(page["rows"]) == 2
+    assert decode_cursor(page["next_cursor"]) == {"position": 2}
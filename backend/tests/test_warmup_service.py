@@ -0,0 +1,69 @@
+from app.config import get_settings
+from app.services import warmup_service
+from app.services.warmup_service import retry_warm_up, warm_up, warmup_state
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+
+settings = get_settings()
+
+class StubChatService:
+    def __init__(self, schema_failures: int):
+        self.schema = None
+        self.profile = None
+        self.schema_failures = schema_failures
+        self.llm_service = self
+
+    def initialize(self):
+        if self.schema_failures:
+            self.schema_failures -= 1
+            raise RuntimeError("schema unavailable")
+        self.schema = {"tables": []}
+
+    def get_system_prompt(self, schema, profile):
+        return "prompt"
+
+    def warm_connection(self):
+        pass
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(warmup_service, "init_db_pool", lambda: None)
+    monkeypatch.setattr(warmup_service, "execute_query", lambda sql: None)
+    monkeypatch.setattr(settings, "WARMUP_RETRY_INTERVAL", 0.01)
+    monkeypatch.setattr(warmup_state, "ready", False)
+    monkeypatch.setattr(warmup_state, "errors", {})
+
+def test_ready_only_when_every_step_succeeds():
+    assert asyncio.run(warm_up(StubChatService(schema_failures=1))) is False
+    assert not warmup_state.ready
+    assert "schema" in warmup_state.errors
+
+def test_retry_until_ready():
+    chat_service = StubChatService(schema_failures=3)
+
+    async def start():
+        if not await warm_up(chat_service):
+            await asyncio.wait_for(retry_warm_up(chat_service), 5)
+
+    asyncio.run(start())
+    assert warmup_state.ready and not warmup_state.errors
+
+def test_failed_pool_raises(monkeypatch):
+    def broken_pool():
+        raise RuntimeError("no database")
+    monkeypatch.setattr(warmup_service, "init_db_pool", broken_pool)
+    with pytest.raises(RuntimeError):
+        asyncio.run(warm_up(StubChatService(schema_failures=0)))
+    assert not warmup_state.ready
+
+def test_startup_does_not_import_heavy_packages():
+    # A fresh interpreter, since other tests may have imported them already
+    code = "import sys, app.main; print(sorted(m for m in ('openai', 'pyarrow') if m in sys.modules))"
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=backend_dir, capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "[]"
@@ -1,50 +1,122 @@
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Optional, List, Dict
+from urllib3.util import Retry
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Retried (idempotent GETs only) with exponential backoff, honouring Retry-After
+RETRY_STATUSES = (429, 502, 503, 504)
+
 class APIClient:
-    def __init__(self, base_url: str):
+    """
+    Backend client over one pooled requests session.
+
+    Up to pool_size connections are kept alive for reuse. GETs are retried
+    up to retries times on connection errors and RETRY_STATUSES, sleeping
+    backoff * 2**n seconds in between; POSTs are never retried. last_stats
+    holds the bytes on the wire and latency of the latest call.
+    """
+
+    def __init__(self, base_url: str, tenant_id: str = None, api_key: str = None,
+                 pool_size: int = 10, retries: int = 3, backoff: float = 0.5):
         self.base_url = base_url
         self.session = requests.Session()
+        # No Accept-Encoding: requests already asks for every encoding urllib3 can decode here
         self.session.headers.update({
             "Content-Type": "application/json"
         })
-    
+        if api_key:
+            self.session.headers["X-API-Key"] = api_key
+        elif tenant_id:
+            self.session.headers["X-Tenant-ID"] = tenant_id
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.last_stats: Dict = {}
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        started = time.perf_counter()
+        response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+        self.last_stats = {
+            "path": path,
+            "status": response.status_code,
+            "encoding": response.headers.get("Content-Encoding", "identity"),
+            # raw.tell() counts the (possibly compressed) bytes read off the socket
+            "wire_bytes": response.raw.tell(),
+            "body_bytes": len(response.content),
+            "seconds": time.perf_counter() - started
+        }
+        return response
+
     def health_check(self) -> Dict:
         """Check if backend is healthy"""
         try:
-            response = self.session.get(f"{self.base_url}/health", timeout=5)
+            response = self._request("GET", "/health", timeout=5)
             response.raise_for_status()
             return response.json()
         except Exception as e:
             logger.error(f"Health check failed: {e}")
             return {"status": "unhealthy", "error": str(e)}
-    
+
     def get_schema(self) -> Optional[Dict]:
         """Get database schema"""
         try:
-            response = self.session.get(f"{self.base_url}/v1/chat/schema", timeout=10)
+            response = self._request("GET", "/v1/chat/schema", timeout=10)
             response.raise_for_status()
             return response.json()
         except Exception as e:
             logger.error(f"Failed to get schema: {e}")
             return None
-    
-    def send_message(self, message: str, conversation_history: Optional[List] = None) -> Dict:
-        """Send a chat message"""
+
+    def get_result(self, result_id: str, cursor: Optional[str] = None, limit: int = 100) -> Optional[Dict]:
+        """Get one page of a stored query result"""
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        try:
+            response = self._request("GET", f"/v1/results/{result_id}", params=params, timeout=10)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Failed to get result {result_id}: {e}")
+            return None
+
+    def send_message(self, message: str, conversation_history: Optional[List] = None,
+                     include_summary: bool = False, approximate: bool = False,
+                     exact_in_background: bool = False, plan: bool = False) -> Dict:
+        """
+        Send a chat message (approximate answers expensive aggregates, and with
+        exact_in_background the exact result follows under exact_result_id;
+        plan splits compound questions into parallel parts)
+        """
         try:
             payload = {
                 "message": message,
-                "conversation_history": conversation_history
+                "conversation_history": conversation_history,
+                "include_summary": include_summary,
+                "approximate": approximate,
+                "exact_in_background": approximate and exact_in_background,
+                "plan": plan
             }
-            
-            response = self.session.post(
-                f"{self.base_url}/v1/chat/",
-                json=payload,
-                timeout=30
-            )
+
+            response = self._request("POST", "/v1/chat/", json=payload, timeout=30)
+            if response.status_code == 429:
+                retry_after = response.headers.get("Retry-After")
+                return {
+                    "response": f"The server is busy right now. Please try again in {retry_after or 'a few'} seconds.",
+                    "error": "Server busy"
+                }
             response.raise_for_status()
             return response.json()
         except requests.exceptions.Timeout:
@@ -57,4 +129,26 @@ class APIClient:
             return {
                 "response": f"Error communicating with backend: {str(e)}",
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+
+    def create_export(self, result_id: str, fmt: str = "csv") -> Dict:
+        """Start a server-side export job for the full result of an answer"""
+        try:
+            response = self._request(
+                "POST", "/v1/exports/", json={"result_id": result_id, "format": fmt}, timeout=10
+            )
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Export request failed: {e}")
+            return {"status": "failed", "error": str(e)}
+
+    def get_export(self, job_id: str) -> Dict:
+        """Get export job status"""
+        try:
+            response = self._request("GET", f"/v1/exports/{job_id}", timeout=5)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Export status request failed: {e}")
+            return {"job_id": job_id, "status": "unknown", "error": str(e)}
@@ -7,6 +7,15 @@ load_dotenv()
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 API_VERSION = "v1"
 
+# Tenant of this frontend (an API key takes precedence over the tenant ID)
+TENANT_ID = os.getenv("TENANT_ID", "")
+API_KEY = os.getenv("API_KEY", "")
+
+# Connection reuse and retries (idempotent GETs only)
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "10"))
+API_RETRIES = int(os.getenv("API_RETRIES", "3"))
+API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", "0.5"))
+
 # API Endpoints
 CHAT_ENDPOINT = f"{API_BASE_URL}/{API_VERSION}/chat/"
 SCHEMA_ENDPOINT = f"{API_BASE_URL}/{API_VERSION}/chat/schema"
@@ -15,4 +24,9 @@ HEALTH_ENDPOINT = f"{API_BASE_URL}/health"
 # UI Configuration
 APP_TITLE = "🤖 Database Chatbot"
 APP_ICON = "🗄️"
-PAGE_TITLE = "DB Chatbot"
\ No newline at end of file
+PAGE_TITLE = "DB Chatbot"
+
+# Chat history rendering
+RECENT_MESSAGES = 10  # rendered in full; older messages are collapsed
+MAX_STORED_MESSAGES = 200  # per session
+RESULT_PAGE_ROWS = 100  # rows fetched per result table
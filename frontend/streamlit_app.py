@@ -3,7 +3,10 @@ import pandas as pd
 from datetime import datetime
 import time
 
-from config import API_BASE_URL, APP_TITLE, APP_ICON, PAGE_TITLE
+from config import (
+    API_BASE_URL, TENANT_ID, API_KEY, API_POOL_SIZE, API_RETRIES, API_RETRY_BACKOFF,
+    APP_TITLE, APP_ICON, PAGE_TITLE, RECENT_MESSAGES, MAX_STORED_MESSAGES, RESULT_PAGE_ROWS
+)
 from api_client import APIClient
 from utils import (
     format_table_data, 
@@ -56,10 +59,38 @@ st.markdown("""
 # Initialize API client
 @st.cache_resource
 def get_api_client():
-    return APIClient(API_BASE_URL)
+    return APIClient(
+        API_BASE_URL, TENANT_ID, API_KEY,
+        pool_size=API_POOL_SIZE, retries=API_RETRIES, backoff=API_RETRY_BACKOFF
+    )
 
 api_client = get_api_client()
 
+@st.cache_data(ttl=300, show_spinner=False)
+def load_schema():
+    """Database schema, fetched at most every 5 minutes"""
+    schema = api_client.get_schema()
+    if schema is None:
+        # Raising keeps the failure out of the cache
+        raise RuntimeError("Failed to load schema")
+    return schema
+
+@st.cache_data(ttl=15, show_spinner=False)
+def load_health():
+    return api_client.health_check()
+
+@st.cache_data(ttl=3600, max_entries=50, show_spinner=False)
+def load_result_page(result_id: str, limit: int) -> pd.DataFrame:
+    """First page of a stored result, fetched once per result id"""
+    page = api_client.get_result(result_id, limit=limit)
+    if page is None:
+        raise RuntimeError("Result expired or unavailable")
+    return format_table_data(page.get("rows", []))
+
+@st.cache_data(ttl=3600, max_entries=50, show_spinner=False)
+def result_page_csv(result_id: str, limit: int) -> bytes:
+    return export_to_csv(load_result_page(result_id, limit))
+
 # Initialize session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -73,7 +104,7 @@ with st.sidebar:
     
     # Backend health check
     st.subheader("Backend Status")
-    health = api_client.health_check()
+    health = load_health()
     
     if health.get("status") == "healthy":
         st.success("✅ Connected")
@@ -94,13 +125,30 @@ with st.sidebar:
     
     st.divider()
     
+    # Query modes
+    st.toggle(
+        "≈ Approximate answers for huge tables",
+        key="approximate",
+        help="Expensive counts and aggregates are estimated from statistics or a sample"
+    )
+    if st.session_state.get("approximate"):
+        st.toggle(
+            "🎯 Also compute exact results in the background",
+            key="exact_in_background",
+            help="Runs the full query after answering approximately, at the full database cost"
+        )
+    
+    st.toggle(
+        "🧩 Split compound questions",
+        key="plan",
+        help="Questions asking for several things are answered as parallel sub-questions"
+    )
+    
+    st.divider()
+    
     # Database schema viewer
     if st.button("📊 View Database Schema", use_container_width=True):
-        with st.spinner("Loading schema..."):
-            schema = api_client.get_schema()
-            if schema:
-                st.session_state.show_schema = True
-                st.session_state.schema_data = schema
+        st.session_state.show_schema = True
     
     st.divider()
     
@@ -134,8 +182,11 @@ st.caption("Ask questions about your database in natural language")
 # Show schema if requested
 if st.session_state.get("show_schema", False):
     with st.expander("📊 Database Schema", expanded=True):
-        schema_data = st.session_state.get("schema_data", {})
-        tables = schema_data.get("schema", [])
+        try:
+            with st.spinner("Loading schema..."):
+                tables = load_schema().get("schema", [])
+        except RuntimeError:
+            tables = []
         
         if tables:
             for table in tables:
@@ -160,39 +211,180 @@ if st.session_state.get("show_schema", False):
         st.session_state.show_schema = False
         st.rerun()
 
-# Display chat messages
-for idx, message in enumerate(st.session_state.messages):
-    role = message["role"]
-    content = message["content"]
+def render_full_export(message, idx):
+    """
+    Export the full result on the backend and link to the finished file.
+
+    The job status is kept on the message and only fetched again when the
+    refresh button is pressed, not on every rerun.
+    """
+    job = message.get("export_job")
+    if job is None:
+        if st.button("📦 Export full result (CSV)", key=f"export_full_{idx}"):
+            job = api_client.create_export(message["result_id"])
+            if job.get("job_id"):
+                message["export_job"] = job
+                st.rerun()
+            else:
+                st.error(f"Export failed: {job.get('error')}")
+        return
+
+    if job.get("status") == "done":
+        st.markdown(f"[📥 Download full result ({job['rows_written']} rows)]({job['download_url']})")
+    elif job.get("status") == "failed":
+        st.error(f"Export failed: {job.get('error')}")
+    else:
+        st.progress(job.get("progress") or 0.0, text=f"Exporting... {job.get('rows_written', 0)} rows")
+        if st.button("🔄 Refresh export status", key=f"export_refresh_{idx}"):
+            message["export_job"] = api_client.get_export(job["job_id"])
+            st.rerun()
+
+def render_summary(summary):
+    """Downsampled series as charts and per-column statistics from the backend"""
+    series = summary.get("series")
+    if series and series.get("series"):
+        for name, points in series["series"].items():
+            chart_df = pd.DataFrame({series["x"]: pd.to_datetime(points["x"]), name: points["y"]})
+            st.line_chart(chart_df, x=series["x"], y=name)
+            if points["points"] > len(points["y"]):
+                st.caption(f"{name}: {len(points['y'])} of {points['points']} points shown")
+
+    columns = summary.get("columns") or {}
+    if columns:
+        with st.expander("📊 Column statistics"):
+            stats = pd.DataFrame([
+                {
+                    "Column": name,
+                    "Type": stats["type"],
+                    "Count": stats["count"],
+                    "Nulls": stats["nulls"],
+                    "Min": stats.get("min"),
+                    "Max": stats.get("max"),
+                    "Mean": stats.get("mean"),
+                    "Top values": ", ".join(f"{top['value']} ({top['count']})" for top in stats.get("top", []))
+                }
+                for name, stats in columns.items()
+            ])
+            st.dataframe(stats.astype(str), use_container_width=True, hide_index=True)
+
+def render_approximation(message, idx):
+    """Error bound of an approximate answer, and a switch to the exact result once it's ready"""
+    approximation = message["approximation"]
+    error = approximation.get("relative_error")
+    margin = f"±{error:.1%}" if error is not None else "unknown error"
+    st.caption(f"≈ Approximate answer ({approximation['method']}, {margin} at 95% confidence)")
+
+    exact_result_id = message.get("exact_result_id")
+    if exact_result_id and st.button("🎯 Show exact result", key=f"exact_result_{idx}"):
+        page = api_client.get_result(exact_result_id, limit=1)
+        if page is None or page.get("mode") == "failed":
+            st.warning("The exact result is not available.")
+        elif page.get("mode") == "pending":
+            st.info("The exact result is still being computed. Try again in a moment.")
+        else:
+            message.update(
+                result_id=exact_result_id,
+                row_count=page.get("row_count"),
+                content=message["content"] + "\n\n_Replaced by the exact result below._"
+            )
+            for key in ("approximation", "exact_result_id", "summary"):
+                message.pop(key, None)
+            st.rerun()
+
+def render_assistant_message(message, idx, load_results=True):
+    """Render an assistant message; its result table is fetched lazily by result id"""
+    st.markdown(message["content"])
+
+    if message.get("approximation"):
+        render_approximation(message, idx)
+
+    # Show SQL query if available
+    if "sql" in message:
+        with st.expander("🔍 View SQL Query"):
+            st.code(message["sql"], language="sql")
+
+    result_id = message.get("result_id")
+    if result_id and not load_results:
+        if st.button("📄 Load results", key=f"load_results_{idx}"):
+            message["expanded"] = True
+            st.rerun()
+    elif result_id:
+        try:
+            df = load_result_page(result_id, RESULT_PAGE_ROWS)
+        except RuntimeError as e:
+            st.warning(str(e))
+            df = pd.DataFrame()
+
+        if not df.empty:
+            row_count = message.get("row_count") or len(df)
+            if row_count > len(df):
+                st.info(f"Showing {len(df)} of {row_count} results")
+
+            st.dataframe(df, use_container_width=True)
+
+            if message.get("summary"):
+                render_summary(message["summary"])
 
-    if role == "user":
+            # Download button (loaded rows only)
+            st.download_button(
+                label="📥 Download CSV",
+                data=result_page_csv(result_id, RESULT_PAGE_ROWS),
+                file_name=f"query_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv",
+                key=f"download_csv_msg_{idx}"
+            )
+
+            # Full results are exported server-side, never through this process
+            render_full_export(message, idx)
+    elif message.get("data"):
+        # Backends without result handles only send the preview rows
+        st.dataframe(format_table_data(message["data"]), use_container_width=True)
+
+    for part_idx, part in enumerate(message.get("parts", [])):
+        st.divider()
+        render_assistant_message(part, f"{idx}_{part_idx}", load_results)
+
+    if message.get("error"):
+        st.error(f"⚠️ Error: {message['error']}")
+
+def response_message(response: dict) -> dict:
+    """Lightweight message for a chat response; result rows are fetched by result id"""
+    message_data = {
+        "role": "assistant",
+        "content": response.get("response", "Sorry, I couldn't process that.")
+    }
+    if response.get("sql_executed"):
+        message_data["sql"] = response["sql_executed"]
+    if response.get("result_id"):
+        message_data["result_id"] = response["result_id"]
+        message_data["row_count"] = response.get("row_count")
+        if response.get("summary"):
+            message_data["summary"] = response["summary"]
+        if response.get("approximation"):
+            message_data["approximation"] = response["approximation"]
+            message_data["exact_result_id"] = response.get("exact_result_id")
+    elif response.get("data_preview"):
+        message_data["data"] = response["data_preview"]
+    if response.get("error"):
+        message_data["error"] = response["error"]
+    return message_data
+
+def render_message(message, idx, load_results=True):
+    if message["role"] == "user":
         with st.chat_message("user", avatar="👤"):
-            st.markdown(content)
+            st.markdown(message["content"])
     else:
         with st.chat_message("assistant", avatar="🤖"):
-            st.markdown(content)
-
-            # Show SQL query if available
-            if "sql" in message:
-                with st.expander("🔍 View SQL Query"):
-                    st.code(message["sql"], language="sql")
-
-            # Show data table if available
-            if "data" in message and message["data"]:
-                df = format_table_data(message["data"])
-
-                if not df.empty:
-                    st.dataframe(df, use_container_width=True)
-
-                    # Download button
-                    csv = export_to_csv(df)
-                    st.download_button(
-                        label="📥 Download CSV",
-                        data=csv,
-                        file_name=f"query_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv",
-                        key=f"download_csv_msg_{idx}"
-                    )
+            render_assistant_message(message, idx, load_results)
+
+# Display chat messages: only recent ones are rendered in full, older ones on demand
+messages = st.session_state.messages
+older_count = max(0, len(messages) - RECENT_MESSAGES)
+if older_count and st.toggle(f"Show {older_count} earlier messages", key="show_earlier"):
+    for idx in range(older_count):
+        render_message(messages[idx], idx, load_results=messages[idx].get("expanded", False))
+for idx in range(older_count, len(messages)):
+    render_message(messages[idx], idx)
 
 # Handle selected sample question
 if "selected_question" in st.session_state:
@@ -220,68 +412,39 @@ if user_input:
             # Send to API
             response = api_client.send_message(
                 message=user_input,
-                conversation_history=st.session_state.conversation_history
+                conversation_history=st.session_state.conversation_history,
+                include_summary=True,
+                approximate=st.session_state.get("approximate", False),
+                exact_in_background=st.session_state.get("exact_in_background", False),
+                plan=st.session_state.get("plan", False)
             )
             
-            # Display response
-            assistant_message = response.get("response", "Sorry, I couldn't process that.")
-            st.markdown(assistant_message)
-            
-            # Store for chat display
-            message_data = {
-                "role": "assistant",
-                "content": assistant_message
-            }
-            
-            # Show SQL if available
-            if "sql_executed" in response and response["sql_executed"]:
-                sql = response["sql_executed"]
-                message_data["sql"] = sql
-                
-                with st.expander("🔍 View SQL Query"):
-                    st.code(sql, language="sql")
-            
-            # Show data table if available
-            if "data_preview" in response and response["data_preview"]:
-                data = response["data_preview"]
-                message_data["data"] = data
-                
-                df = format_table_data(data)
-                
-                if not df.empty:
-                    row_count = response.get("row_count", len(data))
-                    
-                    if row_count > len(data):
-                        st.info(f"Showing {len(data)} of {row_count} results")
-                    
-                    st.dataframe(df, use_container_width=True)
-
-                    # Download button
-                    csv = export_to_csv(df)
-                    st.download_button(
-                        label="📥 Download CSV",
-                        data=csv,
-                        file_name=f"query_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv",
-                        key="download_csv_current"
-                    )
-            
-            # Show error if any
-            if "error" in response:
-                st.error(f"⚠️ Error: {response['error']}")
-            
-            # Add to messages
-            st.session_state.messages.append(message_data)
-            
-            # Update conversation history for API
-            st.session_state.conversation_history.append({
-                "role": "user",
-                "content": user_input
-            })
-            st.session_state.conversation_history.append({
-                "role": "assistant",
-                "content": assistant_message
-            })
+    # Store only lightweight references; result rows are fetched by result id
+    message_data = response_message(response)
+    if response.get("parts"):
+        # Planner mode: each sub-question is shown with its own SQL and results
+        message_data["content"] = message_data["content"].split("\n", 1)[0]
+        message_data.pop("sql", None)
+        message_data["parts"] = [
+            response_message({**part, "response": f"**{part['question']}**\n\n{part['response']}"})
+            for part in response["parts"]
+        ]
+    
+    st.session_state.messages.append(message_data)
+    
+    # Update conversation history for API
+    st.session_state.conversation_history.append({
+        "role": "user",
+        "content": user_input
+    })
+    st.session_state.conversation_history.append({
+        "role": "assistant",
+        "content": response.get("response", "Sorry, I couldn't process that.")
+    })
+    
+    # Keep session memory bounded
+    del st.session_state.messages[:-MAX_STORED_MESSAGES]
+    del st.session_state.conversation_history[:-MAX_STORED_MESSAGES]
     
     # Rerun to update UI
     st.rerun()